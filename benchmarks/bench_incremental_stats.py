@@ -0,0 +1,55 @@
+"""
+small_matrix_app.benchmarks.bench_incremental_stats.py
+Compares the cost of one edited cell of A or B with the incremental stats engine against
+recomputing C = A.dot(B) and its min, mean and max, which is what every edit cost before.
+
+Run from the repository root:
+    python -m benchmarks.bench_incremental_stats
+"""
+
+import time
+
+import numpy as np
+
+from matrix_app.incremental_stats import IncrementalStats
+
+
+def full_recompute(A, B):
+    C = A.dot(B)
+    return C.min(), C.mean(), C.max()
+
+
+def main():
+    rng = np.random.default_rng(0)
+    edits = 200
+    print(
+        "{:>6} {:>16} {:>18} {:>9}".format(
+            "n", "recompute (ms)", "incremental (ms)", "speedup"
+        )
+    )
+    for n in (100, 500, 1000, 2000):
+        A = rng.random((n, n))
+        B = rng.random((n, n))
+        start = time.perf_counter()
+        full_recompute(A, B)
+        full = time.perf_counter() - start
+
+        live = IncrementalStats(A, B)
+        cells = rng.integers(0, n, size=(edits, 2))
+        start = time.perf_counter()
+        for e, (i, j) in enumerate(cells):
+            if e % 2 == 0:
+                live.set_a(i, j, 1.0)
+            else:
+                live.set_b(i, j, 1.0)
+            live.summary()
+        incremental = (time.perf_counter() - start) / edits
+        print(
+            "{:>6} {:>16.3f} {:>18.3f} {:>8.0f}x".format(
+                n, full * 1000, incremental * 1000, full / incremental
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
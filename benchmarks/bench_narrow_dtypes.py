@@ -0,0 +1,86 @@
+"""
+small_matrix_app.benchmarks.bench_narrow_dtypes.py
+Runs the same run, random ints between 0 and 100 as the app generates them, through the multiply, the stats and
+a save twice: once with every matrix as float64, as entered matrices used to be, and once with the narrowest
+exact dtypes (see narrow_dtypes.py). Reports the time of each step, the bytes held by A, B, C and the stats,
+and the bytes saved.
+
+Run from the repository root:
+    python -m benchmarks.bench_narrow_dtypes [matrix size]
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from matrix_app.db_widget import DatabaseModel, DisplayData, RunData
+from matrix_app.narrow_dtypes import narrow
+from matrix_app.stats_engine import calculate_stats, multiply
+
+
+def measure(db: DatabaseModel, name: str, A, B) -> (float, float, float, int, int, int):
+    """Seconds to multiply, to take the stats and to save, bytes of A, B and C, bytes of the stats, bytes saved"""
+    start = time.perf_counter()
+    C = multiply(A, B)
+    multiplied = time.perf_counter()
+    stats = calculate_stats(C)
+    calculated = time.perf_counter()
+    run = RunData(
+        name, [DisplayData("A", A), DisplayData("B", B), DisplayData("C", C)], stats
+    )
+    err = db.save_run(run)
+    if err is not None:
+        raise RuntimeError(str(err))
+    saved = time.perf_counter()
+    return (
+        multiplied - start,
+        calculated - multiplied,
+        saved - calculated,
+        A.nbytes + B.nbytes + C.nbytes,
+        sum(np.asarray(s.data).nbytes for s in stats),
+        db.run_summary(name).nbytes,
+    )
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rng = np.random.default_rng(0)
+    A = rng.integers(0, 101, size=(size, size)).astype(float)
+    B = rng.integers(0, 101, size=(size, size)).astype(float)
+    print(str(size) + "x" + str(size) + " matrices of ints from 0 to 100")
+    workdir = tempfile.mkdtemp()
+    try:
+        db = DatabaseModel(workdir + "/SavedRuns", cache_bytes=0)
+        print(
+            "{:<8} {:>10} {:>10} {:>10} {:>12} {:>12} {:>12}  {}".format(
+                "", "multiply", "stats", "save", "A+B+C MB", "stats MB", "saved MB", "dtypes"
+            )
+        )
+        for name, a, b in (("float64", A, B), ("narrow", narrow(A), narrow(B))):
+            with np.errstate(over="ignore"):
+                multiply_s, stats_s, save_s, matrices, stats, saved = measure(
+                    db, name, a, b
+                )
+            dtypes = db.run_summary(name).dtypes
+            print(
+                "{:<8} {:>9.3f}s {:>9.3f}s {:>9.3f}s {:>12.2f} {:>12.2f} {:>12.2f}  {}".format(
+                    name,
+                    multiply_s,
+                    stats_s,
+                    save_s,
+                    matrices / 1e6,
+                    stats / 1e6,
+                    saved / 1e6,
+                    " ".join(k + ":" + dtypes[k] for k in ("A", "B", "C")),
+                )
+            )
+        db.close()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
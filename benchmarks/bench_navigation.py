@@ -0,0 +1,125 @@
+"""
+small_matrix_app.benchmarks.bench_navigation.py
+Time to go from page to page in the main window, which keeps its pages in a PageStack, against the
+previous window that built a new page for every navigation and set it as its central widget.
+Each round goes home, to the saved runs, to a displayed run with its stats, to a new run and back home.
+
+Run from the repository root:
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.bench_navigation [saved runs] [matrix size] [rounds]
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from PyQt5.QtWidgets import QApplication, QMainWindow
+
+from matrix_app.db_widget import DisplayData, RunData
+from matrix_app.display_stats_widget import DisplayStatsPage
+from matrix_app.home_screen_widget import HomeScreenPage
+from matrix_app.main_window import Window
+from matrix_app.matrix_entry_widget import MatrixEntryPage
+from matrix_app.run_index import RunIndexEntry
+from matrix_app.saved_runs_widget import SavedRunsPage
+from matrix_app.stats_engine import calculate_stats
+
+PAGES = ("home", "saved runs", "display stats", "matrix entry")
+
+
+def timed(app: QApplication, navigate) -> float:
+    """Seconds to navigate and process the events it posted, painting included"""
+    start = time.perf_counter()
+    navigate()
+    app.processEvents()
+    return time.perf_counter() - start
+
+
+def rebuilt_navigation(old_window: QMainWindow, db, run_data: RunData) -> dict:
+    """The previous navigation: a new page, with all its widgets, set as the central widget"""
+    return {
+        "home": lambda: old_window.setCentralWidget(HomeScreenPage()),
+        "saved runs": lambda: old_window.setCentralWidget(SavedRunsPage(db, print)),
+        "display stats": lambda: old_window.setCentralWidget(
+            DisplayStatsPage(run_data=run_data)
+        ),
+        "matrix entry": lambda: old_window.setCentralWidget(MatrixEntryPage()),
+    }
+
+
+def reused_navigation(win: Window, run_data: RunData) -> dict:
+    return {
+        "home": win._display_home_screen_page,
+        "saved runs": win._display_saved_runs_page,
+        "display stats": lambda: win._display_display_stats_page(run_data=run_data),
+        "matrix entry": win._display_matrix_entry,
+    }
+
+
+def measure(app: QApplication, navigation: dict, rounds: int) -> dict:
+    """Mean seconds per navigation to each page, after a first round that builds the pages"""
+    for page in PAGES:
+        timed(app, navigation[page])
+    times = {page: 0.0 for page in PAGES}
+    for _ in range(rounds):
+        for page in PAGES:
+            times[page] += timed(app, navigation[page]) / rounds
+    return times
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    app = QApplication(sys.argv[:1])
+    db_dir = tempfile.mkdtemp()
+    try:
+        win = Window(db_name=db_dir + "/SavedRuns")
+        db = win.data_run_model
+        db._index.replace_all(
+            [
+                RunIndexEntry("Run" + str(i), "Run" + str(i) + ".h5", True, {"C": (i, i)})
+                for i in range(runs)
+            ]
+        )
+        rng = np.random.default_rng(0)
+        A = rng.random((size, size))
+        B = rng.random((size, size))
+        C = A @ B
+        matrices = [DisplayData("A", A), DisplayData("B", B), DisplayData("C", C)]
+        run_data = RunData("Run", matrices, calculate_stats(C), saved=True)
+
+        old_window = QMainWindow()
+        old_window.show()
+        rebuilt = measure(app, rebuilt_navigation(old_window, db, run_data), rounds)
+        old_window.close()
+        reused = measure(app, reused_navigation(win, run_data), rounds)
+
+        print(
+            str(runs) + " saved runs, " + str(size) + "x" + str(size) + " run with "
+            + str(len(run_data.stats)) + " stats, mean of " + str(rounds) + " rounds"
+        )
+        print("{:<14} {:>14} {:>14}".format("page", "rebuilt (ms)", "reused (ms)"))
+        for page in PAGES:
+            print(
+                "{:<14} {:>14.2f} {:>14.2f}".format(
+                    page, 1000 * rebuilt[page], 1000 * reused[page]
+                )
+            )
+        print(
+            "{:<14} {:>14.2f} {:>14.2f}".format(
+                "round", 1000 * sum(rebuilt.values()), 1000 * sum(reused.values())
+            )
+        )
+        print("pages built by the window: " + str(win.pages.built))
+        win.close()
+        db.close()
+    finally:
+        shutil.rmtree(db_dir)
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+small_matrix_app.benchmarks.bench_prefetch.py
+Loads many runs one by one and with DatabaseModel.load_runs, then steps through the runs in list order
+the way a user would, with and without the RunPrefetcher, and reports how long each open waited
+and the prefetch hit rate.
+
+Run from the repository root:
+    python -m benchmarks.bench_prefetch [matrix size] [number of runs]
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_storage_profiles import make_runs
+from matrix_app.db_widget import DatabaseModel
+from matrix_app.prefetcher import RunPrefetcher
+
+
+def step_through(db: DatabaseModel, names, prefetcher: RunPrefetcher = None, think: float = 0.02):
+    """Opens every run in order, looking at each for think seconds. Returns the mean wait per open"""
+    waited = 0.0
+    for i, name in enumerate(names):
+        start = time.perf_counter()
+        if prefetcher is None:
+            db.load_run(name)
+        else:
+            prefetcher.load_run(name)
+            prefetcher.prefetch(names[i + 1 : i + 3] + names[max(0, i - 1) : i])
+        waited += time.perf_counter() - start
+        time.sleep(think)
+    return waited / len(names)
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    with np.errstate(over="ignore"):
+        runs = make_runs(size, count)
+    names = [r.run_name for r in runs]
+    workdir = tempfile.mkdtemp()
+    print(str(count) + " runs of " + str(size) + "x" + str(size) + " matrices")
+    try:
+        db = DatabaseModel(workdir + "/SavedRuns", cache_bytes=0)
+        for run_data in runs:
+            err = db.save_run(run_data)
+            if err is not None:
+                raise RuntimeError(str(err))
+
+        start = time.perf_counter()
+        for name in names:
+            db.load_run(name)
+        print("{:<28} {:>8.3f} s".format("load_run one by one", time.perf_counter() - start))
+        for workers in (2, 4, 8):
+            start = time.perf_counter()
+            db.load_runs(names, workers=workers)
+            print(
+                "{:<28} {:>8.3f} s".format(
+                    "load_runs, " + str(workers) + " workers", time.perf_counter() - start
+                )
+            )
+        db.close()
+
+        print("mean wait per opened run while stepping through the list")
+        db = DatabaseModel(workdir + "/SavedRuns", cache_bytes=0)
+        print("{:<28} {:>8.2f} ms".format("no prefetch", 1000 * step_through(db, names)))
+        db.close()
+        db = DatabaseModel(workdir + "/SavedRuns")
+        prefetcher = RunPrefetcher(db)
+        wait = step_through(db, names, prefetcher)
+        prefetcher.close()
+        db.close()
+        print("{:<28} {:>8.2f} ms".format("prefetch", 1000 * wait))
+        print("prefetch stats: " + str(prefetcher.stats()))
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
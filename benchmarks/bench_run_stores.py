@@ -0,0 +1,62 @@
+"""
+small_matrix_app.benchmarks.bench_run_stores.py
+Compares save and load time of many small runs for the per-file and the single file backends,
+where opening files and updating the directory costs more than the data itself.
+
+Run from the repository root:
+    python -m benchmarks.bench_run_stores [matrix size] [number of runs]
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_storage_profiles import make_runs
+from matrix_app.db_widget import DatabaseModel
+from matrix_app.run_stores import PerFileRunStore, SingleFileRunStore
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    with np.errstate(over="ignore"):
+        runs = make_runs(size, count)
+    workdir = tempfile.mkdtemp()
+    print(str(count) + " runs of " + str(size) + "x" + str(size) + " matrices")
+    print(
+        "{:<20} {:>10} {:>10} {:>12}".format("backend", "save (s)", "load (s)", "reopen (s)")
+    )
+    try:
+        for backend in (PerFileRunStore, SingleFileRunStore):
+            db_dir = workdir + "/" + backend.__name__
+            db = DatabaseModel(db_dir, cache_bytes=0, backend=backend)
+            start = time.perf_counter()
+            for run_data in runs:
+                err = db.save_run(run_data)
+                if err is not None:
+                    raise RuntimeError(str(err))
+            save_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for run_data in runs:
+                db.load_run(run_data.run_name)
+            load_time = time.perf_counter() - start
+            db.close()
+
+            start = time.perf_counter()
+            DatabaseModel(db_dir, cache_bytes=0, backend=backend).close()
+            reopen_time = time.perf_counter() - start
+            print(
+                "{:<20} {:>10.3f} {:>10.3f} {:>12.4f}".format(
+                    backend.__name__, save_time, load_time, reopen_time
+                )
+            )
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
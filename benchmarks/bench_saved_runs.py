@@ -0,0 +1,77 @@
+"""
+small_matrix_app.benchmarks.bench_saved_runs.py
+Time to open the SavedRunsPage as the number of saved runs grows, against the previous page
+that built one label and one button per run.
+
+Run from the repository root:
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.bench_saved_runs
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+
+from PyQt5.QtWidgets import (
+    QApplication,
+    QFormLayout,
+    QGroupBox,
+    QLabel,
+    QPushButton,
+    QScrollArea,
+)
+
+from matrix_app.db_widget import DatabaseModel
+from matrix_app.run_index import RunIndexEntry
+from matrix_app.saved_runs_widget import SavedRunsPage
+
+
+def button_list_page(names):
+    """The previous page: a QFormLayout row with a button for every run"""
+    form_layout = QFormLayout()
+    group_box = QGroupBox()
+    for name in names:
+        button = QPushButton(name)
+        button.clicked.connect(lambda state, x=name: None)
+        form_layout.addRow(QLabel(), button)
+    group_box.setLayout(form_layout)
+    scroll = QScrollArea()
+    scroll.setWidget(group_box)
+    return scroll
+
+
+def main():
+    app = QApplication(sys.argv)
+    print("{:>8} {:>14} {:>14}".format("runs", "previous (s)", "model (s)"))
+    for count in (1000, 10000, 100000):
+        db_dir = tempfile.mkdtemp()
+        db = DatabaseModel(db_dir + "/SavedRuns")
+        db._index.replace_all(
+            [
+                RunIndexEntry("Run" + str(i), "Run" + str(i) + ".h5", True, {"C": (i, i)})
+                for i in range(count)
+            ]
+        )
+        db._load_index()
+
+        start = time.perf_counter()
+        page = SavedRunsPage(db, print)
+        model = time.perf_counter() - start
+        page.deleteLater()
+
+        previous = float("nan")
+        # Too slow to wait for past ten thousand runs
+        if count <= 10000:
+            start = time.perf_counter()
+            page = button_list_page(db.get_previous_runs())
+            previous = time.perf_counter() - start
+            page.deleteLater()
+        app.processEvents()
+        print("{:>8} {:>14.4f} {:>14.4f}".format(count, previous, model))
+        db.close()
+        shutil.rmtree(db_dir)
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+small_matrix_app.benchmarks.bench_sparse.py
+Multiplies, takes the stats of and saves mostly zero matrices once as dense arrays and once as sparse
+matrices, and reports the time and the bytes of C, its stats and the saved run for each.
+Needs scipy.
+
+Run from the repository root:
+    python -m benchmarks.bench_sparse [matrix size] [share of nonzero entries]
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from matrix_app.db_widget import DatabaseModel, DisplayData, RunData
+from matrix_app.sparse_matrices import nbytes, sparse
+from matrix_app.stats_engine import calculate_stats
+
+
+def mostly_zero(rng, size: int, share: float) -> np.ndarray:
+    return (rng.random((size, size)) < share) * rng.integers(1, 10, size=(size, size)).astype(float)
+
+
+def measure(db: DatabaseModel, name: str, A, B) -> (float, float, float, int, int):
+    """Seconds to multiply, to take the stats and to save, bytes of C and its stats, bytes saved"""
+    start = time.perf_counter()
+    C = A @ B
+    multiplied = time.perf_counter()
+    stats = calculate_stats(C)
+    calculated = time.perf_counter()
+    run = RunData(
+        name, [DisplayData("A", A), DisplayData("B", B), DisplayData("C", C)], stats
+    )
+    err = db.save_run(run)
+    if err is not None:
+        raise RuntimeError(str(err))
+    saved = time.perf_counter()
+    held = nbytes(C) + sum(nbytes(s.data) for s in stats)
+    return (
+        multiplied - start,
+        calculated - multiplied,
+        saved - calculated,
+        held,
+        db.run_summary(name).nbytes,
+    )
+
+
+def main():
+    if sparse is None:
+        print("scipy is not installed")
+        sys.exit(1)
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    share = float(sys.argv[2]) if len(sys.argv) > 2 else 0.001
+    rng = np.random.default_rng(0)
+    A = mostly_zero(rng, size, share)
+    B = mostly_zero(rng, size, share)
+    print(str(size) + "x" + str(size) + " matrices, " + str(share) + " of the entries nonzero")
+    workdir = tempfile.mkdtemp()
+    try:
+        db = DatabaseModel(workdir + "/SavedRuns", cache_bytes=0)
+        print(
+            "{:<8} {:>10} {:>10} {:>10} {:>14} {:>14}".format(
+                "", "multiply", "stats", "save", "C+stats MB", "saved MB"
+            )
+        )
+        for name, a, b in (
+            ("dense", A, B),
+            ("sparse", sparse.csr_matrix(A), sparse.csr_matrix(B)),
+        ):
+            multiply_s, stats_s, save_s, held, saved = measure(db, name, a, b)
+            print(
+                "{:<8} {:>9.3f}s {:>9.3f}s {:>9.3f}s {:>14.2f} {:>14.2f}".format(
+                    name, multiply_s, stats_s, save_s, held / 1e6, saved / 1e6
+                )
+            )
+        db.close()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+small_matrix_app.benchmarks.bench_stats.py
+Compares the blocked stats kernel against the previous DisplayStatsPage._calculate_stats code path,
+which recomputed C = A.dot(B) and made a separate full pass over C for every stat.
+
+Run from the repository root:
+    python -m benchmarks.bench_stats
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from matrix_app.stats_engine import calculate_stats
+
+
+def previous_calculate_stats(A, B):
+    """The stats code path before the blocked kernel, kept here for comparison"""
+    C = A.dot(B)
+    cprod = C.cumprod()
+    cprodc = C.cumprod(axis=0)
+    cprodr = C.cumprod(axis=1)
+    stats = [
+        cprod.max() > sys.maxsize,
+        C.min(),
+        C.mean(),
+        C.max(),
+        cprodc.max() > sys.maxsize,
+        C.min(axis=0),
+        C.mean(axis=0),
+        C.max(axis=0),
+        cprodr.max() > sys.maxsize,
+        C.min(axis=1).reshape(-1, 1),
+        C.mean(axis=1).reshape(-1, 1),
+        C.max(axis=1).reshape(-1, 1),
+    ]
+    return cprod, cprodc, cprodr, stats
+
+
+def best_of(repeats, func, *args) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print("{:>6} {:>14} {:>14} {:>9}".format("n", "previous (s)", "blocked (s)", "speedup"))
+    with np.errstate(over="ignore"):
+        for n in (100, 500, 1000, 2000):
+            A = rng.random((n, n))
+            B = rng.random((n, n))
+            C = A.dot(B)
+            repeats = 5 if n <= 1000 else 2
+            previous = best_of(repeats, previous_calculate_stats, A, B)
+            blocked = best_of(repeats, calculate_stats, C)
+            print(
+                "{:>6} {:>14.4f} {:>14.4f} {:>8.2f}x".format(
+                    n, previous, blocked, previous / blocked
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+small_matrix_app.benchmarks.bench_storage_profiles.py
+Reports the size, save time and load time of a set of runs for every storage profile.
+The runs look like the ones the app saves: random ints between 0 and 100 for A and B, plus C and every stat.
+
+Run from the repository root:
+    python -m benchmarks.bench_storage_profiles [matrix size] [number of runs]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from matrix_app.db_widget import DatabaseModel, DisplayData, RunData
+from matrix_app.stats_engine import calculate_stats
+from matrix_app.storage_profiles import PROFILES
+
+
+def make_runs(size: int, count: int):
+    rng = np.random.default_rng(0)
+    runs = []
+    for i in range(count):
+        A = rng.integers(0, 101, size=(size, size)).astype(float)
+        B = rng.integers(0, 101, size=(size, size)).astype(float)
+        C = A.dot(B)
+        runs.append(
+            RunData(
+                "Run" + str(i),
+                [DisplayData("A", A), DisplayData("B", B), DisplayData("C", C)],
+                calculate_stats(C),
+            )
+        )
+    return runs
+
+
+def directory_bytes(directory: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(directory, f))
+        for f in os.listdir(directory)
+        if f.endswith(".h5")
+    )
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    with np.errstate(over="ignore"):
+        runs = make_runs(size, count)
+    workdir = tempfile.mkdtemp()
+    print(str(count) + " runs of " + str(size) + "x" + str(size) + " matrices")
+    print(
+        "{:<28} {:>10} {:>10} {:>10}".format("profile", "size (MB)", "save (s)", "load (s)")
+    )
+    try:
+        for name, profile in PROFILES.items():
+            db = DatabaseModel(
+                os.path.join(workdir, name), cache_bytes=0, storage_profile=profile
+            )
+            start = time.perf_counter()
+            for run_data in runs:
+                err = db.save_run(run_data)
+                if err is not None:
+                    raise RuntimeError(str(err))
+            save_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for run_data in runs:
+                db.load_run(run_data.run_name)
+            load_time = time.perf_counter() - start
+            db.close()
+
+            print(
+                "{:<28} {:>10.1f} {:>10.3f} {:>10.3f}".format(
+                    name,
+                    directory_bytes(os.path.join(workdir, name)) / 2 ** 20,
+                    save_time,
+                    load_time,
+                )
+            )
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
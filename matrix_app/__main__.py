@@ -0,0 +1,12 @@
+"""
+small_matrix_app.matrix_app.__main__.py
+Command line interface, see cli.py:
+    python -m matrix_app --help
+"""
+
+import sys
+
+from matrix_app.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
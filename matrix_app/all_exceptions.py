@@ -30,3 +30,13 @@ class InternalDbError(Exception):
 
     def __str__(self):
         return "DB ERROR: " + self.message
+
+
+# Background job stopped on request
+class JobCancelled(Exception):
+    def __init__(self, message="Job cancelled"):
+        super().__init__(message)
+        self.message = message
+
+    def __str__(self):
+        return "Cancelled: " + self.message
@@ -0,0 +1,205 @@
+"""
+small_matrix_app.matrix_app.batch_engine.py
+Headless batch engine that computes and saves many runs without the Qt UI.
+Products and stats are computed in a pool of worker processes (one per core by default)
+while the finished runs are saved to disk through the DatabaseModel.
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+from matrix_app.db_widget import DatabaseModel, DisplayData, RunData
+from matrix_app.random_matrices import (
+    AUTO_DTYPE,
+    DISTRIBUTIONS,
+    DTYPE_CHOICES,
+    RandomMatrixSpec,
+    RunGenerator,
+    spawn_seeds,
+)
+from matrix_app.stats_engine import calculate_stats, multiply
+
+
+# Random runs are described the same way the MatrixEntryPage describes them
+RandomRunSpec = RandomMatrixSpec
+
+
+class BatchReport:
+    def __init__(self):
+        """Outcome of one batch: what was saved, what failed and how fast it went"""
+        self.saved = []  # type: List[str]
+        self.failures = []  # type: List[Tuple[str, str]]
+        self.elapsed = 0.0
+
+    @property
+    def runs_per_sec(self) -> float:
+        if self.elapsed <= 0:
+            return 0.0
+        return len(self.saved) / self.elapsed
+
+    def __str__(self):
+        return (
+            "Saved "
+            + str(len(self.saved))
+            + " runs ("
+            + str(len(self.failures))
+            + " failed) in "
+            + "{:.3f}".format(self.elapsed)
+            + "s: "
+            + "{:.1f}".format(self.runs_per_sec)
+            + " runs/sec"
+        )
+
+
+def _compute_run(job) -> RunData:
+    """Worker process entry point. Must stay at module level so it can be pickled"""
+    run_name, A, B, spec, seed, with_stats = job
+    generator = None
+    if spec is not None:
+        generator = RunGenerator(spec, seed)
+        A, B = generator.make_matrices()
+    A = np.asarray(A)
+    B = np.asarray(B)
+    C = multiply(A, B)
+    stats = calculate_stats(C) if with_stats else []
+    matrices = [DisplayData("A", A), DisplayData("B", B), DisplayData("C", C)]
+    return RunData(run_name, matrices, stats, random=run_name, generator=generator)
+
+
+class BatchEngine:
+    def __init__(
+        self,
+        database_model: DatabaseModel,
+        workers: int = None,
+        with_stats: bool = True,
+        run_prefix: str = None,
+        max_in_flight: int = None,
+        seed_only: bool = False,
+    ):
+        """
+        Computes runs in bulk and persists them through database_model.save_runs
+        Args:
+            database_model -- where finished runs are saved
+            workers -- number of worker processes, defaults to every core on the box
+            with_stats -- whether to calculate and save stats along with A, B and C
+            run_prefix -- alphanumeric prefix of the generated run names
+            max_in_flight -- bound on submitted but unsaved runs, so a long input stream is never fully buffered
+            seed_only -- save random runs as their seed and spec instead of their data, see DatabaseModel.save_run
+        """
+        self.db = database_model
+        self.workers = workers or os.cpu_count() or 1
+        self.with_stats = with_stats
+        if run_prefix is None:
+            run_prefix = "Batch" + uuid.uuid4().hex[:8]
+        if not run_prefix.isalnum():
+            raise ValueError("run_prefix must be alphanumeric")
+        self.run_prefix = run_prefix
+        self.max_in_flight = max_in_flight or 2 * self.workers
+        self.seed_only = seed_only
+
+    def run_pairs(self, pairs: Iterable) -> BatchReport:
+        """Computes and saves one run per (A, B) pair. pairs may be any iterable, including a generator"""
+        jobs = (
+            (self.run_prefix + str(i), A, B, None, None, self.with_stats)
+            for i, (A, B) in enumerate(pairs)
+        )
+        return self._run(jobs)
+
+    def run_random(
+        self, count: int, spec: RandomRunSpec = None, seed: int = None
+    ) -> BatchReport:
+        """Computes and saves count runs with random input matrices described by spec.
+        Every run gets its own seed derived from seed, recorded with the run so it can be generated again
+        """
+        if spec is None:
+            spec = RandomMatrixSpec()
+        seeds = spawn_seeds(seed, count)
+        jobs = (
+            (self.run_prefix + str(i), None, None, spec, seeds[i], self.with_stats)
+            for i in range(count)
+        )
+        return self._run(jobs)
+
+    def _run(self, jobs) -> BatchReport:
+        report = BatchReport()
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            in_flight = set()
+            # future -> name of the run it computes, so a run that fails is reported by name
+            run_names = {}
+            for job in jobs:
+                future = pool.submit(_compute_run, job)
+                run_names[future] = job[0]
+                in_flight.add(future)
+                if len(in_flight) >= self.max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    self._save_finished(done, run_names, report)
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                self._save_finished(done, run_names, report)
+        report.elapsed = time.perf_counter() - start
+        return report
+
+    def _save_finished(self, futures, run_names: dict, report: BatchReport):
+        # Runs that finished together are saved as one group commit
+        runs = []
+        for future in futures:
+            run_name = run_names.pop(future)
+            try:
+                runs.append(future.result())
+            except Exception as e:
+                report.failures.append((run_name, "Could not compute run: " + str(e)))
+        seed_only = [self.seed_only and r.generator is not None for r in runs]
+        for flag in (True, False):
+            batch = [r for r, s in zip(runs, seed_only) if s == flag]
+            if not batch:
+                continue
+            for run_data, err in zip(batch, self.db.save_runs(batch, seed_only=flag)):
+                if err is None:
+                    report.saved.append(run_data.run_name)
+                else:
+                    report.failures.append((run_data.run_name, str(err)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute and save random runs in bulk")
+    parser.add_argument("count", type=int, help="number of runs to create")
+    parser.add_argument("--db", default="SavedRuns", help="database directory")
+    parser.add_argument("--max-dim", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--low", type=int, default=0)
+    parser.add_argument("--high", type=int, default=100)
+    parser.add_argument("--dtype", choices=DTYPE_CHOICES, default=AUTO_DTYPE)
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default=DISTRIBUTIONS[0])
+    parser.add_argument("--density", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--no-stats", action="store_true")
+    parser.add_argument(
+        "--seed-only", action="store_true", help="save each run as its seed instead of its data"
+    )
+    args = parser.parse_args()
+
+    spec = RandomMatrixSpec(
+        args.max_dim, args.low, args.high, args.dtype, args.distribution, args.density
+    )
+    engine = BatchEngine(
+        DatabaseModel(args.db),
+        workers=args.workers,
+        with_stats=not args.no_stats,
+        seed_only=args.seed_only,
+    )
+    report = engine.run_random(args.count, spec, args.seed)
+    print(report)
+    sys.exit(1 if report.failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+small_matrix_app.matrix_app.blocked_multiply.py
+Tiled matrix multiply for products that do not fit in memory.
+A and B can be anything that supports 2-d slicing (ndarrays, np.memmap, h5py datasets, sparse matrices),
+C is written one panel of rows at a time and the stats are collected as each panel is produced.
+"""
+
+from typing import Callable
+
+import numpy as np
+
+from matrix_app.narrow_dtypes import product_dtypes
+from matrix_app.sparse_matrices import to_dense
+from matrix_app.stats_engine import StatsAccumulator
+
+DEFAULT_MEMORY_LIMIT = 256 * 1024 * 1024
+
+
+def plan_tiles(
+    m: int, k: int, n: int, itemsize: int, memory_limit: int = DEFAULT_MEMORY_LIMIT
+) -> (int, int, int):
+    """Chooses tile sizes so the data held at once stays under memory_limit.
+    Half of the budget goes to the panel of C rows (plus the stats buffers made from it),
+    the other half to the A and B tiles and their product. A full row of C must fit in memory.
+
+    Returns (rows of C per panel, tile size along k, tile size along the columns of C)
+    """
+    # C panel, its product tile, three cumulative product buffers and, for cumulative products
+    # that leave their range, about fourteen more for their log space form (see log_cumprod.py)
+    panel_rows = memory_limit // (2 * 19 * n * itemsize)
+    panel_rows = int(max(1, min(m, panel_rows)))
+
+    # rows * t (A tile) + t * t (B tile) + rows * t (product tile) <= half the budget
+    half = memory_limit // (2 * itemsize)
+    tile = int(-panel_rows + np.sqrt(panel_rows ** 2 + half))
+    tile = max(1, tile)
+    return panel_rows, min(k, tile), min(n, tile)
+
+
+def blocked_multiply(
+    a,
+    b,
+    c_out=None,
+    memory_limit: int = DEFAULT_MEMORY_LIMIT,
+    stats: StatsAccumulator = None,
+    progress: Callable = None,
+):
+    """Computes C = A x B tile by tile
+    Args:
+        a -- mxk source matrix
+        b -- kxn source matrix
+        c_out -- where C is written, e.g. an h5py dataset. A new ndarray when None
+        memory_limit -- bytes of matrix data held in memory at once
+        stats -- accumulator that receives every finished panel of rows of C
+        progress -- called with (rows of C done, total rows) after every panel. Raising from it stops the multiply
+    Returns c_out
+    """
+    m, k = a.shape
+    k_b, n = b.shape
+    if k != k_b:
+        raise ValueError(
+            "shapes " + str(a.shape) + " and " + str(b.shape) + " not aligned"
+        )
+    # Panels are summed in the compute dtype, which cannot overflow, and C is kept in the returned one
+    dtype, out_dtype = product_dtypes(a, b)
+    if c_out is None:
+        c_out = np.empty((m, n), dtype=out_dtype)
+    panel_rows, k_tile, n_tile = plan_tiles(m, k, n, dtype.itemsize, memory_limit)
+
+    for r0 in range(0, m, panel_rows):
+        r1 = min(m, r0 + panel_rows)
+        panel = np.zeros((r1 - r0, n), dtype=dtype)
+        for k0 in range(0, k, k_tile):
+            k1 = min(k, k0 + k_tile)
+            a_tile = to_dense(a[r0:r1, k0:k1]).astype(dtype, copy=False)
+            for c0 in range(0, n, n_tile):
+                c1 = min(n, c0 + n_tile)
+                b_tile = to_dense(b[k0:k1, c0:c1]).astype(dtype, copy=False)
+                panel[:, c0:c1] += a_tile.dot(b_tile)
+        panel = panel.astype(out_dtype, copy=False)
+        c_out[r0:r1] = panel
+        if stats is not None:
+            stats.update(panel)
+        if progress is not None:
+            progress(r1, m)
+    return c_out
+
+
+def copy_blocked(source, target, memory_limit: int = DEFAULT_MEMORY_LIMIT):
+    """Copies a 2-d source into target a block of rows at a time"""
+    m, n = source.shape
+    rows = int(max(1, memory_limit // max(1, n * target.dtype.itemsize)))
+    for r0 in range(0, m, rows):
+        target[r0 : r0 + rows] = to_dense(source[r0 : r0 + rows])
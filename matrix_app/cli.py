@@ -0,0 +1,394 @@
+"""
+small_matrix_app.matrix_app.cli.py
+Command line interface to the stats engine and the saved runs, for headless servers and scripts:
+    python -m matrix_app multiply A.npy B.csv -o C.npy
+    python -m matrix_app stats A.npy B.npy -o StatsDir
+    python -m matrix_app save Run1 A.npy B.npy --db SavedRuns
+    python -m matrix_app load Run1 --print C
+    python -m matrix_app list --sort created
+    python -m matrix_app export Run1 Run1Files --format csv
+    python -m matrix_app bench 500
+Matrices are read from .npy, .csv and .h5 files, e.g. runs.h5:matrices/A (see matrix_io.py), in their narrowest
+exact dtype (see narrow_dtypes.py), as the MatrixEntryPage enters them.
+PyQt5 is never imported. numpy, h5py and the stats engine are only imported by the commands that use them,
+so the command line starts, and list answers from the run index, without loading them.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+from os import path
+
+DEFAULT_DB = "SavedRuns"
+EXPORT_FORMATS = ("npy", "csv")
+H5_DATASET_SEPARATOR = ".h5:"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m matrix_app",
+        description="Multiplies matrices, calculates their stats and works with saved runs, without the GUI",
+    )
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+
+    # Where the saved runs are, for the commands that use them
+    database = argparse.ArgumentParser(add_help=False)
+    database.add_argument("--db", default=DEFAULT_DB, help="database directory")
+    database.add_argument(
+        "--single-file",
+        action="store_true",
+        help="the database keeps every run in one file, see run_stores.SingleFileRunStore",
+    )
+
+    multiply = commands.add_parser("multiply", help="multiply two matrices")
+    multiply.add_argument("a", help="mxk matrix file")
+    multiply.add_argument("b", help="kxn matrix file")
+    multiply.add_argument("-o", "--output", help=".npy or .csv file the product is written to")
+    multiply.set_defaults(run=multiply_command)
+
+    stats = commands.add_parser(
+        "stats", help="calculate the stats of a matrix, or of the product of two"
+    )
+    stats.add_argument("matrices", nargs="+", metavar="matrix", help="C, or A and B")
+    stats.add_argument("-o", "--output", help="directory every stat is written to")
+    stats.add_argument("--format", choices=EXPORT_FORMATS, default=EXPORT_FORMATS[0])
+    stats.set_defaults(run=stats_command)
+
+    save = commands.add_parser(
+        "save", parents=[database], help="multiply two matrices and save them as a run"
+    )
+    save.add_argument("name", help="name of the run")
+    save.add_argument("a", help="mxk matrix file")
+    save.add_argument("b", help="kxn matrix file")
+    save.add_argument("--no-stats", action="store_true")
+    save.add_argument("--profile", help="storage profile, see storage_profiles.PROFILES")
+    save.set_defaults(run=save_command)
+
+    load = commands.add_parser("load", parents=[database], help="load a saved run")
+    load.add_argument("name", help="name of the run")
+    load.add_argument(
+        "--print",
+        action="append",
+        default=[],
+        metavar="LABEL",
+        dest="labels",
+        help="print this matrix or stat of the run, e.g. C",
+    )
+    load.set_defaults(run=load_command)
+
+    listing = commands.add_parser(
+        "list", parents=[database], help="list the saved runs from the run index"
+    )
+    listing.add_argument("--sort", choices=("name", "created", "shape"), default="name")
+    listing.add_argument("--descending", action="store_true")
+    listing.add_argument("--contains", default="", help="only runs whose name contains this")
+    listing.add_argument("--json", action="store_true", help="one JSON object per run")
+    listing.set_defaults(run=list_command)
+
+    export = commands.add_parser(
+        "export", parents=[database], help="write every matrix and stat of a run to files"
+    )
+    export.add_argument("name", help="name of the run")
+    export.add_argument("directory", help="directory the files are written to")
+    export.add_argument("--format", choices=EXPORT_FORMATS, default=EXPORT_FORMATS[0])
+    export.set_defaults(run=export_command)
+
+    bench = commands.add_parser(
+        "bench", help="time imports, multiply, stats, save and load of a random run"
+    )
+    bench.add_argument("size", type=int, nargs="?", default=500)
+    bench.set_defaults(run=bench_command)
+    return parser
+
+
+def main(argv=None) -> int:
+    """Runs one command. Returns the exit status: 0 on success, 1 when the command failed"""
+    args = build_parser().parse_args(argv)
+    try:
+        return args.run(args)
+    except BrokenPipeError:
+        # e.g. piped into head. Later writes to stdout, such as the flush at exit, go nowhere
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    except Exception as e:
+        print("error: " + str(e), file=sys.stderr)
+        return 1
+
+
+def multiply_command(args) -> int:
+    from matrix_app.stats_engine import multiply
+
+    A, B = read_matrix(args.a), read_matrix(args.b)
+    start = time.perf_counter()
+    C = multiply(A, B)
+    elapsed = time.perf_counter() - start
+    if args.output is not None:
+        from matrix_app.matrix_io import save_matrix_file
+
+        save_matrix_file(args.output, C)
+    print(describe("C", C) + " in {:.3f}s".format(elapsed))
+    return 0
+
+
+def stats_command(args) -> int:
+    from matrix_app.stats_engine import calculate_stats, multiply
+
+    if len(args.matrices) > 2:
+        raise ValueError("stats takes C, or A and B")
+    matrices = [read_matrix(f) for f in args.matrices]
+    C = matrices[0] if len(matrices) == 1 else multiply(*matrices)
+    start = time.perf_counter()
+    stats = calculate_stats(C)
+    elapsed = time.perf_counter() - start
+    for s in stats:
+        print(describe(s.label, s.data))
+    print("{} stats in {:.3f}s".format(len(stats), elapsed))
+    if args.output is not None:
+        write_files(args.output, stats, args.format)
+    return 0
+
+
+def save_command(args) -> int:
+    from matrix_app.db_widget import DisplayData, RunData
+    from matrix_app.run_text import summary_text
+    from matrix_app.stats_engine import calculate_stats, multiply
+
+    A, B = read_matrix(args.a), read_matrix(args.b)
+    C = multiply(A, B)
+    stats = [] if args.no_stats else calculate_stats(C)
+    run = RunData(
+        args.name,
+        [DisplayData("A", A), DisplayData("B", B), DisplayData("C", C)],
+        stats,
+    )
+    db = open_db(args, args.profile)
+    try:
+        err = db.save_run(run)
+        if err is not None:
+            print("error: " + str(err), file=sys.stderr)
+            return 1
+        print(summary_text(db.run_summary(args.name)))
+    finally:
+        db.close()
+    return 0
+
+
+def load_command(args) -> int:
+    import numpy as np
+
+    from matrix_app.run_text import summary_text
+    from matrix_app.sparse_matrices import to_dense
+
+    db = open_db(args)
+    try:
+        entry = db.run_summary(args.name)
+        run = db.load_run(args.name, lazy=True)
+        print(summary_text(entry))
+        loaded = {d.label.strip(): d for d in run.matrices + run.stats}
+        for label in args.labels:
+            if label.strip() not in loaded:
+                raise ValueError(
+                    args.name + " has no " + label + ", it has " + ", ".join(loaded)
+                )
+            print("")
+            print(label + ":")
+            print(np.array2string(to_dense(loaded[label.strip()].data)))
+    finally:
+        db.close()
+    return 0
+
+
+def list_command(args) -> int:
+    from matrix_app.run_text import format_bytes, format_time
+
+    if not path.isdir(args.db):
+        print("No saved runs in " + args.db, file=sys.stderr)
+        return 0
+    index, db = open_index(args)
+    try:
+        after = None
+        while True:
+            page = index.page(args.sort, args.descending, args.contains, after)
+            for entry in page:
+                if args.json:
+                    print(json.dumps(entry_record(entry)))
+                    continue
+                shape = entry.shapes.get("C", ())
+                print(
+                    "{:<30} {}  {:<9} {:>12}  {}".format(
+                        entry.run_name,
+                        format_time(entry.created),
+                        "stats" if entry.has_stats else "no stats",
+                        " x ".join(str(d) for d in shape),
+                        format_bytes(entry.nbytes),
+                    )
+                )
+            if not page:
+                break
+            after = page[-1]
+    finally:
+        if db is not None:
+            db.close()
+        else:
+            index.close()
+    return 0
+
+
+def export_command(args) -> int:
+    db = open_db(args)
+    try:
+        run = db.load_run(args.name)
+        written = write_files(args.directory, run.matrices + run.stats, args.format)
+    finally:
+        db.close()
+    print("Wrote " + str(written) + " files to " + args.directory)
+    return 0
+
+
+def bench_command(args) -> int:
+    import tempfile
+    import shutil
+
+    start = time.perf_counter()
+    import numpy as np
+    import h5py
+
+    from matrix_app.db_widget import DatabaseModel, DisplayData, RunData
+    from matrix_app.random_matrices import AUTO_DTYPE, RandomMatrixSpec
+    from matrix_app.stats_engine import calculate_stats, multiply
+
+    timings = [("import numpy, h5py, stats engine", time.perf_counter() - start)]
+    rng = np.random.default_rng(0)
+    spec = RandomMatrixSpec(dtype=AUTO_DTYPE)
+    A = spec.make_matrix(rng, (args.size, args.size))
+    B = spec.make_matrix(rng, (args.size, args.size))
+    workdir = tempfile.mkdtemp()
+    try:
+        db = DatabaseModel(path.join(workdir, DEFAULT_DB), cache_bytes=0)
+        start = time.perf_counter()
+        C = multiply(A, B)
+        timings.append(("multiply", time.perf_counter() - start))
+        start = time.perf_counter()
+        stats = calculate_stats(C)
+        timings.append(("stats", time.perf_counter() - start))
+        run = RunData(
+            "Bench",
+            [DisplayData("A", A), DisplayData("B", B), DisplayData("C", C)],
+            stats,
+        )
+        start = time.perf_counter()
+        err = db.save_run(run)
+        timings.append(("save", time.perf_counter() - start))
+        if err is not None:
+            raise RuntimeError(str(err))
+        start = time.perf_counter()
+        db.load_run("Bench")
+        timings.append(("load", time.perf_counter() - start))
+        db.close()
+    finally:
+        shutil.rmtree(workdir)
+    print(
+        "{0}x{0} matrices of ints from 0 to 100 ({1}), h5py {2}".format(
+            args.size, A.dtype, h5py.version.version
+        )
+    )
+    for step, seconds in timings:
+        print("{:<34} {:>8.3f}s".format(step, seconds))
+    return 0
+
+
+def read_matrix(file_name: str):
+    """Reads a matrix file in its narrowest exact dtype. name.h5:group/dataset reads that dataset of an .h5 file"""
+    from matrix_app.matrix_io import load_matrix_file
+    from matrix_app.narrow_dtypes import narrow
+
+    dataset = None
+    if H5_DATASET_SEPARATOR in file_name:
+        file_name, dataset = file_name.split(H5_DATASET_SEPARATOR, 1)
+        file_name += ".h5"
+    return narrow(load_matrix_file(file_name, dataset))
+
+
+def describe(label: str, matrix) -> str:
+    """label: the value of a single value stat, otherwise the shape and dtype"""
+    import numpy as np
+
+    from matrix_app.run_text import format_value
+    from matrix_app.sparse_matrices import dtype_of, is_sparse
+
+    shape = np.shape(matrix)
+    if len(shape) == 0:
+        return label + ": " + format_value(matrix)
+    dtype = dtype_of(matrix)
+    # A cumulative product kept as sign and log10 magnitude, see log_cumprod.py
+    dtype_text = "(" + ", ".join(dtype.names) + ")" if dtype.names else str(dtype)
+    text = label + ": " + " x ".join(str(d) for d in shape) + " " + dtype_text
+    return text + (" sparse" if is_sparse(matrix) else "")
+
+
+def write_files(directory: str, items, file_format: str) -> int:
+    """Writes every DisplayData to directory/<label>.<file_format>. Returns the number of files"""
+    from matrix_app.matrix_io import save_matrix_file
+
+    os.makedirs(directory, exist_ok=True)
+    for item in items:
+        save_matrix_file(path.join(directory, file_label(item.label) + "." + file_format), item.data)
+    return len(items)
+
+
+def file_label(label: str) -> str:
+    """A matrix or stat label as a file name, e.g. Cumulative_Product_down_each_Column"""
+    return re.sub(r"[^A-Za-z0-9]+", "_", label).strip("_")
+
+
+def entry_record(entry) -> dict:
+    return {
+        "name": entry.run_name,
+        "file": entry.file_name,
+        "has_stats": entry.has_stats,
+        "shapes": {k: list(v) for k, v in entry.shapes.items()},
+        "dtypes": entry.dtypes,
+        "created": entry.created,
+        "modified": entry.modified,
+        "nbytes": entry.nbytes,
+        "scalars": entry.scalars,
+    }
+
+
+def open_db(args, profile: str = None):
+    from matrix_app.db_widget import DatabaseModel
+    from matrix_app.run_stores import PerFileRunStore, SingleFileRunStore
+    from matrix_app.storage_profiles import DEFAULT_PROFILE, PROFILES
+
+    if profile is not None and profile not in PROFILES:
+        raise ValueError("profile must be one of " + ", ".join(PROFILES))
+    return DatabaseModel(
+        args.db,
+        cache_bytes=0,
+        storage_profile=DEFAULT_PROFILE if profile is None else PROFILES[profile],
+        backend=SingleFileRunStore if args.single_file else PerFileRunStore,
+    )
+
+
+def open_index(args):
+    """Returns (run index, None) when the index of args.db is up to date, so the runs are listed without
+    h5py or numpy. Otherwise the index is rebuilt from the run files and (its index, DatabaseModel) is returned
+    """
+    from matrix_app.run_index import RunIndex
+
+    index = None
+    if path.exists(path.join(args.db, RunIndex.FILE_NAME)):
+        index = RunIndex(args.db)
+        if not index.needs_rebuild:
+            return index, None
+        # Recreated empty by this process, which is now the one that has to fill it
+        index.close()
+    db = open_db(args)
+    if index is not None:
+        db.rebuild_index()
+    return db._index, db
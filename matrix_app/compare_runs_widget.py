@@ -0,0 +1,139 @@
+"""
+small_matrix_app.matrix_app.compare_runs_widget.py
+Compare Runs Widget shows the statistics across the runs selected on the saved runs page:
+how the min, mean and max of C are distributed over the runs, and the element-wise
+mean, min and max of C over the runs where it has the same shape.
+The page is built once by the main window and shows each comparison with show_aggregate.
+"""
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import (
+    QComboBox,
+    QHBoxLayout,
+    QHeaderView,
+    QLabel,
+    QTableView,
+    QTableWidget,
+    QTableWidgetItem,
+    QVBoxLayout,
+)
+
+from matrix_app.display_stats_widget import TableModel
+from matrix_app.page_stack import Page
+from matrix_app.run_text import format_value
+from matrix_app.run_aggregation import RunAggregate, ScalarDistribution
+
+
+class CompareRunsPage(Page):
+    ELEMENTWISE = ("Mean", "Min", "Max")
+
+    def __init__(self, aggregate: RunAggregate = None, parent=None):
+        """
+        Args:
+        aggregate -- result of DatabaseModel.aggregate_runs for the compared runs, None for no runs
+        """
+        super().__init__(parent)
+        self.aggregate = None
+        self._shapes = []
+        self.elementwise_data = None  # the matrix the element-wise table shows
+        self._initUi()
+        self.show_aggregate(aggregate or RunAggregate())
+
+    def _initUi(self):
+        self.setWindowTitle("Compare Runs")
+        layout = QVBoxLayout(self)
+
+        self.title_label = QLabel()
+        self.title_label.setWordWrap(True)
+        layout.addWidget(self.title_label)
+
+        layout.addWidget(QLabel("Single value stats across runs"))
+        self.scalars_table = QTableWidget(0, len(ScalarDistribution.SUMMARY))
+        self.scalars_table.setHorizontalHeaderLabels(list(ScalarDistribution.SUMMARY))
+        layout.addWidget(self.scalars_table)
+
+        self.elementwise_label = QLabel()
+        layout.addWidget(self.elementwise_label)
+        self.shape_box = QComboBox()
+        self.elementwise_box = QComboBox()
+        self.shape_box.currentIndexChanged.connect(self._show_elementwise)
+        self.elementwise_box.currentIndexChanged.connect(self._show_elementwise)
+        selectors = QHBoxLayout()
+        selectors.addWidget(self.shape_box)
+        selectors.addWidget(self.elementwise_box)
+        layout.addLayout(selectors)
+
+        self.elementwise_view = QTableView()
+        self.elementwise_view.horizontalHeader().hide()
+        self.elementwise_view.verticalHeader().hide()
+        self.elementwise_view.horizontalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.elementwise_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        layout.addWidget(self.elementwise_view)
+        self.setLayout(layout)
+
+    def show_aggregate(self, aggregate: RunAggregate):
+        """Shows the comparison of other runs in the widgets already built"""
+        self.aggregate = aggregate
+        self._shapes = list(aggregate.groups.keys())
+        compared = sum(g.count for g in aggregate.groups.values())
+        self.title_label.setText(
+            "Comparing " + str(compared) + " runs" + self._skipped_text()
+        )
+        self._fill_scalars_table()
+
+        label = aggregate.label
+        self.elementwise_label.setText(
+            "Element-wise across runs with the same shape of " + label
+        )
+        # Filled without a redraw of the element-wise table for every item
+        for box in (self.shape_box, self.elementwise_box):
+            box.blockSignals(True)
+            box.clear()
+        for shape in self._shapes:
+            group = aggregate.groups[shape]
+            self.shape_box.addItem(
+                " x ".join(str(d) for d in shape) + " (" + str(group.count) + " runs)"
+            )
+        self.elementwise_box.addItems([s + " of " + label for s in self.ELEMENTWISE])
+        for box in (self.shape_box, self.elementwise_box):
+            box.blockSignals(False)
+        self._show_elementwise()
+
+    def reset(self):
+        """Drops the compared runs, so their element-wise matrices are not kept while the page is hidden"""
+        self.show_aggregate(RunAggregate())
+
+    def _skipped_text(self) -> str:
+        if not self.aggregate.skipped:
+            return ""
+        return ". Left out: " + ", ".join(
+            name + " (" + reason + ")" for name, reason in self.aggregate.skipped.items()
+        )
+
+    def _fill_scalars_table(self):
+        distributions = list(self.aggregate.scalars.values())
+        table = self.scalars_table
+        table.clearContents()
+        table.setRowCount(len(distributions))
+        table.setVerticalHeaderLabels([d.label for d in distributions])
+        for row, distribution in enumerate(distributions):
+            for column, value in enumerate(distribution.summary()):
+                item = QTableWidgetItem(format_value(value))
+                item.setFlags(item.flags() & ~Qt.ItemIsEditable)
+                table.setItem(row, column, item)
+        table.resizeColumnsToContents()
+
+    def _show_elementwise(self, *args):
+        if not self._shapes:
+            self.elementwise_data = None
+            self.elementwise_view.setModel(None)
+            return
+        group = self.aggregate.groups[self._shapes[self.shape_box.currentIndex()]]
+        which = self.ELEMENTWISE[self.elementwise_box.currentIndex()]
+        if which == "Mean":
+            self.elementwise_data = group.mean()
+        elif which == "Min":
+            self.elementwise_data = group.min
+        else:
+            self.elementwise_data = group.max
+        self.elementwise_view.setModel(TableModel(self.elementwise_data))
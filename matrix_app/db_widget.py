@@ -3,31 +3,67 @@ small_matrix_app.matrix_app.db_widget.py
 This widgets writes data to or loads data from disk
 """
 
-import os
+import json
+import time
 
-import h5py
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
-from PyQt5 import QtWidgets
+import h5py
 
-from typing import List
+from typing import Callable, List
 
 import numpy as np
 
-from os import mkdir, remove, path, listdir
-from os.path import isfile, join
+from os import mkdir, path
 
 from matrix_app.all_exceptions import (
     FailureMessage,
     CriticalFailure,
     InternalDbError,
 )
+from matrix_app.narrow_dtypes import product_dtypes
+from matrix_app.run_cache import DEFAULT_CACHE_BYTES, RunCache
+from matrix_app.run_index import RunIndex, RunIndexEntry
+from matrix_app.run_stores import NO_STATS_RUN, PerFileRunStore
+from matrix_app.sparse_matrices import (
+    dtype_of,
+    is_sparse,
+    is_sparse_group,
+    read_matrix,
+    read_sparse,
+    sparse_layout,
+    write_sparse,
+)
+from matrix_app.storage_profiles import DEFAULT_PROFILE, StorageProfile
 
 
 class DisplayData:
-    def __init__(self, label: str, data):
-        """Class for have an organized way of keeping label with data """
+    def __init__(self, label: str, data=None, loader: Callable = None):
+        """Class for have an organized way of keeping label with data
+        Args:
+        label -- name of the data
+        data -- the matrix or stat
+        loader -- for lazily loaded runs, called on first access of data to read it
+        """
         self.label = label
-        self.data = data
+        self._data = data
+        self._loader = loader
+
+    @property
+    def data(self):
+        if self._loader is not None:
+            self._data = self._loader()
+            self._loader = None
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+        self._loader = None
+
+    def is_loaded(self) -> bool:
+        return self._loader is None
 
     def __str__(self):
         return str(self.label) + ":\n" + str(self.data) + "\n"
@@ -41,6 +77,7 @@ class RunData:
         stats: List[DisplayData],
         saved: bool = False,
         random: str = None,
+        generator=None,
     ):
         """
         Class for hold matrices and their stats
@@ -49,11 +86,13 @@ class RunData:
         matrices -- the two entered matrices and their product
         stats -- any calculated stats for a given run
         saved -- whether the run was previously saved
+        generator -- random_matrices.RunGenerator the matrices were generated with, None if they were entered
         """
         self.run_name = run_name
         self.matrices = matrices
         self.stats = stats
         self.saved = saved
+        self.generator = generator
         if random is None:
             self.random = ""
         else:
@@ -67,24 +106,49 @@ class RunData:
         for s in self.stats:
             basestr += str(s)
         basestr += "Saved: " + str(self.saved) + "\n"
+        if self.generator is not None:
+            basestr += "Generated with: " + str(self.generator) + "\n"
         return basestr
 
 
-class DatabaseModel(QtWidgets.QWidget):
+class DatabaseModel:
+    """Plain Python gatekeeper to the SavedRuns directory.
+    It has no Qt dependency so it can also be used by headless tools such as the batch engine.
+    Where the runs are kept is up to its backend, see run_stores.py
+    """
+
     MATRIX_GROUP = "matrices"
     STATS_GROUP = "stats"
-    NO_STATS_RUN = "-No_Stats_Run"
+    # Attributes of the group of a run
+    GENERATOR_ATTR = "generator"  # RunGenerator of generated runs, as JSON
+    SEED_ONLY_ATTR = "seed_only"  # the run was saved as its generator, without its data
+    SUMMARY_ATTR = "summary"  # single value stats of C, such as its min, mean and max, as JSON
+    NO_STATS_RUN = NO_STATS_RUN
 
-    def __init__(self, DB_Name="SavedRuns", parent=None):
-        """ Create DB and reads in any pre-existing data into relevant models"""
-        super().__init__()
+    def __init__(
+        self,
+        DB_Name="SavedRuns",
+        parent=None,
+        cache_bytes: int = DEFAULT_CACHE_BYTES,
+        storage_profile: StorageProfile = DEFAULT_PROFILE,
+        backend: type = PerFileRunStore,
+    ):
+        """ Create DB and reads in any pre-existing data into relevant models
+        Args:
+        DB_Name -- directory the runs are saved in
+        cache_bytes -- budget of the cache of loaded runs, 0 disables it
+        storage_profile -- chunking, compression and float downcasting of saved runs, see storage_profiles.PROFILES
+        backend -- run_stores.PerFileRunStore (one file per run) or run_stores.SingleFileRunStore (one container file)
+        """
+        self.storage_profile = storage_profile
         self.db_name = DB_Name
         self._db_name_f = self.db_name + "/"
-        self._past_runs = {}  # for loading the SavedRunsPage()
-        self._past_runs_list = []
-        self._set_up_db()
+        self._index = None
+        self.store = None
+        self.run_cache = RunCache(cache_bytes)
+        self._set_up_db(backend)
 
-    def _set_up_db(self):
+    def _set_up_db(self, backend: type):
         if path.exists(self.db_name):
             if path.isdir(self.db_name):
                 pass
@@ -97,45 +161,225 @@ class DatabaseModel(QtWidgets.QWidget):
         else:
             mkdir(self.db_name)
 
-        prev_run_files = [
-            f
-            for f in listdir(self._db_name_f)
-            if isfile(join(self._db_name_f, f)) and f.endswith(".h5")
-        ]
-        for prf in prev_run_files:
-            run_name = prf.split(".")[0].split("-")[
-                0
-            ]  # Doesn't matter is there is a run1-No_Stats_Run and a run1 because load will get the fullest version
-            self._past_runs[run_name] = 1
-            self._past_runs_list.append(run_name)
+        try:
+            self.store = backend(self.db_name)
+        except Exception as e:
+            raise CriticalFailure("Cannot open the saved runs: " + str(e))
+        try:
+            self._index = RunIndex(self.db_name)
+        except Exception as e:
+            self.store.close()
+            raise CriticalFailure("Cannot open the run index: " + str(e))
+        # Only a new or outdated index needs the directory scan
+        if self._index.needs_rebuild:
+            self.rebuild_index()
+
+    def rebuild_index(self) -> int:
+        """Rebuilds the run index from the runs in the store.
+        Use when runs were added or removed without going through the DatabaseModel.
+        Returns the number of indexed runs
+        """
+        self.store.clean_up()
+        since = time.time()
+        entries = {}
+        for run_name, location, mtime in self.store.scan():
+            has_stats = self.store.has_stats(location)
+            # load gets the fullest version if there is a run1-No_Stats_Run and a run1
+            if run_name in entries and entries[run_name].has_stats:
+                continue
+            shapes, dtypes, nbytes, scalars = self._read_layout(location)
+            entries[run_name] = RunIndexEntry(
+                run_name,
+                location,
+                has_stats,
+                shapes,
+                dtypes,
+                created=mtime,
+                nbytes=nbytes,
+                scalars=scalars,
+            )
+        self._index.replace_all(list(entries.values()), since)
+        return len(entries)
+
+    def _read_layout(self, location: str) -> (dict, dict, int, dict):
+        """Shapes, dtypes, stored bytes and single value stats of a stored run, without reading the data"""
+        try:
+            with self.store.read(location) as hdf:
+                return self._file_layout(hdf) + self._file_summary(hdf)
+        except Exception:
+            # Unreadable runs are still indexed so they show up in the list
+            return {}, {}, 0, {}
+
+    def _file_layout(self, hdf) -> (dict, dict):
+        shapes = {}
+        dtypes = {}
+        for group_name in (self.MATRIX_GROUP, self.STATS_GROUP):
+            group = hdf.get(group_name)
+            if group is None:
+                continue
+            for label, dataset in group.items():
+                if is_sparse_group(dataset):
+                    shape, dtype = sparse_layout(dataset)
+                else:
+                    shape, dtype = dataset.shape, dataset.dtype
+                shapes[label] = shape
+                dtypes[label] = str(dtype)
+        return shapes, dtypes
+
+    def _file_summary(self, hdf) -> (int, dict):
+        """Bytes the datasets of a stored run take up and its single value stats, from metadata only"""
+        nbytes = 0
+        for group_name in (self.MATRIX_GROUP, self.STATS_GROUP):
+            group = hdf.get(group_name)
+            if group is not None:
+                nbytes += sum(_storage_size(d) for d in group.values())
+        text = hdf.attrs.get(self.SUMMARY_ATTR)
+        if text is not None:
+            return nbytes, json.loads(text)
+        # Runs saved before the summary attribute: their single value stats are tiny datasets
+        stats_group = hdf.get(self.STATS_GROUP)
+        scalars = {}
+        if stats_group is not None:
+            scalars = _scalars(
+                DisplayData(label, d[()])
+                for label, d in stats_group.items()
+                if isinstance(d, h5py.Dataset) and d.shape == () and d.dtype.kind in "iuf"
+            )
+        return nbytes, scalars
+
+    def _record_run(
+        self,
+        run_name: str,
+        location: str,
+        has_stats: bool,
+        shapes: dict,
+        dtypes: dict,
+        random: str,
+        nbytes: int = 0,
+        scalars: dict = None,
+    ) -> FailureMessage:
+        """Records a newly saved run in the run index, see _commit_runs"""
+        entry = RunIndexEntry(
+            run_name, location, has_stats, shapes, dtypes, random, nbytes=nbytes, scalars=scalars
+        )
+        return self._commit_runs([entry])[0]
+
+    def _commit_runs(self, entries: List[RunIndexEntry]) -> List[FailureMessage]:
+        """Records newly written runs in the run index in one transaction and syncs the store once.
+        The index settles which of several writers saving the same run name wins: the runs of the
+        others are removed from the store again.
+        Returns the error of each rejected run, None for every recorded one
+        """
+        now = time.time()
+        for entry in entries:
+            entry.created = entry.modified = now
+        reasons = self._index.record_new(entries, _conflict)
+        errors = []
+        for entry, reason in zip(entries, reasons):
+            if reason is None:
+                self.store.finish_write(entry.run_name, entry.file_name)
+                errors.append(None)
+                continue
+            try:
+                self.store.remove(entry.file_name)
+            except (OSError, KeyError):
+                pass
+            errors.append(FailureMessage(reason))
+        self.store.sync()
+        return errors
+
+    def close(self):
+        """Releases the index and the store. Kept for callers that treated it as a widget"""
+        self._index.close()
+        self.store.close()
 
     def get_previous_runs(self):
-        return list(self._past_runs.keys())
+        """Names of the saved runs, oldest first, including those saved by other processes"""
+        return [entry.run_name for entry in self._index.entries()]
+
+    def run_summary(self, run_name: str) -> RunIndexEntry:
+        """What the run index knows about a run: shapes, dtypes, stored bytes, whether it has stats,
+        when it was saved and the min, mean and max of C. No dataset is read
+        """
+        entry = self._index.get(run_name)
+        if entry is None:
+            raise InternalDbError("ERROR: Run is not in the index: " + run_name)
+        return entry
+
+    def query_runs(
+        self,
+        sort: str = "name",
+        descending: bool = False,
+        contains: str = "",
+        after: RunIndexEntry = None,
+        limit: int = 200,
+    ) -> List[RunIndexEntry]:
+        """One page of the saved runs, straight from the run index. See RunIndex.page"""
+        return self._index.page(sort, descending, contains, after, limit)
+
+    def find_run_row(
+        self, prefix: str, sort: str = "name", descending: bool = False, contains: str = ""
+    ) -> int:
+        """Row of the first run whose name starts with prefix, in the order of query_runs. -1 if there is none"""
+        return self._index.position(prefix, sort, descending, contains)
+
+    def _find_run_location(self, run_name: str) -> str:
+        """Returns where a run is stored. Falls back to probing the store for runs missing from the index"""
+        entry = self._index.get(run_name)
+        if entry is not None:
+            return entry.file_name
+        location = self.store.probe(run_name)
+        if location is None:
+            raise InternalDbError("ERROR: File does not exist")
+        return location
+
+    def load_run(self, run_name: str, lazy: bool = False) -> (RunData):
+        """ Return data for a particular run. Runs are served from the run cache while they are unchanged
+        Args:
+        run_name -- name of the run
+        lazy -- only read each matrix or stat on first access of its data, see _load_run_lazily
+        """
+        location = self._find_run_location(run_name)
+        if lazy:
+            return self._load_run_lazily(run_name, location)
+        try:
+            version = self.store.version(location)
+        except OSError as e:
+            raise InternalDbError("ERROR: File does not exist: " + str(e))
+        cached = self.run_cache.get(run_name, version)
+        if cached is not None:
+            # Fresh lists so callers cannot change what is cached
+            return RunData(
+                run_name,
+                list(cached.matrices),
+                list(cached.stats),
+                saved=True,
+                generator=cached.generator,
+            )
 
-    def load_run(self, run_name: str) -> (RunData):
-        """ Return data for a particular run"""
         run_data = RunData("", None, None)
         matrices = []
         stats = []
-        run_file = self._db_name_f + run_name + ".h5"
-        if not path.exists(run_file):
-            run_file = self._db_name_f + run_name + self.NO_STATS_RUN + ".h5"
-            if not path.exists(run_file):
-                raise InternalDbError("ERROR: File does not exist")
         try:
-            with h5py.File(run_file, "r") as hdf:
-                matrix_group = hdf.get(self.MATRIX_GROUP)
+            with self.store.read(location) as hdf:
+                generator, seed_only = self._read_generator(hdf)
+                if seed_only:
+                    matrices, stats = self._regenerate(
+                        generator, self.store.has_stats(location)
+                    )
+                else:
+                    matrix_group = hdf.get(self.MATRIX_GROUP)
 
-                for mgi in list(matrix_group.keys()):
-                    dd = DisplayData(mgi, np.array(matrix_group[mgi]))
-                    matrices.append(dd)
+                    for mgi in list(matrix_group.keys()):
+                        dd = DisplayData(mgi, read_matrix(matrix_group[mgi]))
+                        matrices.append(dd)
 
-                # Only get stats if stats were saved
-                if not self.NO_STATS_RUN in run_file:
-                    stats_group = hdf.get(self.STATS_GROUP)
-                    for sgi in list(stats_group.keys()):
-                        dd = DisplayData(sgi, np.array(stats_group[sgi]))
-                        stats.append(dd)
+                    # Only get stats if stats were saved
+                    if self.store.has_stats(location):
+                        stats_group = hdf.get(self.STATS_GROUP)
+                        for sgi in list(stats_group.keys()):
+                            dd = DisplayData(sgi, read_matrix(stats_group[sgi]))
+                            stats.append(dd)
         except Exception as e:
             raise InternalDbError(
                 "ERROR: Could not read saved .h5 file. ERROR: " + str(e)
@@ -145,40 +389,430 @@ class DatabaseModel(QtWidgets.QWidget):
         run_data.matrices = matrices
         run_data.stats = stats
         run_data.saved = True
+        run_data.generator = generator
+        self.run_cache.put(
+            run_name,
+            version,
+            RunData(
+                run_name, list(matrices), list(stats), saved=True, generator=generator
+            ),
+        )
         return run_data
 
-    def save_run(self, c_run: RunData) -> FailureMessage:
-        """save data for a particular run to disk"""
+    def load_runs(self, run_names: List[str], workers: int = 4) -> List[RunData]:
+        """Loads many runs at once, reading up to workers of them at the same time.
+        Returns the runs in the order of run_names. Raises InternalDbError naming every run that failed
+        """
+        if not run_names:
+            return []
+        with ThreadPoolExecutor(max_workers=min(workers, len(run_names))) as pool:
+            futures = [pool.submit(self.load_run, name) for name in run_names]
+        runs = []
+        errors = []
+        for name, future in zip(run_names, futures):
+            try:
+                runs.append(future.result())
+            except InternalDbError as e:
+                errors.append(name + ": " + str(e))
+        if errors:
+            raise InternalDbError("ERROR: Could not load runs: " + "; ".join(errors))
+        return runs
+
+    def aggregate_runs(
+        self,
+        run_names: List[str],
+        label: str = "C",
+        workers: int = 4,
+        memory_limit: int = None,
+        progress: Callable = None,
+    ):
+        """Statistics across runs, read a block of rows at a time so the runs never have to fit in memory together.
+        Returns a run_aggregation.RunAggregate holding the element-wise mean, min and max of the matrix label
+        over each group of runs where it has the same shape, and the distribution of every single value stat.
+        Runs that cannot be read, or have no such matrix, are left out and listed in its skipped
+        Args:
+            run_names -- runs to aggregate
+            label -- matrix to aggregate element-wise
+            workers -- runs read at the same time
+            memory_limit -- bytes of matrix data read at once, across the workers
+            progress -- called with (runs done, total runs) after every run. Raising from it stops the aggregation
+        """
+        # Imported here since the blocked multiply, which it uses, depends on this module
+        from matrix_app.run_aggregation import DEFAULT_MEMORY_LIMIT, aggregate_runs
+
+        if memory_limit is None:
+            memory_limit = DEFAULT_MEMORY_LIMIT
+        return aggregate_runs(self, run_names, label, workers, memory_limit, progress)
+
+    def is_cached(self, run_name: str) -> bool:
+        """Whether load_run would serve the run from the run cache"""
+        entry = self._index.get(run_name)
+        if entry is None:
+            return False
+        try:
+            version = self.store.version(entry.file_name)
+        except OSError:
+            return False
+        return self.run_cache.peek(run_name, version)
+
+    def _read_generator(self, hdf):
+        """Returns the RunGenerator of a stored run, or None, and whether the run was saved as only its generator"""
+        text = hdf.attrs.get(self.GENERATOR_ATTR)
+        if text is None:
+            return None, False
+        # Imported here since random_matrices itself depends on this module
+        from matrix_app.random_matrices import RunGenerator
+
+        return RunGenerator.from_json(text), bool(hdf.attrs.get(self.SEED_ONLY_ATTR, False))
+
+    def _regenerate(self, generator, with_stats: bool) -> (list, list):
+        from matrix_app.random_matrices import regenerate_matrices
+
+        return regenerate_matrices(generator, with_stats)
+
+    def _load_run_lazily(self, run_name: str, location: str) -> (RunData):
+        """Returns a run whose DisplayData read their data on first access.
+        Contiguous, uncompressed datasets are memory mapped, so only the pages that are touched get read.
+        Only the layout of the run is read here, so opening a run is near-instant whatever its size.
+        Lazy runs do not go through the run cache: the OS page cache already keeps what was read
+        """
+        matrices = []
+        stats = []
+        try:
+            with self.store.read(location) as hdf:
+                generator, seed_only = self._read_generator(hdf)
+                if seed_only:
+                    # There is no data to map, only the seed to generate it from
+                    matrices, stats = self._regenerate(
+                        generator, self.store.has_stats(location)
+                    )
+                    return RunData(
+                        run_name, matrices, stats, saved=True, generator=generator
+                    )
+                group_names = [self.MATRIX_GROUP]
+                # Only get stats if stats were saved
+                if self.store.has_stats(location):
+                    group_names.append(self.STATS_GROUP)
+                for group_name, loaded in zip(group_names, (matrices, stats)):
+                    group = hdf.get(group_name)
+                    for label, dataset in group.items():
+                        loaded.append(
+                            DisplayData(
+                                label,
+                                loader=self.store.dataset_loader(location, dataset),
+                            )
+                        )
+        except Exception as e:
+            raise InternalDbError(
+                "ERROR: Could not read saved .h5 file. ERROR: " + str(e)
+            )
+        return RunData(run_name, matrices, stats, saved=True, generator=generator)
+
+    def _check_run_location(
+        self, run_name: str, has_stats: bool, random: str
+    ) -> (str, FailureMessage):
+        """Returns where a new run should be saved, or an error if the run name is taken.
+        Other processes may take the name while the run is written, which _commit_runs catches
+        """
+        entry = self._index.get(run_name)
+        if entry is not None:
+            reason = _conflict(entry, RunIndexEntry(run_name, "", has_stats, random=random))
+            if reason is not None:
+                return "", FailureMessage(reason)
+
+        location = self.store.new_location(run_name, has_stats)
+        # Catches runs that were added without going through the index
+        if self.store.exists(location):
+            return "", FailureMessage("ERROR: Saved File already exists")
+        return location, None
+
+    def _create_dataset(self, group, label: str, data=None, shape=None, dtype=None):
+        """Creates a dataset laid out by the storage profile, either from data (already converted
+        with storage_profile.convert) or empty with shape and dtype. Sparse data is saved as a group
+        of its parts, see sparse_matrices.write_sparse"""
+        profile = self.storage_profile
+        if is_sparse(data):
+            return write_sparse(group, label, data, profile.dataset_options)
+        if data is not None:
+            data = np.asarray(data)
+            return group.create_dataset(
+                label, data=data, **profile.dataset_options(data.shape, data.dtype)
+            )
+        return group.create_dataset(
+            label, shape=shape, dtype=dtype, **profile.dataset_options(shape, dtype)
+        )
+
+    def save_run(self, c_run: RunData, seed_only: bool = False) -> FailureMessage:
+        """save data for a particular run to disk
+        Args:
+        c_run -- the run to save
+        seed_only -- for generated runs, save only the generator. The matrices and stats are generated
+            and calculated again on every load, so this trades load time for disk space
+        """
+        return self.save_runs([c_run], seed_only)[0]
+
+    def save_runs(
+        self, runs: List[RunData], seed_only: bool = False
+    ) -> List[FailureMessage]:
+        """Saves several runs as one group commit: each run is written on its own, but all of them
+        are recorded in the run index in one transaction and synced to disk once.
+        Safe with other processes saving to the same directory, see run_stores.py
+        Args:
+        runs -- the runs to save
+        seed_only -- as for save_run
+        Returns the error of each run, None for every saved run
+        """
+        errors = [None] * len(runs)
+        written = []  # (position in runs, index entry, what a load returns, store version)
+        for i, c_run in enumerate(runs):
+            try:
+                entry, saved_run, version = self._write_run(c_run, seed_only)
+            except FailureMessage as fm:
+                errors[i] = fm
+                continue
+            written.append((i, entry, saved_run, version))
+        if not written:
+            return errors
+        try:
+            committed = self._commit_runs([w[1] for w in written])
+        except Exception as e:
+            # Unrecorded runs are found again by rebuild_index
+            fm = FailureMessage("ERROR: Could not record the saved runs: " + str(e))
+            for i, _, _, _ in written:
+                errors[i] = fm
+            return errors
+        for (i, entry, saved_run, version), fm in zip(written, committed):
+            errors[i] = fm
+            if fm is None:
+                # What was just written is what a load would return
+                self.run_cache.put(entry.run_name, version, saved_run)
+        return errors
+
+    def _write_run(self, c_run: RunData, seed_only: bool) -> (RunIndexEntry, RunData, int):
+        """Writes one run to the store. Returns its index entry, what a load of it returns and its
+        store version, or raises a FailureMessage
+        """
         # error if run already exists
         run_name = c_run.run_name
-        run_file = self._db_name_f + run_name + ".h5"
-        if path.exists(run_file):
-            return FailureMessage("ERROR: Saved File (all stats) already exists")
-
-        if len(c_run.stats) < 1:
-            run_file = self._db_name_f + run_name + self.NO_STATS_RUN + ".h5"
-            if path.exists(run_file):
-                return FailureMessage("ERROR: Saved File (no stats) already exists")
-        if run_name in self._past_runs:
-            if self._past_runs[run_name] != c_run.random:
-                return FailureMessage(
-                    "ERROR: Saved File already exists with that run name"
-                )
+        if seed_only and c_run.generator is None:
+            raise FailureMessage("ERROR: Only generated runs can be saved as a seed")
+        has_stats = len(c_run.stats) > 0
+        location, fm = self._check_run_location(run_name, has_stats, c_run.random)
+        if fm is not None:
+            raise fm
+        scalars = _scalars(c_run.stats)
+        if not scalars:
+            # Kept even without stats, so the run can be previewed
+            scalars = self._product_scalars(c_run.matrices)
+        if seed_only:
+            # Nothing is written but the generator, and a load generates exactly c_run again
+            saved_matrices = list(c_run.matrices)
+            saved_stats = list(c_run.stats)
+        else:
+            # What is saved after the storage profile's float downcasting. Sparse matrices are saved sparse,
+            # dense ones dense, so a load returns each matrix the way it was given
+            saved_matrices = [
+                DisplayData(m.label, self.storage_profile.convert(m.data))
+                for m in c_run.matrices
+            ]
+            saved_stats = [
+                DisplayData(s.label, self.storage_profile.convert(s.data))
+                for s in c_run.stats
+            ]
+        try:
+            with self.store.write(location) as hdf:
+                if c_run.generator is not None:
+                    hdf.attrs[self.GENERATOR_ATTR] = c_run.generator.to_json()
+                    hdf.attrs[self.SEED_ONLY_ATTR] = seed_only
+                hdf.attrs[self.SUMMARY_ATTR] = json.dumps(scalars)
+                matrix_group = hdf.create_group(self.MATRIX_GROUP)
+                stats_group = hdf.create_group(self.STATS_GROUP)
+                if not seed_only:
+                    for m in saved_matrices:
+                        self._create_dataset(matrix_group, m.label, data=m.data)
+                    for s in saved_stats:
+                        self._create_dataset(stats_group, s.label, data=s.data)
+                # Compressed chunks only have their final size once they are flushed
+                hdf.file.flush()
+                nbytes, _ = self._file_summary(hdf)
+            version = self.store.version(location)
+        except FileExistsError:
+            raise FailureMessage("ERROR: Saved File already exists")
+        except Exception as e:
+            raise FailureMessage("ERROR: Could not save file: " + str(e))
+        datasets = saved_matrices + saved_stats
+        entry = RunIndexEntry(
+            run_name,
+            location,
+            has_stats,
+            {d.label: np.shape(d.data) for d in datasets},
+            {d.label: str(dtype_of(d.data)) for d in datasets},
+            c_run.random,
+            nbytes=nbytes,
+            scalars=scalars,
+        )
+        saved_run = RunData(
+            run_name, saved_matrices, saved_stats, saved=True, generator=c_run.generator
+        )
+        return entry, saved_run, version
+
+    @staticmethod
+    def _product_scalars(matrices: List[DisplayData]) -> dict:
+        """Min, mean and max of C when it is among the matrices and not empty"""
+        # Imported here since the stats engine itself depends on this module
+        from matrix_app.stats_engine import summary_stats
+
+        C = {m.label: m.data for m in matrices}.get("C")
+        if C is None or 0 in np.shape(C):
+            return {}
+        return _scalars(summary_stats(C))
+
+    @contextmanager
+    def open_run_matrix(self, run_name: str, label: str):
+        """Yields one matrix of a saved run as an h5py dataset, without reading it into memory,
+        or as a sparse matrix if it was saved sparse.
+        Used as an out-of-core source for save_run_out_of_core
+        """
+        location = self._find_run_location(run_name)
+        with self.store.read(location) as hdf:
+            generator, seed_only = self._read_generator(hdf)
+            if seed_only:
+                # Runs saved as a seed have no dataset to open, so their matrix is generated
+                matrices, _ = self._regenerate(generator, False)
+                matrix_group = {m.label: m.data for m in matrices}
+            else:
+                matrix_group = hdf.get(self.MATRIX_GROUP)
+            if label not in matrix_group:
+                raise InternalDbError("ERROR: Run has no matrix " + label)
+            matrix = matrix_group[label]
+            # A sparse matrix is small enough to read whole
+            yield read_sparse(matrix) if is_sparse_group(matrix) else matrix
+
+    def save_run_out_of_core(
+        self,
+        run_name: str,
+        a,
+        b,
+        with_stats: bool = True,
+        memory_limit: int = None,
+        random: str = None,
+    ) -> FailureMessage:
+        """Multiplies a and b block by block straight into a new run, so the product never has to fit in RAM.
+        Stats are collected as the blocks of C are produced and the cumulative products are streamed to the store.
+        Args:
+            run_name -- name of the new run
+            a -- mxk matrix, e.g. an np.memmap or an h5py dataset from open_run_matrix
+            b -- kxn matrix
+            with_stats -- whether to calculate and save stats
+            memory_limit -- bytes of matrix data held in memory at once
+            random -- id of the run, as in RunData
+        """
+        # Imported here since the stats engine itself depends on this module
+        from matrix_app.blocked_multiply import (
+            DEFAULT_MEMORY_LIMIT,
+            blocked_multiply,
+            copy_blocked,
+        )
+        from matrix_app.stats_engine import StatsAccumulator, cumulative_product_dtype
+
+        if memory_limit is None:
+            memory_limit = DEFAULT_MEMORY_LIMIT
+        random = "" if random is None else random
+        location, fm = self._check_run_location(run_name, with_stats, random)
+        if fm is not None:
+            return fm
         try:
-            with h5py.File(run_file, "w") as hdf:
+            m, n = a.shape[0], b.shape[1]
+            # The dtype blocked_multiply returns C in
+            dtype = product_dtypes(a, b)[1]
+            with self.store.write(location) as hdf:
                 matrix_group = hdf.create_group(self.MATRIX_GROUP)
-                for m in c_run.matrices:
-                    matrix_group.create_dataset(m.label, data=m.data)
+                for label, source in (("A", a), ("B", b)):
+                    target = self._create_dataset(
+                        matrix_group, label, shape=source.shape, dtype=source.dtype
+                    )
+                    copy_blocked(source, target, memory_limit)
+                c_out = self._create_dataset(matrix_group, "C", shape=(m, n), dtype=dtype)
 
                 stats_group = hdf.create_group(self.STATS_GROUP)
-                for s in c_run.stats:
-                    stats_group.create_dataset(s.label, data=s.data)
-            if self.NO_STATS_RUN not in run_file:
-                if path.exists(self._db_name_f + run_name + self.NO_STATS_RUN + ".h5"):
-                    os.remove(self._db_name_f + run_name + self.NO_STATS_RUN + ".h5")
+                accumulator = None
+                if with_stats:
+                    cprod_dtype = cumulative_product_dtype(dtype)
+                    # Labels depend on overflow, so the datasets are renamed once C is done
+                    cumprod_out = tuple(
+                        self._create_dataset(
+                            stats_group, name, shape=shape, dtype=cprod_dtype
+                        )
+                        for name, shape in (
+                            ("_cumprod", (m * n,)),
+                            ("_cumprod_columns", (m, n)),
+                            ("_cumprod_rows", (m, n)),
+                        )
+                    )
+                    # Only created if a cumulative product leaves its range
+                    log_out = tuple(
+                        lambda shape, dtype, name=name: self._create_dataset(
+                            stats_group, name + "_log", shape=shape, dtype=dtype
+                        )
+                        for name in ("_cumprod", "_cumprod_columns", "_cumprod_rows")
+                    )
+                    accumulator = StatsAccumulator((m, n), dtype, cumprod_out, log_out)
+
+                blocked_multiply(a, b, c_out, memory_limit, accumulator)
+
+                scalars = {}
+                if accumulator is not None:
+                    stats = accumulator.finish()
+                    scalars = _scalars(stats)
+                    for s in stats:
+                        if isinstance(s.data, h5py.Dataset):
+                            stats_group.move(s.data.name, s.label)
+                        else:
+                            self._create_dataset(
+                                stats_group,
+                                s.label,
+                                data=self.storage_profile.convert(s.data),
+                            )
+                    # Raw products replaced by their log form, and unused log forms
+                    for name in [k for k in stats_group.keys() if k.startswith("_")]:
+                        del stats_group[name]
+                hdf.attrs[self.SUMMARY_ATTR] = json.dumps(scalars)
+                hdf.file.flush()
+                shapes, dtypes = self._file_layout(hdf)
+                nbytes, _ = self._file_summary(hdf)
+        except FileExistsError:
+            return FailureMessage("ERROR: Saved File already exists")
         except Exception as e:
-            if path.exists(run_file):
-                os.remove(run_file)
             return FailureMessage("ERROR: Could not save file: " + str(e))
-        self._past_runs[run_name] = c_run.random
-        return None
+        self.run_cache.invalidate(run_name)
+        return self._record_run(
+            run_name, location, with_stats, shapes, dtypes, random, nbytes, scalars
+        )
+
+
+def _conflict(existing: RunIndexEntry, entry: RunIndexEntry) -> str:
+    """Why a newly saved run cannot replace the run of the same name, or None if it can.
+    Only the run saved without stats can be replaced, by the same run with its stats
+    """
+    if existing.has_stats:
+        return "ERROR: Saved File (all stats) already exists"
+    if not entry.has_stats:
+        return "ERROR: Saved File (no stats) already exists"
+    if existing.random != entry.random:
+        return "ERROR: Saved File already exists with that run name"
+    return None
+
+
+def _storage_size(node) -> int:
+    if is_sparse_group(node):
+        return sum(d.id.get_storage_size() for d in node.values())
+    return node.id.get_storage_size()
+
+
+def _scalars(stats) -> dict:
+    """The single value stats among stats, as plain numbers by label"""
+    return {
+        s.label: np.asarray(s.data).item()
+        for s in stats
+        if np.ndim(s.data) == 0 and np.asarray(s.data).dtype.kind in "iuf"
+    }
@@ -1,15 +1,22 @@
 """
 small_matrix_app.matrix_app.display_stats_widget.py
 Sets up screen for displays stats for a particular run
+The main window builds the page once and shows each run with show_run, which points the labeled
+tables of the previous run at the new run's data instead of building new ones.
 """
 import string
 import sys
 import random
+from collections import OrderedDict
+from functools import partial
+
+from PyQt5 import sip
 from PyQt5.QtCore import Qt, QAbstractTableModel
 from PyQt5.QtWidgets import (
     QVBoxLayout,
     QWidget,
     QHBoxLayout,
+    QGridLayout,
     QPushButton,
     QSizePolicy,
     QInputDialog,
@@ -17,7 +24,9 @@ from PyQt5.QtWidgets import (
     QMessageBox,
     QLabel,
     QTableView,
+    QHeaderView,
     QApplication,
+    QCheckBox,
 )
 
 import numpy as np
@@ -25,15 +34,28 @@ import numpy as np
 from typing import Callable, List
 
 from matrix_app.db_widget import DisplayData, RunData
+from matrix_app.job_scheduler import Job, JobScheduler
+from matrix_app.page_stack import Page
+from matrix_app.run_text import format_value
+from matrix_app.sparse_matrices import is_sparse
+from matrix_app.stats_engine import calculate_stats, multiply
+
+
+# What a DatumDisplay shows once it let go of its datum
+EMPTY = np.empty((0, 0))
 
 
 # Functions as cache/display for calculated matrices/stats
-class DisplayStatsPage(QWidget):
+class DisplayStatsPage(Page):
+    RESIZE_TO_CONTENTS_LIMIT = 10000
+
     def __init__(
         self,
         matrices: List[DisplayData] = None,
         run_data: RunData = None,
         parent=None,
+        scheduler: JobScheduler = None,
+        generator=None,
     ):
         """
         Sets up screen for displays stats for a particular run
@@ -41,12 +63,38 @@ class DisplayStatsPage(QWidget):
         matrices -- the two entered matrices and their product, for populating a new run
         run_data -- all matrices/stats for a preexisting run, for populating DisplayStats with a pre-existing run
         parent -- parent of DisplayStatsPage
+        scheduler -- runs the stats and saves in the background. Without one they run on the GUI thread
+        generator -- random_matrices.RunGenerator the new run's matrices were generated with, if they were
         """
         super().__init__(parent)
+        self.scheduler = scheduler
+        self._stats_job = None
+        # Counts the runs shown, so results that arrive for an earlier run are dropped
+        self._shown = 0
+        # Labeled tables, kept from run to run and pointed at the next run's data
+        self._matrix_displays = []
+        self._stats_displays = []
+        self._initUi()
+        self.show_run(matrices=matrices, run_data=run_data, generator=generator)
+        self.show()
+
+    def show_run(
+        self,
+        matrices: List[DisplayData] = None,
+        run_data: RunData = None,
+        generator=None,
+    ):
+        """Shows another run in the widgets already built, as a new page would
+        Args:
+        matrices, run_data, generator -- as for a new DisplayStatsPage
+        """
+        self._cancel_stats()
+        self._shown += 1
         self.run_name = ""
         self.display_data = []
-        self.matrices = matrices
+        self.matrices = matrices if matrices is not None else []
         self.run_data = run_data
+        self.generator = generator
         letters = string.ascii_lowercase
         result_str = "".join(random.choice(letters) for i in range(12))
         self.id = result_str
@@ -55,18 +103,101 @@ class DisplayStatsPage(QWidget):
             try:
                 self.matrices = self.run_data.matrices
                 self.display_data = self.run_data.stats
+                self.generator = self.run_data.generator
                 self.display_only = True
             except Exception as e:
                 self.matrices = []
-        self._initUi()
-        self.show()
+
+        self.save_button.setText("Save Run - Matrices A,B, and C")
+        self.save_button.setEnabled(True)
+        self.calculate_current_stats_button.setText("Calculate Stats!")
+        self.calculate_current_stats_button.setEnabled(True)
+        self.seed_only_box.setChecked(False)
+        if self.generator is not None:
+            self.generator_label.setText("Generated with " + str(self.generator))
+        self.generator_label.setVisible(self.generator is not None)
+        self.seed_only_box.setVisible(self.generator is not None and not self.display_only)
+        self._display_matrices()
+        if self.display_only:
+            self._display_calculated_stats()
+            self.save_button.hide()
+            self.calculate_current_stats_button.hide()
+        else:
+            self._show_datums(self._stats_displays, [])
+            self.save_button.show()
+            self.calculate_current_stats_button.show()
+
+    def reset(self):
+        """Drops the run shown, cancelling its stats if they are still being calculated"""
+        self.show_run()
+
+    def _cancel_stats(self):
+        if self._stats_job is not None:
+            self._stats_job.cancel()
+            self._stats_job = None
 
     def onCalculate(self):
         """Calculates stats for the matrices, for populating a new run"""
+        if self.scheduler is not None:
+            self._calculate_stats_in_background()
+            return
         self._calculate_stats()
+        self._show_new_stats()
+
+    def _show_new_stats(self):
         self._display_calculated_stats()
         self.save_button.setText("Save Run with Stats!")
-        self.calculate_current_stats_button.disconnect()
+
+    def _calculate_stats_in_background(self):
+        if len(self.matrices) < 2:
+            raise Exception("Cannot compute statistics without 2 matrices")
+        self.calculate_current_stats_button.setEnabled(False)
+        self.calculate_current_stats_button.setText("Calculating Stats...")
+        self.save_button.setEnabled(False)
+        if len(self.matrices) > 2:
+            self._calculate_product_stats(self._shown, self.matrices[2].data)
+            return
+        # Without the product from the entry page, it is multiplied in the background too
+        self._stats_job = self.scheduler.multiply(
+            self.matrices[0].data,
+            self.matrices[1].data,
+            finished=partial(self._calculate_product_stats, self._shown),
+            failed=partial(self._on_stats_failed, self._shown),
+            cancelled=partial(self._on_stats_failed, self._shown),
+        )
+
+    def _calculate_product_stats(self, shown: int, C):
+        if sip.isdeleted(self) or shown != self._shown:
+            return
+        self._stats_job = self.scheduler.calculate_stats(
+            C,
+            finished=partial(self._on_stats_calculated, shown),
+            failed=partial(self._on_stats_failed, shown),
+            cancelled=partial(self._on_stats_failed, shown),
+        )
+
+    def _on_stats_calculated(self, shown: int, stats: List[DisplayData]):
+        if sip.isdeleted(self) or shown != self._shown:
+            return
+        self._stats_job = None
+        self.display_data.extend(stats)
+        self.calculate_current_stats_button.setText("Calculate Stats!")
+        self.calculate_current_stats_button.setEnabled(True)
+        self.save_button.setEnabled(True)
+        self._show_new_stats()
+
+    def _on_stats_failed(self, shown: int, error: str = "cancelled"):
+        if sip.isdeleted(self) or shown != self._shown:
+            return
+        self._stats_job = None
+        self.calculate_current_stats_button.setText("Calculate Stats!")
+        self.calculate_current_stats_button.setEnabled(True)
+        self.save_button.setEnabled(True)
+        if error != "cancelled":
+            msg = QMessageBox()
+            self.x = msg
+            self.x.setText("ERROR: Stats not calculated: " + error)
+            self.x.exec_()
 
     def _initUi(self):
 
@@ -80,6 +211,11 @@ class DisplayStatsPage(QWidget):
         self.calculate_new_stats_button = QPushButton()
         self.calculate_new_stats_button.setText("Create New Run")
         self.calculate_current_stats_button.clicked.connect(self.onCalculate)
+        # Generated runs can be saved as their seed and spec, and regenerated on load
+        self.seed_only_box = QCheckBox()
+        self.seed_only_box.setText("Save seed and settings only")
+        self.generator_label = QLabel()
+        self.generator_label.setWordWrap(True)
 
         calculations_label = QLabel()
         calculations_label.setText("Calculations!")
@@ -87,158 +223,69 @@ class DisplayStatsPage(QWidget):
         calculations_label.setAlignment(Qt.AlignCenter)
 
         self.data_display_widget = QWidget()
-        self.data_display_layout = QVBoxLayout()
+        # Grid Like Pattern
+        self.data_display_layout = QGridLayout()
         self.data_display_widget.setLayout(self.data_display_layout)
 
         self.matrices_display_widget = QWidget()
         self.matrices_display_layout = QVBoxLayout()
         self.matrices_display_widget.setLayout(self.matrices_display_layout)
 
-        self._display_matrices()
-
         bottom_widget = QWidget()
         vbox_bottom = QVBoxLayout()
+        vbox_bottom.addWidget(self.generator_label)
         vbox_bottom.addWidget(self.matrices_display_widget)
         vbox_bottom.addWidget(self.calculate_current_stats_button)
         vbox_bottom.addWidget(self.calculate_new_stats_button)
+        vbox_bottom.addWidget(self.seed_only_box)
         vbox_bottom.addWidget(self.save_button)
         bottom_widget.setLayout(vbox_bottom)
 
         self.full_display_layout.addWidget(bottom_widget)
         self.full_display_layout.addWidget(self.data_display_widget)
 
-        if self.display_only:
-            self._display_calculated_stats()
-            self.save_button.hide()
-            self.calculate_current_stats_button.hide()
+    def _show_datums(self, displays: List["DatumDisplay"], data: List[DisplayData]) -> list:
+        """Points displays at data, building the displays that are missing and clearing the ones left over.
+        Returns the displays that show data
+        """
+        while len(displays) < len(data):
+            displays.append(DatumDisplay(self.RESIZE_TO_CONTENTS_LIMIT))
+        for display, datum in zip(displays, data):
+            display.show_datum(datum)
+        for display in displays[len(data) :]:
+            display.clear()
+        return displays[: len(data)]
 
     def _display_matrices(self):
-        for datum in self.matrices:
-            table_lable = QLabel()
-            table_lable.setText(datum.label)
-            table_widget = QTableView()
-            table_widget.setWindowTitle(datum.label)
-            table_widget.horizontalHeader().hide()
-            table_widget.verticalHeader().hide()
-
-            model = TableModel(datum.data.tolist())
-            table_widget.setModel(model)
-            table_widget.setContentsMargins(0, 0, 0, 0)
-            table_widget.resizeColumnsToContents()
-            table_widget.resizeRowsToContents()
-            table_widget.adjustSize()
-            datum_display_widget = QWidget()
-            datum_display_layout = QVBoxLayout()
-            datum_display_layout.setContentsMargins(0, 0, 0, 0)
-            datum_display_layout.addWidget(table_lable)
-            datum_display_layout.addWidget(table_widget)
-            datum_display_widget.setLayout(datum_display_layout)
-
-            self.matrices_display_layout.addWidget(datum_display_widget)
+        known = len(self._matrix_displays)
+        self._show_datums(self._matrix_displays, self.matrices)
+        for display in self._matrix_displays[known:]:
+            self.matrices_display_layout.addWidget(display)
         self.adjustSize()
 
     def _display_calculated_stats(self):
-        wig_list = []
-        for datum in self.display_data:
-            table_lable = QLabel()
-            table_lable.setText(datum.label)
-            table_widget = QTableView()
-            table_widget.setWindowTitle(datum.label)
-            table_widget.horizontalHeader().hide()
-            table_widget.verticalHeader().hide()
-
-            model = TableModel(datum.data.tolist())
-            table_widget.setModel(model)
-            table_widget.setContentsMargins(0, 0, 0, 0)
-            table_widget.resizeColumnsToContents()
-            table_widget.resizeRowsToContents()
-            table_widget.adjustSize()
-            datum_display_widget = QWidget()
-            datum_display_layout = QVBoxLayout()
-            datum_display_layout.setContentsMargins(0, 0, 0, 0)
-            datum_display_layout.addWidget(table_lable)
-            datum_display_layout.addWidget(table_widget)
-            datum_display_widget.setLayout(datum_display_layout)
-            wig_list.append(datum_display_widget)
+        shown = self._show_datums(self._stats_displays, self.display_data)
+        for display in self._stats_displays:
+            self.data_display_layout.removeWidget(display)
+        # Same order as the rows of the previous layout, filled from the last stat
+        columns = int(np.ceil(np.sqrt(len(shown))))
+        for i, display in enumerate(reversed(shown)):
+            self.data_display_layout.addWidget(display, i // columns, i % columns)
         self.adjustSize()
         self.save_button.show()
         self.calculate_current_stats_button.hide()
 
-        # Grid Like Pattern
-        sqrt = int(np.ceil(np.sqrt(len(self.display_data))))
-        for r in range(sqrt):
-            w = QWidget()
-            hbox = QHBoxLayout()
-            for c in range(sqrt):
-                if len(wig_list) > 0:
-                    hbox.addWidget(wig_list.pop())
-            w.setLayout(hbox)
-            self.data_display_layout.addWidget(w)
-
     def _calculate_stats(self):
         if len(self.display_data) > 1:
             return
         if len(self.matrices) < 2:
             raise Exception("Cannot compute statistics without 2 matrices")
-        A = self.matrices[0].data
-        B = self.matrices[1].data
-        C = A.dot(B)
-
-        # precalculate cumulative prod since it's the slowest
-        cprod = C.cumprod()
-        cprodc = C.cumprod(axis=0)
-        cprodr = C.cumprod(axis=1)
-
-        # Across all entries
-        if not cprod.max() > sys.maxsize:
-            self.display_data.append(DisplayData("Cumulative Product Matrix ", cprod))
-        else:
-            self.display_data.append(
-                DisplayData("Cumulative Product Too Large For Full Display", cprod)
-            )
-
-        self.display_data.append(DisplayData("Minimum Value in Matrix", C.min()))
-        self.display_data.append(DisplayData("Mean across Matrix", C.mean()))
-        self.display_data.append(DisplayData("Max across Matrix", C.max()))
-
-        # Across columns
-        if not cprodc.max() > sys.maxsize:
-            self.display_data.append(
-                DisplayData("Cumulative Product down each Column", cprodc)
-            )
-        else:
-            self.display_data.append(
-                DisplayData(
-                    "Cumulative Product Down Each Column Too Large For Full Display",
-                    cprodc,
-                )
-            )
-
-        self.display_data.append(DisplayData("Minimum Value per Column", C.min(axis=0)))
-        self.display_data.append(DisplayData("Mean of each Column", C.mean(axis=0)))
-        self.display_data.append(DisplayData("Max of each Column", C.max(axis=0)))
-
-        # Across rows
-        if not cprodr.max() > sys.maxsize:
-            self.display_data.append(
-                DisplayData("Cumulative Product across each Row ", cprodr)
-            )
+        # Reuse the product calculated on the entry page when there is one
+        if len(self.matrices) > 2:
+            C = self.matrices[2].data
         else:
-            self.display_data.append(
-                DisplayData(
-                    "Cumulative Product Across Each Row Too Large For Full Display",
-                    cprodr,
-                )
-            )
-        self.display_data.append(
-            DisplayData("Minimum Value per Row", C.min(axis=1).reshape(-1, 1))
-        )  # ROW VECTOR to COL
-        self.display_data.append(
-            DisplayData("Mean of each Row", C.mean(axis=1).reshape(-1, 1))
-        )  # ROW VECTOR to COL
-        self.display_data.append(
-            DisplayData("Max of each Row", C.max(axis=1).reshape(-1, 1))
-        )  # ROW VECTOR to COL
+            C = multiply(self.matrices[0].data, self.matrices[1].data)
+        self.display_data.extend(calculate_stats(C))
 
     def save_display(self, save_method: Callable):
         """Saved matrices and stats in a new run to disk
@@ -251,15 +298,11 @@ class DisplayStatsPage(QWidget):
         self.x = msg
 
         if self.run_name != "":
-            self.run_data = RunData(
-                self.run_name, self.matrices, self.display_data, random=self.id
+            self._save(
+                self.run_name,
+                save_method,
+                lambda err: "ERROR: Run not saved: " + str(err),
             )
-            err = save_method(self.run_data)
-            if err is None:
-                self.save_button.hide()
-            else:
-                self.x.setText("ERROR: Run not saved: " + str(err))
-                self.x.exec_()
             return
 
         run_name, ok_pressed = QInputDialog.getText(
@@ -275,18 +318,11 @@ class DisplayStatsPage(QWidget):
                 self.x.exec_()
                 return
             if run_name.isalnum():
-                self.run_data = RunData(
-                    run_name, self.matrices, self.display_data, random=self.id
-                )
-                err = save_method(self.run_data)
-                if err is None:
-                    self.run_name = run_name
-                    self.save_button.hide()
-                    return
-                self.x.setText(
-                    "Sorry! There is already another run saved by this name - You cannot save the same run twice!"
+                self._save(
+                    run_name,
+                    save_method,
+                    lambda err: "Sorry! There is already another run saved by this name - You cannot save the same run twice!",
                 )
-                self.x.exec_()
                 return
             else:
                 self.x.setText("Run name must be alphanumeric. Run not saved.")
@@ -295,43 +331,173 @@ class DisplayStatsPage(QWidget):
 
             self.save_button.hide()
 
+    def _save(self, run_name: str, save_method: Callable, failure_text: Callable):
+        """Saves the run under run_name, in the background when there is a scheduler
+        Args:
+            failure_text -- builds the message shown from the error of save_method
+        """
+        self.run_data = RunData(
+            run_name,
+            self.matrices,
+            self.display_data,
+            random=self.id,
+            generator=self.generator,
+        )
+        if self.generator is not None and self.seed_only_box.isChecked():
+            save_method = partial(save_method, seed_only=True)
+        if self.scheduler is None:
+            self._on_saved(self._shown, run_name, failure_text, save_method(self.run_data))
+            return
+        self.save_button.setEnabled(False)
+        self.scheduler.submit(
+            Job("Saving " + run_name, _call_save, save_method, self.run_data),
+            io=True,
+            finished=partial(self._on_saved, self._shown, run_name, failure_text),
+            failed=partial(self._on_saved, self._shown, run_name, failure_text),
+            cancelled=partial(self._on_save_cancelled, self._shown),
+        )
+
+    def _on_save_cancelled(self, shown: int):
+        if not sip.isdeleted(self) and shown == self._shown:
+            self.save_button.setEnabled(True)
+
+    def _on_saved(self, shown: int, run_name: str, failure_text: Callable, err):
+        # The save is done even if the page moved on to another run in the meantime
+        if sip.isdeleted(self) or shown != self._shown:
+            return
+        self.save_button.setEnabled(True)
+        if err is None:
+            self.run_name = run_name
+            self.save_button.hide()
+            return
+        self.x = QMessageBox()
+        self.x.setText(failure_text(err))
+        self.x.exec_()
+
+
+def _call_save(job: Job, save_method: Callable, run_data: RunData):
+    return save_method(run_data)
+
+
+class DatumDisplay(QWidget):
+    def __init__(self, resize_limit: int, parent=None):
+        """A labeled table view showing a DisplayData without copying its data, reused for the next one
+        Args:
+        resize_limit -- tables of up to this many cells are sized to their contents
+        """
+        super().__init__(parent)
+        self.resize_limit = resize_limit
+        self.table_label = QLabel()
+        self.table_widget = QTableView()
+        self.table_widget.horizontalHeader().hide()
+        self.table_widget.verticalHeader().hide()
+        self.table_widget.setContentsMargins(0, 0, 0, 0)
+        # One model for every datum shown, so the view and its selection model are kept too
+        self.model = TableModel(EMPTY)
+        self.table_widget.setModel(self.model)
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.table_label)
+        layout.addWidget(self.table_widget)
+        self.setLayout(layout)
+
+    def show_datum(self, datum: DisplayData):
+        self.table_label.setText(datum.label)
+        self.table_widget.setWindowTitle(datum.label)
+        self.model.set_data(datum.data)
+        # Sizing to contents reads every cell, so only do it for small tables.
+        # Large tables get fixed size sections so scrolling never measures cells
+        horizontal = self.table_widget.horizontalHeader()
+        vertical = self.table_widget.verticalHeader()
+        if self.model.cell_count() <= self.resize_limit:
+            self.table_widget.setWordWrap(True)
+            horizontal.setSectionResizeMode(QHeaderView.Interactive)
+            vertical.setSectionResizeMode(QHeaderView.Interactive)
+            self.table_widget.resizeColumnsToContents()
+            self.table_widget.resizeRowsToContents()
+        else:
+            self.table_widget.setWordWrap(False)
+            horizontal.setSectionResizeMode(QHeaderView.Fixed)
+            vertical.setSectionResizeMode(QHeaderView.Fixed)
+        self.table_widget.adjustSize()
+        self.show()
+
+    def clear(self):
+        """Lets go of the data shown"""
+        self.model.set_data(EMPTY)
+        self.hide()
+
 
 # copied TableModel modified from https://www.learnpyqt.com/courses/model-views/qtableview-modelviews-numpy-pandas/
 class TableModel(QAbstractTableModel):
-    def __init__(self, data):
-        """ Table Model is used to cache new run calculated statistics until they are saved to disk"""
+    # Enough formatted cells for a few screens of scrolling
+    CACHE_SIZE = 8192
+
+    def __init__(self, data, cache_size: int = None):
+        """ Table Model is used to cache new run calculated statistics until they are saved to disk.
+        It wraps the ndarray directly: a scalar is shown as a 1x1 table and a 1-d array as a single row.
+        A sparse matrix is wrapped as CSR, so each shown cell is looked up among its row's nonzero entries.
+        Cells are only formatted when the view asks for them and the most recently used strings are kept
+
+        Args:
+            data -- scalar, 1-d or 2-d array or sparse matrix to display
+            cache_size -- number of formatted cells to keep, defaults to CACHE_SIZE
+        """
         super(TableModel, self).__init__()
-        self._data = data
+        self._cache_size = cache_size or self.CACHE_SIZE
+        self._wrap(data)
+
+    def set_data(self, data):
+        """Shows other data, so the views on the model can be kept. Takes the same data as the constructor"""
+        self.beginResetModel()
+        self._wrap(data)
+        self.endResetModel()
+
+    def _wrap(self, data):
+        if is_sparse(data):
+            self._data = data.tocsr()
+            self._shape = self._data.shape
+            self._view = self._data
+        elif np.ndim(data) == 0:
+            self._data = np.asarray(data)
+            self._shape = (1, 1)
+            self._view = self._data.reshape(1, 1)
+        elif np.ndim(data) == 1:
+            self._data = np.asarray(data)
+            self._shape = (1, self._data.shape[0])
+            self._view = self._data.reshape(1, -1)
+        else:
+            self._data = np.asarray(data)
+            self._shape = self._data.shape[:2]
+            self._view = self._data
+        self._cache = OrderedDict()
+
+    def cell_count(self) -> int:
+        return self._shape[0] * self._shape[1]
 
     def data(self, index, role):
         if role == Qt.DisplayRole:
-            # See below for the nested-list data structure.
-            # .row() indexes into the outer list,
-            # .column() indexes into the sub-list
-            if isinstance(self._data, int) or isinstance(self._data, float):
-                return self._data
-            if isinstance(self._data[0], int) or isinstance(self._data[0], float):
-                return self._data[index.column()]
-            return self._data[index.row()][index.column()]
+            return self._cell_text(index.row(), index.column())
+
+    def _cell_text(self, row: int, col: int) -> str:
+        key = (row, col)
+        text = self._cache.get(key)
+        if text is not None:
+            self._cache.move_to_end(key)
+            return text
+        text = format_value(self._view[row, col])
+        self._cache[key] = text
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return text
 
     # Override
     def rowCount(self, index):
-        # The length of the outer list.
-        if isinstance(self._data, int) or isinstance(self._data, float):
-            return 1
-        if isinstance(self._data[0], int) or isinstance(self._data[0], float):
-            return 1
-        return len(self._data)
+        return self._shape[0]
 
     # Override
     def columnCount(self, index):
-        # The following takes the first sub-list, and returns
-        # the length (only works if all rows are an equal length)
-        if isinstance(self._data, int) or isinstance(self._data, float):
-            return 1
-        if isinstance(self._data[0], int) or isinstance(self._data[0], float):
-            return len(self._data)
-        return len(self._data[0])
+        return self._shape[1]
 
 
 # def main():
@@ -8,8 +8,10 @@ import sys
 from PyQt5 import QtWidgets
 from PyQt5.QtWidgets import QHBoxLayout, QPushButton, QVBoxLayout
 
+from matrix_app.page_stack import Page
 
-class HomeScreenPage(QtWidgets.QWidget):
+
+class HomeScreenPage(Page):
     def __init__(self, parent=None):
         """Set up home screen display"""
         super().__init__(parent)
@@ -0,0 +1,154 @@
+"""
+small_matrix_app.matrix_app.incremental_stats.py
+Keeps C = A x B and its min, mean and max up to date while single entries, or blocks, of A and B are edited.
+A change to A[i, k] only changes row i of C, by (new - old) * B[k, :], and a change to B[k, j] only changes
+column j, by A[:, k] * (new - old). So an edited cell costs O(n) or O(m) instead of a new O(mnk) product.
+The per-column min, max and sum follow the changed row or column, and give the min, mean and max of C.
+The full stats of a run, cumulative products included, are calculated from C by the stats engine once it is shown.
+A, B and C are kept in int64, or float64 for floats, whatever the dtype of the matrices given: an edit
+can make any entry of C as large as the edited values allow, so the narrow dtypes of narrow_dtypes.py
+would wrap around.
+No Qt dependency.
+"""
+
+import numpy as np
+
+from matrix_app.narrow_dtypes import sum_dtype
+from matrix_app.sparse_matrices import dtype_of, to_dense
+from matrix_app.stats_engine import multiply
+
+
+class IncrementalStats:
+    # Edits of float matrices add a little rounding error each, so C is recomputed after this many
+    RECOMPUTE_AFTER = 10000
+
+    def __init__(self, A, B):
+        """
+        Computes C = A x B and its min, mean and max once, ready for incremental updates
+        Args:
+            A -- mxk matrix, copied into its edit_dtype
+            B -- kxn matrix, copied into its edit_dtype
+        """
+        dtype = edit_dtype(A, B)
+        self.A = np.array(A, dtype=dtype)
+        self.B = np.array(B, dtype=dtype)
+        if self.A.ndim != 2 or self.B.ndim != 2 or self.A.shape[1] != self.B.shape[0]:
+            raise ValueError(
+                "shapes "
+                + str(self.A.shape)
+                + " and "
+                + str(self.B.shape)
+                + " not aligned"
+            )
+        self.recompute()
+
+    @property
+    def shape(self) -> (int, int):
+        return self.C.shape
+
+    def recompute(self):
+        """Computes C and its column min, max and sum from scratch"""
+        C = to_dense(multiply(self.A, self.B))
+        # Later edits may make C larger than the entries of A and B do now, so C is not narrowed
+        self.C = C = C.astype(self.A.dtype, copy=False)
+        self.edits = 0
+        self._col_min = C.min(axis=0)
+        self._col_max = C.max(axis=0)
+        self._col_sum = C.sum(axis=0, dtype=sum_dtype(C.dtype))
+
+    def set_a(self, i: int, k: int, value):
+        """A[i, k] = value. Updates row i of C in O(n)"""
+        self.set_a_block(i, k, [[value]])
+
+    def set_b(self, k: int, j: int, value):
+        """B[k, j] = value. Updates column j of C in O(m)"""
+        self.set_b_block(k, j, [[value]])
+
+    def set_a_block(self, i: int, k: int, block):
+        """Writes block into A with its top left corner at (i, k).
+        The rows of C it touches get a low rank update, O(rows x columns of block x n)
+        """
+        block = np.array(block, dtype=self.A.dtype, ndmin=2)
+        r, c = block.shape
+        rows = slice(i, i + r)
+        delta = block - self.A[rows, k : k + c]
+        self.A[rows, k : k + c] = block
+        if not delta.any():
+            return
+        old = self.C[rows].copy()
+        self.C[rows] += delta.dot(self.B[k : k + c])
+        self._rows_changed(rows, old)
+
+    def set_b_block(self, k: int, j: int, block):
+        """Writes block into B with its top left corner at (k, j).
+        The columns of C it touches get a low rank update, O(m x rows x columns of block)
+        """
+        block = np.array(block, dtype=self.B.dtype, ndmin=2)
+        r, c = block.shape
+        cols = slice(j, j + c)
+        delta = block - self.B[k : k + r, cols]
+        self.B[k : k + r, cols] = block
+        if not delta.any():
+            return
+        self.C[:, cols] += self.A[:, k : k + r].dot(delta)
+        self._columns_changed(cols)
+
+    def _count_edit(self) -> bool:
+        """Returns True when C was recomputed instead of being updated"""
+        self.edits += 1
+        if self.edits >= self.RECOMPUTE_AFTER and self.C.dtype.kind == "f":
+            self.recompute()
+            return True
+        return False
+
+    def _rows_changed(self, rows: slice, old: np.ndarray):
+        if self._count_edit():
+            return
+        new = self.C[rows]
+        self._col_sum += new.sum(axis=0, dtype=self._col_sum.dtype)
+        self._col_sum -= old.sum(axis=0, dtype=self._col_sum.dtype)
+        _follow_extreme(self._col_min, self.C, new, old, np.min)
+        _follow_extreme(self._col_max, self.C, new, old, np.max)
+
+    def _columns_changed(self, cols: slice):
+        if self._count_edit():
+            return
+        new = self.C[:, cols]
+        self._col_min[cols] = new.min(axis=0)
+        self._col_max[cols] = new.max(axis=0)
+        self._col_sum[cols] = new.sum(axis=0, dtype=self._col_sum.dtype)
+
+    def summary(self) -> (object, object, object):
+        """(min, mean, max) of C, in O(m + n)"""
+        m, n = self.C.shape
+        return (
+            self._col_min.min(),
+            self._col_sum.sum() / (m * n),
+            self._col_max.max(),
+        )
+
+
+def edit_dtype(A, B) -> np.dtype:
+    """dtype IncrementalStats keeps A, B and C in: int64 for integers and booleans, float64 for floats,
+    or the wider dtype of either matrix
+    """
+    return np.result_type(dtype_of(A), dtype_of(B), np.int64)
+
+
+def _follow_extreme(extreme: np.ndarray, C: np.ndarray, new, old, reduce):
+    """Updates the per-column min or max after some rows of C changed.
+    new and old hold the changed rows of C. A column is only scanned again when its extreme
+    was one of the old values and no new value reaches it
+    """
+    new_extreme = reduce(new, axis=0)
+    old_extreme = reduce(old, axis=0)
+    if reduce is np.min:
+        worse = new_extreme > extreme
+        np.minimum(extreme, new_extreme, out=extreme)
+    else:
+        worse = new_extreme < extreme
+        np.maximum(extreme, new_extreme, out=extreme)
+    # The old extreme may have been overwritten, unless a new value matches or beats it
+    lost = (old_extreme == extreme) & worse
+    for col in np.flatnonzero(lost):
+        extreme[col] = reduce(C[:, col])
@@ -0,0 +1,269 @@
+"""
+small_matrix_app.matrix_app.job_scheduler.py
+Runs the multiply, the stats, the first product of the live stats, saves and loads on QThreadPool threads
+so the Qt event loop never blocks.
+Each Job reports progress and its result back through Qt signals, which are delivered on the GUI thread,
+and can be cancelled: before it starts it is taken off the pool, once running it stops at the next progress report.
+
+Compute jobs share the global thread pool. Saves and loads go through a one-thread pool of their own,
+so they run one at a time in the order they were asked for. Loads may also run alongside the
+RunPrefetcher's, which the DatabaseModel allows.
+
+The stats engine and the DatabaseModel (numpy, h5py, scipy) are only imported by the jobs that use them,
+so the main window can create its scheduler before they are loaded.
+"""
+
+import threading
+
+from functools import partial
+from typing import Callable
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from matrix_app.all_exceptions import JobCancelled
+
+
+# Dense products whose A, B and C fit in this many bytes are taken in one multiply,
+# larger ones in panels of rows that fit in it
+PANEL_MEMORY = 64 * 1024 * 1024
+
+
+class JobSignals(QObject):
+    """Signals of a Job. Emitted from the worker thread, received on the thread of the connected slots"""
+
+    progress = pyqtSignal(int, int)  # done, total
+    finished = pyqtSignal(object)  # result of the job
+    failed = pyqtSignal(str)  # error message
+    cancelled = pyqtSignal()
+
+
+class Job(QRunnable):
+    def __init__(self, name: str, work: Callable, *args, **kwargs):
+        """
+        A unit of background work
+        Args:
+        name -- shown in the status bar while the job runs
+        work -- called as work(job, *args, **kwargs) on a pool thread. Long running work should call
+            job.report_progress, which also stops the work once the job is cancelled
+        """
+        super().__init__()
+        # The scheduler keeps the job alive until it is done
+        self.setAutoDelete(False)
+        self.name = name
+        self.signals = JobSignals()
+        self._work = work
+        self._args = args
+        self._kwargs = kwargs
+        self.pool = None  # set by the scheduler
+        self._cancel_event = threading.Event()
+        self._done = threading.Event()
+
+    def cancel(self):
+        """Asks the job to stop. A job that already finished is not affected"""
+        self._cancel_event.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def is_done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Blocks until the job is done. Only for tests and headless callers, never the GUI thread"""
+        return self._done.wait(timeout)
+
+    def report_progress(self, done: int, total: int):
+        """Reports progress. Raises JobCancelled once the job is cancelled"""
+        if self.is_cancelled():
+            raise JobCancelled(self.name)
+        self.signals.progress.emit(int(done), int(total))
+
+    def run(self):
+        try:
+            if self.is_cancelled():
+                raise JobCancelled(self.name)
+            result = self._work(self, *self._args, **self._kwargs)
+        except JobCancelled:
+            self._done.set()
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self._done.set()
+            self.signals.failed.emit(str(e))
+        else:
+            self._done.set()
+            self.signals.finished.emit(result)
+
+
+class JobScheduler(QObject):
+    """Hands jobs to the thread pools and keeps them alive until they are done"""
+
+    job_started = pyqtSignal(str)
+    job_progress = pyqtSignal(str, int, int)  # job name, done, total
+    job_done = pyqtSignal(str)
+
+    def __init__(self, parent=None, compute_pool: QThreadPool = None):
+        """
+        Args:
+        compute_pool -- pool for the multiply and the stats, the global pool when None
+        """
+        super().__init__(parent)
+        self.compute_pool = compute_pool or QThreadPool.globalInstance()
+        self.io_pool = QThreadPool(self)
+        self.io_pool.setMaxThreadCount(1)
+        self._jobs = set()
+
+    def pending_jobs(self) -> int:
+        return len(self._jobs)
+
+    def submit(self, job: Job, io: bool = False, **slots) -> Job:
+        """Starts job on the compute pool, or on the io pool for saves and loads
+        Args:
+        job -- the job to run
+        io -- whether the job uses the DatabaseModel
+        slots -- callables connected to the job's signals of the same name (progress, finished, failed,
+            cancelled) before it starts, so a job that finishes at once is not missed
+        """
+        self._jobs.add(job)
+        # Connected first so the scheduler is up to date when the caller's slots run
+        job.signals.progress.connect(partial(self._on_job_progress, job))
+        for signal in (job.signals.finished, job.signals.failed, job.signals.cancelled):
+            signal.connect(partial(self._on_job_done, job))
+        for name, slot in slots.items():
+            getattr(job.signals, name).connect(slot)
+        job.pool = self.io_pool if io else self.compute_pool
+        job.pool.start(job)
+        self.job_started.emit(job.name)
+        return job
+
+    def cancel(self, job: Job):
+        """Cancels job, taking it off its pool if it has not started"""
+        job.cancel()
+        if job in self._jobs and job.pool.tryTake(job):
+            job._done.set()
+            job.signals.cancelled.emit()
+
+    def cancel_all(self):
+        for job in list(self._jobs):
+            self.cancel(job)
+
+    def wait_for_done(self, msecs: int = -1) -> bool:
+        """Blocks until both pools are idle. Only for tests and shutdown"""
+        return self.compute_pool.waitForDone(msecs) and self.io_pool.waitForDone(msecs)
+
+    def _on_job_progress(self, job: Job, done: int, total: int):
+        self.job_progress.emit(job.name, done, total)
+
+    def _on_job_done(self, job: Job, *result):
+        if job in self._jobs:
+            self._jobs.discard(job)
+            self.job_done.emit(job.name)
+
+    # Jobs of the app. slots are passed on to submit
+
+    def multiply(self, a, b, **slots) -> Job:
+        """Job whose result is C = A x B"""
+        return self.submit(Job("Multiplying", _multiply_work, a, b), **slots)
+
+    def track_product(self, a, b, **slots) -> Job:
+        """Job whose result is an IncrementalStats of A x B, for the live stats while editing"""
+        return self.submit(Job("Calculating live stats", _track_product_work, a, b), **slots)
+
+    def calculate_stats(self, C, **slots) -> Job:
+        """Job whose result is the list of stats of C, see stats_engine.calculate_stats"""
+        return self.submit(Job("Calculating stats", _stats_work, C), **slots)
+
+    def save_run(
+        self, database_model: "DatabaseModel", run_data: "RunData", **slots
+    ) -> Job:
+        """Job whose result is the FailureMessage of database_model.save_run, None on success"""
+        return self.submit(
+            Job("Saving " + run_data.run_name, _save_work, database_model, run_data),
+            io=True,
+            **slots
+        )
+
+    def load_run(
+        self, database_model: "DatabaseModel", run_name: str, lazy: bool = False, **slots
+    ) -> Job:
+        """Job whose result is the loaded RunData
+        Args:
+        database_model -- the DatabaseModel, or a RunPrefetcher standing in for it
+        """
+        return self.submit(
+            Job("Loading " + run_name, _load_work, database_model, run_name, lazy),
+            io=True,
+            **slots
+        )
+
+    def aggregate_runs(
+        self, database_model: "DatabaseModel", run_names, **slots
+    ) -> Job:
+        """Job whose result is the run_aggregation.RunAggregate of the runs.
+        On the compute pool, as it reads the runs on threads of its own and may take a while
+        """
+        return self.submit(
+            Job(
+                "Comparing " + str(len(run_names)) + " runs",
+                _aggregate_work,
+                database_model,
+                list(run_names),
+            ),
+            **slots
+        )
+
+
+def _aggregate_work(job: Job, database_model: "DatabaseModel", run_names):
+    job.report_progress(0, len(run_names))
+    return database_model.aggregate_runs(run_names, progress=job.report_progress)
+
+
+def _multiply_work(job: Job, a, b):
+    from matrix_app.blocked_multiply import blocked_multiply
+    from matrix_app.narrow_dtypes import product_dtypes
+    from matrix_app.sparse_matrices import auto_sparse, is_sparse
+    from matrix_app.stats_engine import multiply
+
+    a = auto_sparse(a)
+    b = auto_sparse(b)
+    m, k = a.shape
+    n = b.shape[1]
+    itemsize = product_dtypes(a, b)[0].itemsize
+    # Sparse products scale with the nonzero entries, and small dense ones are over before a
+    # progress report would matter, so both run in one go
+    if is_sparse(a) or is_sparse(b) or (m * k + k * n + m * n) * itemsize <= PANEL_MEMORY:
+        job.report_progress(0, 1)
+        C = multiply(a, b)
+        job.signals.progress.emit(1, 1)
+        return C
+    # Panels so there is a progress report, and a chance to cancel, every so often
+    return blocked_multiply(
+        a, b, memory_limit=PANEL_MEMORY, progress=job.report_progress
+    )
+
+
+def _track_product_work(job: Job, a, b):
+    from matrix_app.incremental_stats import IncrementalStats
+
+    job.report_progress(0, 1)
+    return IncrementalStats(a, b)
+
+
+def _stats_work(job: Job, C):
+    from matrix_app.stats_engine import calculate_stats
+
+    return calculate_stats(C, progress=job.report_progress)
+
+
+def _save_work(job: Job, database_model: "DatabaseModel", run_data: "RunData"):
+    # A save is not interrupted once it started writing
+    job.report_progress(0, 1)
+    err = database_model.save_run(run_data)
+    job.signals.progress.emit(1, 1)
+    return err
+
+
+def _load_work(job: Job, database_model: "DatabaseModel", run_name: str, lazy: bool):
+    job.report_progress(0, 1)
+    run_data = database_model.load_run(run_name, lazy=lazy)
+    job.report_progress(1, 1)
+    return run_data
@@ -0,0 +1,159 @@
+"""
+small_matrix_app.matrix_app.log_cumprod.py
+Cumulative products that leave the range of their dtype, tracked in log space.
+A cumulative product over a large C soon overflows (inf for floats, silent wraparound for ints) or underflows to 0.
+LogCumprod follows one cumulative product block by block next to the raw values, as a sign and the log10 of the
+magnitude, so every entry that is out of range is found and its value is kept in a form that is.
+It stays idle, and costs nothing, while a float product is clearly in range.
+No Qt dependency.
+"""
+
+from typing import Callable
+
+import numpy as np
+
+# One entry of a cumulative product in log space. The sign is 0 once a zero was multiplied in
+CUMPROD_LOG_DTYPE = np.dtype([("sign", np.int8), ("log10", np.float64)])
+
+
+def log_factors(block: np.ndarray) -> (np.ndarray, np.ndarray):
+    """log10 of the magnitude and the negative flag of every entry of a block of C, shared by every LogCumprod"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        logs = np.log10(np.abs(block), dtype=np.float64)
+    return logs, block < 0
+
+
+def lazy_log_factors(block: np.ndarray) -> Callable:
+    """Returns a callable that computes log_factors(block) the first time it is called and the same result after"""
+    cache = []
+
+    def factors():
+        if not cache:
+            cache.append(log_factors(block))
+        return cache[0]
+
+    return factors
+
+
+def out_of_range(raw: np.ndarray, log10: np.ndarray) -> np.ndarray:
+    """Which raw cumulative product entries do not hold their true value.
+    Exact for floats, which show it as inf or a flushed magnitude. Ints wrap around silently,
+    so for them it is decided from the log magnitude
+    """
+    if raw.dtype.kind in "iu":
+        return log10 > np.log10(np.iinfo(raw.dtype).max)
+    tiny = np.finfo(raw.dtype).tiny
+    with np.errstate(invalid="ignore"):
+        return np.isfinite(log10) & (np.isinf(raw) | (np.abs(raw) < tiny))
+
+
+def may_be_out_of_range(raw: np.ndarray) -> bool:
+    """Cheap check of a block of raw float values: False means none of them can be out of range"""
+    if raw.dtype.kind in "iu":
+        return True
+    tiny = np.finfo(raw.dtype).tiny
+    with np.errstate(invalid="ignore"):
+        return bool((np.abs(raw) < tiny).any() or np.isinf(raw).any())
+
+
+def to_log_form(raw: np.ndarray) -> np.ndarray:
+    """Sign and log10 magnitude of cumulative product values that are all in range"""
+    out = np.empty(raw.shape, dtype=CUMPROD_LOG_DTYPE)
+    out["sign"] = np.sign(raw)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out["log10"] = np.log10(np.abs(raw))
+    return out
+
+
+class LogCumprod:
+    def __init__(self, axis, shape: (int, int), dtype, make_target: Callable = None):
+        """
+        Follows one cumulative product of C in log space, from the first block that may be out of range on
+        Args:
+            axis -- None for the product over all entries in row-major order, 0 down each column, 1 across each row
+            shape -- shape of C
+            dtype -- dtype of the raw cumulative product
+            make_target -- called with (shape, dtype) to create where the log form goes, e.g. an h5py dataset.
+                An ndarray when None
+        """
+        self.axis = axis
+        self.shape = shape
+        self.dtype = np.dtype(dtype)
+        self._make_target = make_target or (lambda s, d: np.empty(s, dtype=d))
+        self.target = None
+        self.out_of_range = 0
+        # Ints wrap around without a trace, so they are followed from the first block
+        self._watch_from_start = self.dtype.kind in "iu"
+        self._negative = None  # whether an odd number of negative factors came before
+        self._log = None
+
+    def _start(self, raw_target, rows_done: int):
+        """Creates the log form target and fills in the rows already done from the raw values,
+        which are in range, then carries on from the last of them"""
+        m, n = self.shape
+        full_shape = (m * n,) if self.axis is None else (m, n)
+        self.target = self._make_target(full_shape, CUMPROD_LOG_DTYPE)
+        step = max(1, (256 * 1024) // max(1, n * 8))
+        for r0 in range(0, rows_done, step):
+            r1 = min(rows_done, r0 + step)
+            if self.axis is None:
+                rows = slice(r0 * n, r1 * n)
+            else:
+                rows = slice(r0, r1)
+            self.target[rows] = to_log_form(np.asarray(raw_target[rows]))
+        if rows_done == 0 or self.axis == 1:
+            return
+        last = np.asarray(raw_target[rows_done * n - 1 if self.axis is None else rows_done - 1])
+        with np.errstate(divide="ignore"):
+            self._log = np.log10(np.abs(last), dtype=np.float64)
+        self._negative = last < 0
+
+    def update(self, raw: np.ndarray, factors, r0: int, raw_target):
+        """Follows the next block of rows of C
+        Args:
+            raw -- raw cumulative product of the block, as computed by the StatsAccumulator.
+                None once this cumulative product is out of range
+            factors -- callable returning the log_factors of the block, see lazy_log_factors, so they are
+                only computed when some LogCumprod needs them
+            r0 -- first row of the block
+            raw_target -- where the raw cumulative product is written, to fill in the rows before the first watched block
+        """
+        if self.target is None:
+            if not (self._watch_from_start or may_be_out_of_range(raw)):
+                return
+            self._start(raw_target, r0)
+        logs, negatives = factors()
+        n = self.shape[1]
+        if self.axis is None:
+            logs, negatives = logs.ravel(), negatives.ravel()
+            raw = None if raw is None else raw.ravel()
+        along = 1 if self.axis == 1 else 0
+
+        log = np.cumsum(logs, axis=along)
+        # The raw values may have wrapped around, or may no longer be computed, so count the negative factors
+        odd = np.logical_xor.accumulate(negatives, axis=along)
+        if self.axis != 1 and self._log is not None:
+            with np.errstate(invalid="ignore"):
+                log += self._log
+            odd ^= self._negative
+        if self.axis != 1:
+            self._log = log[-1].copy()
+            self._negative = odd[-1].copy()
+        if self.axis is None:
+            rows = slice(r0 * n, r0 * n + log.size)
+        else:
+            rows = slice(r0, r0 + log.shape[0])
+        # Written in place when the target is in memory
+        in_memory = isinstance(self.target, np.ndarray)
+        block = self.target[rows] if in_memory else np.empty(log.shape, CUMPROD_LOG_DTYPE)
+        block["log10"] = log
+        sign = odd.view(np.int8) * np.int8(-2)
+        sign += 1
+        # A zero factor makes the log -inf from there on
+        sign[log == -np.inf] = 0
+        block["sign"] = sign
+        # One entry out of range is enough to keep the log form, after that the raw values are not computed
+        if self.out_of_range == 0:
+            self.out_of_range = int(np.count_nonzero(out_of_range(raw, log)))
+        if not in_memory:
+            self.target[rows] = block
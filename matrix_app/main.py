@@ -1,20 +1,70 @@
 """small_matrix_app.matrix_app.main.py
 Starts/Runs Application
+With --profile-startup the imports and the steps up to the first paint of the home screen are timed,
+see startup_profile.py, then the report is printed and the app exits.
 """
 
+import argparse
 import sys
 
-from PyQt5.QtCore import QTimer
-from PyQt5.QtWidgets import QApplication
 
-from matrix_app.main_window import Window
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m matrix_app.main")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="print the import and start up times up to the first paint, then exit",
+    )
+    parser.add_argument(
+        "--db", default="SavedRuns", help="directory the runs are saved in (default SavedRuns)"
+    )
+    # Anything else is for Qt, e.g. -platform offscreen
+    return parser.parse_known_args(argv)
 
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    win = Window()
+
+def main(argv=None) -> int:
+    args, qt_args = parse_args(argv)
+    profile = None
+    if args.profile_startup:
+        from matrix_app.startup_profile import StartupProfile
+
+        profile = StartupProfile()
+        profile.install()
+
+    from PyQt5.QtCore import QTimer
+    from PyQt5.QtWidgets import QApplication
+
+    from matrix_app.main_window import Window
+
+    if profile is not None:
+        profile.mark("imports")
+    app = QApplication(sys.argv[:1] + qt_args)
+    if profile is not None:
+        profile.mark("QApplication")
+    win = Window(db_name=args.db)
+    if profile is not None:
+        profile.mark("Window")
+        # Once the first frame is flushed
+        win.first_painted.connect(
+            lambda: QTimer.singleShot(0, lambda: _report_startup(profile, win, app))
+        )
     win.show()
     timer = QTimer()
     timer.timeout.connect(lambda: None)
     timer.start(100)
-    exit_no = app.exec_()
-    sys.exit(exit_no)
+    return app.exec_()
+
+
+def _report_startup(profile, win, app):
+    profile.mark("first paint")
+    profile.uninstall()
+    # What was deferred until after the first paint, for comparison
+    win.data_run_model
+    profile.mark("open saved runs (deferred)")
+    print(profile.report())
+    win.close()
+    app.quit()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,14 +2,18 @@
 small_matrix_app.matrix_app.main_window.py
 Window is the display window for the matrix_app.
 The same instance of this class is used throughout the entire lifetime of the app.
-The different "screens" of the application are achieved by changing out Window's central widget.
-The Main Window is responsible for hooking up change-screen buttons in whichever widget it sets as its centralwidget.
+The different "screens" of the application are pages of a PageStack, Window's central widget, each built once.
+The Main Window is responsible for hooking up change-screen buttons in each page when it builds it.
+Only the home screen is imported up front. The other pages, and with them numpy and h5py, are imported the first
+time they are shown, and the DatabaseModel is opened the first time it is used, so the home screen paints quickly.
 """
 
 import sys
 
+from functools import partial
+
 from PyQt5 import QtCore
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtWidgets import QApplication, QAction, QDesktopWidget, QMessageBox
 from PyQt5.QtWidgets import QMainWindow
 from PyQt5.QtWidgets import QStatusBar
@@ -20,38 +24,57 @@ from matrix_app.all_exceptions import (
     FailureMessage,
     InternalDbError,
 )
-from matrix_app.db_widget import DatabaseModel, DisplayData, RunData
-from matrix_app.display_stats_widget import DisplayStatsPage
 from matrix_app.home_screen_widget import HomeScreenPage
-from matrix_app.saved_runs_widget import SavedRunsPage
-from matrix_app.matrix_entry_widget import MatrixEntryPage
-
-# from matrix_app.matrix_entry_widget import MatrixEntryPage
+from matrix_app.job_scheduler import Job, JobScheduler
+from matrix_app.page_stack import PageStack
 
-from typing import List
+from typing import Callable, List
 
 
 class Window(QMainWindow):
     """Main Window."""
 
+    first_painted = pyqtSignal()  # emitted once, when the window is painted for the first time
+
     def __init__(self, db_name="SavedRuns", parent=None):
         """Sets up and display Window and places Homepage  Widget as the central widget"""
         super().__init__(parent)
-        self._init_db(db_name)
+        # Multiply, stats, saves and loads run in the background so the window never freezes
+        self.scheduler = JobScheduler(self)
+        self._pending_job = None  # background job whose result changes the screen
+        self._prefetch_next = []  # runs to prefetch once the opened run is loaded
+        self.prefetcher = None
+        self.db_name = db_name
+        self._data_run_model = None
+        self._painted = False
         self._initUi()
         self.show()
 
     def _initUi(self):
         self.resize(QDesktopWidget().availableGeometry(self).size() * 0.7)
         self.setWindowTitle("Matrix Stats")
+        self.pages = PageStack()
+        self.setCentralWidget(self.pages)
         self._create_tool_bar()
         self._create_status_bar()
         self._display_home_screen_page()
         # self.displayMatrixEntryPage()
 
+    @property
+    def data_run_model(self):
+        """The DatabaseModel, opened on first use. None if it could not be opened"""
+        if self._data_run_model is None:
+            self._init_db(self.db_name)
+        return self._data_run_model
+
     def _init_db(self, db_name) -> object:
+        from matrix_app.db_widget import DatabaseModel
+        from matrix_app.prefetcher import RunPrefetcher
+
         try:
-            self.data_run_model = DatabaseModel(db_name)
+            self._data_run_model = DatabaseModel(db_name)
+            # Loads the runs listed next to the one being looked at
+            self.prefetcher = RunPrefetcher(self._data_run_model)
         except CriticalFailure as err:
             ok = QMessageBox().question(
                 self,
@@ -86,87 +109,226 @@ class Window(QMainWindow):
         self.resize_screen_action.triggered.connect(self.resize_me)
         self.tools.addAction(self.resize_screen_action)
 
+        self.cancel_jobs_action = QAction("Cancel", self)
+        self.cancel_jobs_action.setStatusTip("Click me to stop what is running!")
+        self.cancel_jobs_action.triggered.connect(self.scheduler.cancel_all)
+        self.cancel_jobs_action.setEnabled(False)
+        self.tools.addAction(self.cancel_jobs_action)
+
     def _create_status_bar(self):
         status = QStatusBar()
         status.showMessage("hi!")
         self.setStatusBar(status)
+        self.scheduler.job_started.connect(self._on_job_started)
+        self.scheduler.job_progress.connect(self._on_job_progress)
+        self.scheduler.job_done.connect(self._on_job_done)
+
+    def _on_job_started(self, name: str):
+        self.cancel_jobs_action.setEnabled(True)
+        self.statusBar().showMessage(name + "...")
+
+    def _on_job_progress(self, name: str, done: int, total: int):
+        self.statusBar().showMessage(
+            name + "... " + str(int(100 * done / max(1, total))) + "%"
+        )
+
+    def _on_job_done(self, name: str):
+        if self.scheduler.pending_jobs() == 0:
+            self.cancel_jobs_action.setEnabled(False)
+            self.statusBar().showMessage("Done: " + name, 3000)
+
+    def _run_pending_job(self, submit: Callable, **slots):
+        """Starts the job whose result changes the screen, replacing any earlier one.
+        Its slots are dropped if the screen changed before they were called
+        Args:
+        submit -- one of the scheduler's job methods, called with the slots
+        """
+        self._cancel_pending_job()
+        started = []
+        self._pending_job = submit(
+            **{
+                name: partial(self._call_if_pending, started, slot)
+                for name, slot in slots.items()
+            }
+        )
+        started.append(self._pending_job)
+
+    def _call_if_pending(self, started: List[Job], slot: Callable, *args):
+        if started and started[0] is self._pending_job:
+            self._pending_job = None
+            slot(*args)
+
+    def _cancel_pending_job(self):
+        if self._pending_job is not None:
+            self.scheduler.cancel(self._pending_job)
+            self._pending_job = None
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self._painted:
+            self._painted = True
+            self.first_painted.emit()
+
+    def closeEvent(self, event):
+        self.scheduler.cancel_all()
+        self.scheduler.wait_for_done()
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+        super().closeEvent(event)
 
     def resize_me(self):
         """ Sets the Window size to 70% of the current screen"""
         self.resize(QDesktopWidget().availableGeometry(self).size() * 0.7)
 
     # Controller-View
-    # Choose to instantiate a new central widget for each screen change since
-    # there is no reason to remember widget state
+    # Each page is built, and its buttons connected, the first time it is shown, then kept in
+    # self.pages: going back to a page only resets the page left and refreshes the page shown
 
     def _display_matrix_entry(self):
-        self.matrix_entry_page = MatrixEntryPage()
+        self._cancel_pending_job()
+        page = self.pages.page("matrix_entry", self._build_matrix_entry_page)
+        self.matrix_entry_page = self.pages.show_page(page)
+
+    def _build_matrix_entry_page(self):
+        from matrix_app.matrix_entry_widget import MatrixEntryPage
 
-        self.matrix_entry_page.calculate_button.clicked.connect(
+        page = MatrixEntryPage(scheduler=self.scheduler)
+        page.calculate_button.clicked.connect(
             self._matrix_entry_page_on_submit_matrices_button_clicked
         )
-
-        self.setCentralWidget(self.matrix_entry_page)
+        return page
 
     def _display_home_screen_page(self):
-        self.home_screen_page = HomeScreenPage()
-
-        self.home_screen_page.create_run_button.clicked.connect(
-            self._display_matrix_entry
-        )
-        self.home_screen_page.saved_runs_button.clicked.connect(
-            self._display_saved_runs_page
-        )
+        self._cancel_pending_job()
+        page = self.pages.page("home_screen", self._build_home_screen_page)
+        self.home_screen_page = self.pages.show_page(page)
 
-        self.setCentralWidget(self.home_screen_page)
+    def _build_home_screen_page(self):
+        page = HomeScreenPage()
+        page.create_run_button.clicked.connect(self._display_matrix_entry)
+        page.saved_runs_button.clicked.connect(self._display_saved_runs_page)
+        return page
 
     def _display_saved_runs_page(self):
-        self.saved_runs_page = SavedRunsPage(
-            self.data_run_model.get_previous_runs(),
+        self._cancel_pending_job()
+        if self.data_run_model is None:
+            return
+        page = self.pages.page("saved_runs", self._build_saved_runs_page)
+        self.saved_runs_page = self.pages.show_page(page)
+
+    def _build_saved_runs_page(self):
+        from matrix_app.saved_runs_widget import SavedRunsPage
+
+        page = SavedRunsPage(
+            self.data_run_model,
             self._saved_runs_page_on_display_button_clicked,
         )
-
-        self.setCentralWidget(self.saved_runs_page)
+        page.compare_button.clicked.connect(
+            self._saved_runs_page_on_compare_button_clicked
+        )
+        return page
 
     def _display_display_stats_page(
-        self, matrices: List[DisplayData] = None, run_data: RunData = None
+        self,
+        matrices: List["DisplayData"] = None,
+        run_data: "RunData" = None,
+        generator=None,
     ):
-        self.display_stats_page = DisplayStatsPage(matrices=matrices, run_data=run_data)
+        page = self.pages.page("display_stats", self._build_display_stats_page)
+        page.show_run(matrices=matrices, run_data=run_data, generator=generator)
+        self.display_stats_page = self.pages.show_page(page)
 
-        self.display_stats_page.save_button.clicked.connect(
-            lambda state, x=self.data_run_model.save_run: self.display_stats_page.save_display(
-                x
-            )
-        )
-        self.display_stats_page.calculate_new_stats_button.clicked.connect(
-            self._display_matrix_entry
-        )
+    def _build_display_stats_page(self):
+        from matrix_app.display_stats_widget import DisplayStatsPage
 
-        self.setCentralWidget(self.display_stats_page)
+        page = DisplayStatsPage(scheduler=self.scheduler)
+        page.save_button.clicked.connect(self._on_save_clicked)
+        page.calculate_new_stats_button.clicked.connect(self._display_matrix_entry)
+        return page
+
+    def _on_save_clicked(self):
+        if self.data_run_model is not None:
+            self.display_stats_page.save_display(self.data_run_model.save_run)
 
     # Passing Data Across Central Widgets Functions
 
     def _saved_runs_page_on_display_button_clicked(self, saved_run_name: str):
-        try:
-            run_data = self.data_run_model.load_run(saved_run_name)
-            self._display_display_stats_page(run_data=run_data)
-        except InternalDbError as fm:
-            msg = QMessageBox()
-            self.x = msg
-            self.x.setText("ERROR: Run not saved: " + str(fm))
-            self.x.exec_()
-        except Exception as e:
-            msg = QMessageBox()
-            self.x = msg
-            self.x.setText("ERROR: Run not saved: " + str(e))
+        self._prefetch_next = self.saved_runs_page.neighbors(saved_run_name)
+        # Lazy so only the parts of the run the tables show are read, unless it was prefetched
+        self._run_pending_job(
+            partial(self.scheduler.load_run, self.prefetcher, saved_run_name, lazy=True),
+            finished=self._on_run_loaded,
+            failed=self._on_run_load_failed,
+        )
+
+    def _saved_runs_page_on_compare_button_clicked(self):
+        run_names = self.saved_runs_page.selected_runs()
+        if len(run_names) < 2:
+            self.x = QMessageBox()
+            self.x.setText("Select at least two runs to compare them")
             self.x.exec_()
+            return
+        self._run_pending_job(
+            partial(self.scheduler.aggregate_runs, self.data_run_model, run_names),
+            finished=self._display_compare_runs_page,
+            failed=self._on_compare_failed,
+        )
+
+    def _display_compare_runs_page(self, aggregate):
+        page = self.pages.page("compare_runs", self._build_compare_runs_page)
+        page.show_aggregate(aggregate)
+        self.compare_runs_page = self.pages.show_page(page)
+
+    def _build_compare_runs_page(self):
+        from matrix_app.compare_runs_widget import CompareRunsPage
+
+        return CompareRunsPage()
+
+    def _on_compare_failed(self, error: str):
+        self.x = QMessageBox()
+        self.x.setText("ERROR: Runs not compared: " + error)
+        self.x.exec_()
+
+    def _on_run_loaded(self, run_data: "RunData"):
+        self._display_display_stats_page(run_data=run_data)
+        # Started only now so the prefetches do not hold up the run being opened
+        self.prefetcher.prefetch(self._prefetch_next)
+
+    def _on_run_load_failed(self, error: str):
+        msg = QMessageBox()
+        self.x = msg
+        self.x.setText("ERROR: Run not saved: " + error)
+        self.x.exec_()
 
     def _matrix_entry_page_on_submit_matrices_button_clicked(self):
-        dd, err = self.matrix_entry_page.calculate_matrix()
+        dd, err = self.matrix_entry_page.entered_matrices()
         if err is not None:
-            pass
-        else:
-            self._display_display_stats_page(matrices=dd)
+            return
+        generator = self.matrix_entry_page.generator
+        # Live stats already keep the product up to date
+        C = self.matrix_entry_page.live_product(dd[0].data, dd[1].data)
+        if C is not None:
+            self._on_product_calculated(dd, generator, C)
+            return
+        self.matrix_entry_page.calculate_button.setEnabled(False)
+        self._run_pending_job(
+            partial(self.scheduler.multiply, dd[0].data, dd[1].data),
+            finished=partial(self._on_product_calculated, dd, generator),
+            failed=self._on_product_failed,
+            cancelled=self._on_product_failed,
+        )
+
+    def _on_product_calculated(self, matrices: List["DisplayData"], generator, C):
+        from matrix_app.db_widget import DisplayData
+
+        self._display_display_stats_page(
+            matrices=matrices + [DisplayData("C", C)], generator=generator
+        )
+
+    def _on_product_failed(self, error: str = None):
+        self.matrix_entry_page.calculate_button.setEnabled(True)
+        if error is not None:
+            self.matrix_entry_page.show_product_error(error)
 
 
 if __name__ == "__main__":
@@ -4,7 +4,7 @@ Creates the screen for entering and submitting matrices to be multiplied togethe
 """
 import sys
 
-from PyQt5 import QtCore, QtWidgets
+from PyQt5 import QtCore, QtWidgets, sip
 from PyQt5.QtWidgets import (
     QVBoxLayout,
     QSpinBox,
@@ -13,30 +13,65 @@ from PyQt5.QtWidgets import (
     QHBoxLayout,
     QPushButton,
     QFormLayout,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
     QMessageBox,
     QLabel,
+    QShortcut,
+    QFileDialog,
+    QApplication,
+    QComboBox,
+    QDoubleSpinBox,
+    QLineEdit,
+    QCheckBox,
 )
+from PyQt5.QtGui import QIntValidator, QKeySequence
 
-from typing import List
 import numpy as np
-import random
+
+from functools import partial
 
 from matrix_app.all_exceptions import FailureMessage
 from matrix_app.db_widget import DisplayData
+from matrix_app.run_text import format_value
+from matrix_app.incremental_stats import IncrementalStats
+from matrix_app.job_scheduler import JobScheduler
+from matrix_app.stats_engine import multiply
+from matrix_app.narrow_dtypes import narrow, product_dtypes
+from matrix_app.page_stack import Page
+from matrix_app.matrix_io import (
+    IMPORT_EXTENSIONS,
+    find_invalid_cell,
+    load_matrix_file,
+    parse_delimited,
+)
+from matrix_app.random_matrices import (
+    AUTO_DTYPE,
+    DISTRIBUTIONS,
+    DTYPE_CHOICES,
+    RandomMatrixSpec,
+    RunGenerator,
+    new_seed,
+)
 
 
-class MatrixEntryPage(QtWidgets.QWidget):
-    def __init__(self, parent=None):
+class MatrixEntryPage(Page):
+    def __init__(self, parent=None, scheduler: JobScheduler = None):
         """
         MatrixEntryPage displays empty matrices that the use can fill in by hand. It also displays
         'Generate Random Matrices' button, which automatically fills in the matrices with random ints between 0 and 100.
         It also displays a 'CALCULATE Matrix1 x Matrix2 PRODUCT' button which will result in a new central widget
         for the MainWindow where stats for the inputted matrices can be generated.
+        Args:
+        parent -- parent of MatrixEntryPage
+        scheduler -- computes the first product of the live stats in the background. Without one it is
+            computed on the GUI thread
         """
         # initAllScreens https://stackoverflow.com/questions/38923978/object-going-out-of-scope-and-being-garbage-collected-in-pyside-pyqt
         super().__init__(parent)
+        self.scheduler = scheduler
+        self._live_stats_job = None
+        # Counts the restarts of the live stats, so a product that arrives for earlier matrices is dropped
+        self._live_restarts = 0
         self._initUi()
         self.show()
 
@@ -48,6 +83,32 @@ class MatrixEntryPage(QtWidgets.QWidget):
 
         self.generate_random_matrix_button = QPushButton()
         self.generate_random_matrix_button.setText("Generate Random Matrices")
+        self.random_max_dim_box = QSpinBox()
+        self.random_max_dim_box.setMinimum(1)
+        self.random_max_dim_box.setMaximum(SubmitMatrixBox.MAX_DIMENSION)
+        self.random_max_dim_box.setValue(10)
+        self.random_max_dim_box.setPrefix("Random dimensions up to ")
+        self.random_dtype_box = QComboBox()
+        self.random_dtype_box.addItems(DTYPE_CHOICES)
+        self.random_dtype_box.setCurrentText(AUTO_DTYPE)
+        self.random_distribution_box = QComboBox()
+        self.random_distribution_box.addItems(DISTRIBUTIONS)
+        self.random_density_box = QDoubleSpinBox()
+        self.random_density_box.setRange(0, 1)
+        self.random_density_box.setSingleStep(0.05)
+        self.random_density_box.setValue(1)
+        self.random_density_box.setPrefix("Density ")
+        self.random_seed_box = QLineEdit()
+        self.random_seed_box.setPlaceholderText("Seed (blank for a new one)")
+        self.random_seed_box.setValidator(QIntValidator(0, 2 ** 31 - 1))
+        self.random_seed_label = QLabel()
+        # How the entered matrices were generated, until they are edited
+        self.generator = None
+        # Keeps the product and its stats up to date while cells are edited
+        self.live_stats = None
+        self.live_stats_box = QCheckBox()
+        self.live_stats_box.setText("Live stats while editing")
+        self.live_stats_label = QLabel()
         self.calculate_button = QPushButton()
         self.calculate_button.setText("CALCULATE Matrix1 x Matrix2 PRODUCT")
 
@@ -62,7 +123,26 @@ class MatrixEntryPage(QtWidgets.QWidget):
         full_layout = QFormLayout()
         full_layout.addWidget(submit_entry_widget)
 
+        random_options_widget = QWidget()
+        random_options_layout = QHBoxLayout()
+        for w in (
+            self.random_max_dim_box,
+            self.random_dtype_box,
+            self.random_distribution_box,
+            self.random_density_box,
+            self.random_seed_box,
+            self.random_seed_label,
+        ):
+            random_options_layout.addWidget(w)
+        random_options_widget.setLayout(random_options_layout)
+        full_layout.addWidget(random_options_widget)
         full_layout.addWidget(self.generate_random_matrix_button)
+        live_stats_widget = QWidget()
+        live_stats_layout = QHBoxLayout()
+        live_stats_layout.addWidget(self.live_stats_box)
+        live_stats_layout.addWidget(self.live_stats_label)
+        live_stats_widget.setLayout(live_stats_layout)
+        full_layout.addWidget(live_stats_widget)
         full_layout.addWidget(self.calculate_button)
         self.setLayout(full_layout)
 
@@ -79,27 +159,180 @@ class MatrixEntryPage(QtWidgets.QWidget):
                 x, y
             )
         )
-        self.generate_random_matrix_button.clicked.connect(self._create_random_matrix)
+        self.generate_random_matrix_button.clicked.connect(
+            lambda state: self._create_random_matrix()
+        )
+        # Edited matrices are no longer what the generator makes
+        for entry in (self.matrix_entry_left, self.matrix_entry_right):
+            entry.matrix_model.dataChanged.connect(self._forget_generator)
+            entry.matrix_model.modelReset.connect(self._forget_generator)
+        self.live_stats_box.toggled.connect(lambda state: self._restart_live_stats())
+        self.matrix_entry_left.matrix_model.dataChanged.connect(
+            partial(self._on_entry_edited, True)
+        )
+        self.matrix_entry_right.matrix_model.dataChanged.connect(
+            partial(self._on_entry_edited, False)
+        )
+        for entry in (self.matrix_entry_left, self.matrix_entry_right):
+            entry.matrix_model.modelReset.connect(self._restart_live_stats)
 
-    def _create_random_matrix(self):
-        """ Creates and displays two randomly sized matrices for input matrices"""
-        match_dim = random.randint(1, 10)
-        d1_size = random.randint(1, 10)
-        d2_size = random.randint(1, 10)
+    def reset(self):
+        """Clears both matrices back to empty 4x4 ones, for the next new run.
+        The random options and the live stats box are kept as they were set
+        """
+        for sub_box, entry in (
+            (self.submission_box_left, self.matrix_entry_left),
+            (self.submission_box_right, self.matrix_entry_right),
+        ):
+            sub_box.sp1.setValue(4)
+            sub_box.sp2.setValue(4)
+            entry.resize_self(4, 4)
+        self.calculate_button.setEnabled(True)
+
+    def random_spec(self) -> RandomMatrixSpec:
+        """What the random options on the page describe"""
+        return RandomMatrixSpec(
+            max_dim=self.random_max_dim_box.value(),
+            dtype=self.random_dtype_box.currentText(),
+            distribution=self.random_distribution_box.currentText(),
+            density=self.random_density_box.value(),
+        )
 
-        self.matrix_entry_left.randomize_self(d1_size, match_dim)
-        self.matrix_entry_right.randomize_self(match_dim, d2_size)
+    def _create_random_matrix(self, seed: int = None):
+        """ Creates and displays two randomly sized matrices for input matrices.
+        The seed comes from the seed box, or is a new one when the box is blank
+        """
+        if seed is None:
+            text = self.random_seed_box.text()
+            seed = int(text) if text != "" else new_seed()
+        generator = RunGenerator(self.random_spec(), seed)
+        A, B = generator.make_matrices()
+
+        self.matrix_entry_left.set_matrix(A)
+        self.matrix_entry_right.set_matrix(B)
         self.matrix_entry_left.show()
         self.matrix_entry_right.show()
+        self.generator = generator
+        self.random_seed_label.setText("Seed: " + str(seed))
+
+    def _forget_generator(self, *args):
+        self.generator = None
+        self.random_seed_label.setText("")
+
+    def _restart_live_stats(self):
+        """Computes the product and its stats from scratch, when live stats are on and both matrices
+        are complete and can be multiplied. Later edits only update them.
+        With a scheduler the O(mnk) product is computed in the background, and the live stats are
+        attached once it arrives
+        """
+        self.live_stats = None
+        self._live_restarts += 1
+        if self._live_stats_job is not None:
+            self._live_stats_job.cancel()
+            self._live_stats_job = None
+        if not self.live_stats_box.isChecked():
+            self.live_stats_label.setText("")
+            return
+        A = self.matrix_entry_left.matrix_model.array()
+        B = self.matrix_entry_right.matrix_model.array()
+        if np.isnan(A).any() or np.isnan(B).any():
+            self.live_stats_label.setText("Waiting for both matrices to be filled in")
+            return
+        if A.shape[1] != B.shape[0]:
+            self.live_stats_label.setText(
+                "shapes " + str(A.shape) + " and " + str(B.shape) + " not aligned"
+            )
+            return
+        if self.scheduler is None:
+            self.live_stats = IncrementalStats(A, B)
+            self._show_live_stats()
+            return
+        self.live_stats_label.setText("Calculating Matrix1 x Matrix2...")
+        self._live_stats_job = self.scheduler.track_product(
+            A,
+            B,
+            finished=partial(self._on_live_stats_calculated, self._live_restarts),
+            failed=partial(self._on_live_stats_failed, self._live_restarts),
+        )
+
+    def _on_live_stats_calculated(self, restarts: int, live_stats: IncrementalStats):
+        if sip.isdeleted(self) or restarts != self._live_restarts:
+            return
+        self._live_stats_job = None
+        self.live_stats = live_stats
+        self._show_live_stats()
+
+    def _on_live_stats_failed(self, restarts: int, error: str):
+        if sip.isdeleted(self) or restarts != self._live_restarts:
+            return
+        self._live_stats_job = None
+        self.live_stats_label.setText("Live stats not calculated: " + error)
+
+    def _on_entry_edited(self, is_left: bool, top_left, bottom_right, *args):
+        """Applies an edited cell, or pasted block, of either matrix to the live stats"""
+        if self.live_stats is None:
+            # The edit may have filled in the last empty cell
+            if self.live_stats_box.isChecked():
+                self._restart_live_stats()
+            return
+        entry = self.matrix_entry_left if is_left else self.matrix_entry_right
+        row, col = top_left.row(), top_left.column()
+        block = entry.matrix_model.array()[
+            row : bottom_right.row() + 1, col : bottom_right.column() + 1
+        ]
+        if np.isnan(block).any():
+            self.live_stats = None
+            self.live_stats_label.setText("Waiting for both matrices to be filled in")
+            return
+        if is_left:
+            self.live_stats.set_a_block(row, col, block)
+        else:
+            self.live_stats.set_b_block(row, col, block)
+        self._show_live_stats()
+
+    def _show_live_stats(self):
+        minimum, mean, maximum = self.live_stats.summary()
+        self.live_stats_label.setText(
+            "Matrix1 x Matrix2: min "
+            + format_value(minimum)
+            + ", mean "
+            + format_value(mean)
+            + ", max "
+            + format_value(maximum)
+        )
+
+    def live_product(self, A=None, B=None) -> np.ndarray:
+        """A copy of the live product of the entered matrices, None when live stats are off or out of date.
+        Given A and B, as entered_matrices returns them, it comes in the dtype multiply would return A x B in,
+        and is None when it is not their product's shape or is not exact in that dtype
+        Args:
+            A -- mxk matrix, the entered Matrix1
+            B -- kxn matrix, the entered Matrix2
+        """
+        if self.live_stats is None:
+            return None
+        C = self.live_stats.C
+        if A is None or B is None:
+            return C.copy()
+        if C.shape != (A.shape[0], B.shape[1]):
+            return None
+        compute, out = product_dtypes(A, B)
+        # Float live products are exact where multiply would compute in a float too,
+        # integer ones (int64) wherever the product fits an integer dtype
+        if C.dtype.kind == "f" and compute.kind != "f":
+            return None
+        if C.dtype.kind != "f" and out.kind == "f":
+            return None
+        return C.astype(out)
 
     def _resize_matrix_entry(self, sub_box, mat_ent) -> (bool, str):
         dim_tup = sub_box.get_dimensions()
         mat_ent.resize_self(dim_tup[0], dim_tup[1])
         mat_ent.show()
 
-    def calculate_matrix(self) -> ([DisplayData], str):
-        """Calculates the product of self.matrix_entry_left with self.matrix_entry_right.
-        Returns the two input matrices and the product
+    def entered_matrices(self) -> ([DisplayData], FailureMessage):
+        """Returns the two input matrices, checked so that they can be multiplied.
+        Shows an error box and returns the error if they cannot
         """
         m1, fm1 = self.matrix_entry_left.return_matrix()
         m2, fm2 = self.matrix_entry_right.return_matrix()
@@ -122,28 +355,48 @@ class MatrixEntryPage(QtWidgets.QWidget):
             )
             self.x = msg.exec_()
             return [], fm2
+        if m1.shape[1] != m2.shape[0]:
+            fm = FailureMessage(
+                "shapes " + str(m1.shape) + " and " + str(m2.shape) + " not aligned"
+            )
+            self.show_product_error(str(fm))
+            return [], fm
+        if self.generator is not None and self.generator.spec.dtype != AUTO_DTYPE:
+            # Entries come back in their narrowest dtype, generated matrices get the one chosen for them
+            m1 = m1.astype(self.generator.spec.dtype)
+            m2 = m2.astype(self.generator.spec.dtype)
+        return [DisplayData("A", m1), DisplayData("B", m2)], None
+
+    def show_product_error(self, error: str):
+        """Shows why the product of the entered matrices could not be computed"""
+        msg = QMessageBox()
+        msg.setWindowTitle("Error! We can't compute the product of these matrices!")
+        msg.setText(
+            "We got an error trying use your input for the matrix product: " + error
+        )
+        self.x = msg.exec_()
+
+    def calculate_matrix(self) -> ([DisplayData], str):
+        """Calculates the product of self.matrix_entry_left with self.matrix_entry_right.
+        Returns the two input matrices and the product
+        """
+        dd, fm = self.entered_matrices()
+        if fm is not None:
+            return [], fm
         try:
-            m1 = np.array(m1)
-            m2 = np.array(m2)
-            m3 = m1.dot(m2)
+            m3 = multiply(dd[0].data, dd[1].data)
         except Exception as e:
-            msg.setWindowTitle("Error! We can't compute the product of these matrices!")
-            msg.setText(
-                "We got an error trying use your input for the matrix product: "
-                + str(e)
-            )
-            self.x = msg.exec_()
+            self.show_product_error(str(e))
             return [], FailureMessage(str(e))
 
-        dd = []
-        dd.append(DisplayData("A", m1))
-        dd.append(DisplayData("B", m2))
         dd.append(DisplayData("C", m3))
         self.show()
         return dd, None
 
 
 class SubmitMatrixBox(QtWidgets.QWidget):
+    MAX_DIMENSION = 100000
+
     def __init__(self, parent=None):
         """Creates submission box for choosing input matrix dimensions"""
         super().__init__(parent)
@@ -165,7 +418,12 @@ class SubmitMatrixBox(QtWidgets.QWidget):
         name_label.setAlignment(QtCore.Qt.AlignCenter)
 
         self.info_label = QLabel()
-        self.info_label.setText("Matrix Dimensions are from 1x1 to 10x10")
+        self.info_label.setText(
+            "Matrix Dimensions are from 1x1 to "
+            + str(self.MAX_DIMENSION)
+            + "x"
+            + str(self.MAX_DIMENSION)
+        )
         self.info_label.adjustSize()
         self.choose_dimen_button = QPushButton()
         self.choose_dimen_button.setText("Choose Dimensions")
@@ -173,14 +431,14 @@ class SubmitMatrixBox(QtWidgets.QWidget):
         # Dimensions Box
         self.sp1 = QSpinBox()
         self.sp1.setValue(4)
-        self.sp1.setMaximum(10)
+        self.sp1.setMaximum(self.MAX_DIMENSION)
         self.sp1.setMinimum(1)
         self.label_x = QLabel()
         self.label_x.setAlignment(QtCore.Qt.AlignCenter)
         self.label_x.setText("X")
         self.sp2 = QSpinBox()
         self.sp2.setValue(4)
-        self.sp2.setMaximum(10)
+        self.sp2.setMaximum(self.MAX_DIMENSION)
         self.sp2.setMinimum(1)
 
         # QFormLayout add row https://stackoverflow.com/questions/49582206/how-to-initialize-layouts-in-a-packed-way-reducing-space-between-layouts
@@ -204,7 +462,93 @@ class SubmitMatrixBox(QtWidgets.QWidget):
         self.setLayout(submitMatrix_layout)
 
 
+class MatrixEntryModel(QtCore.QAbstractTableModel):
+    def __init__(self, m: int = 4, n: int = 4):
+        """Editable table model backed by a single float ndarray. Empty cells are stored as NaN
+        so the entered matrix never round-trips through nested Python lists.
+        Integers are exact below 2**53, larger entries are rejected by matrix_io.find_invalid_cell.
+
+        Args:
+            m -- initial row number of the matrix
+            n -- initial column number of the matrix
+        """
+        super().__init__()
+        self._array = np.full((m, n), np.nan)
+
+    def array(self) -> np.ndarray:
+        """Returns the backing array (not a copy)"""
+        return self._array
+
+    def set_array(self, array: np.ndarray):
+        """Replaces the whole matrix at once"""
+        self.beginResetModel()
+        self._array = np.array(array, dtype=float, ndmin=2)
+        self.endResetModel()
+
+    def set_block(self, row: int, col: int, block: np.ndarray):
+        """Writes block with its top left corner at (row, col) in one array assignment.
+        The matrix grows, with empty cells, when the block does not fit
+        """
+        block = np.array(block, dtype=float, ndmin=2)
+        m = max(self._array.shape[0], row + block.shape[0])
+        n = max(self._array.shape[1], col + block.shape[1])
+        if (m, n) != self._array.shape:
+            grown = np.full((m, n), np.nan)
+            grown[: self._array.shape[0], : self._array.shape[1]] = self._array
+            grown[row : row + block.shape[0], col : col + block.shape[1]] = block
+            self.set_array(grown)
+            return
+        self._array[row : row + block.shape[0], col : col + block.shape[1]] = block
+        self.dataChanged.emit(
+            self.index(row, col),
+            self.index(row + block.shape[0] - 1, col + block.shape[1] - 1),
+        )
+
+    # Override
+    def rowCount(self, index=QtCore.QModelIndex()):
+        return self._array.shape[0]
+
+    # Override
+    def columnCount(self, index=QtCore.QModelIndex()):
+        return self._array.shape[1]
+
+    # Override
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole or role == QtCore.Qt.EditRole:
+            value = self._array[index.row(), index.column()]
+            if np.isnan(value):
+                return ""
+            if value.is_integer() and abs(value) < 2 ** 53:
+                return str(int(value))
+            return repr(float(value))
+        return None
+
+    # Override
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        if role != QtCore.Qt.EditRole or not index.isValid():
+            return False
+        text = str(value).strip()
+        try:
+            number = np.nan if text == "" else float(text)
+        except ValueError:
+            return False
+        self._array[index.row(), index.column()] = number
+        self.dataChanged.emit(index, index)
+        return True
+
+    # Override
+    def flags(self, index):
+        return (
+            QtCore.Qt.ItemIsSelectable
+            | QtCore.Qt.ItemIsEnabled
+            | QtCore.Qt.ItemIsEditable
+        )
+
+
 class MatrixEntry(QtWidgets.QWidget):
+    # Above this many cells, columns are not sized to their contents since that reads every cell
+    RESIZE_TO_CONTENTS_LIMIT = 10000
+
     def __init__(self, name: str, m=4, n=4, parent=None):
         """Class for input matrix table
 
@@ -222,87 +566,132 @@ class MatrixEntry(QtWidgets.QWidget):
     def _initUi(self, m, n, name):
 
         # Matrix Grid Widget
-        self.matrix_grid_widget = QTableWidget()
-        self.matrix_grid_widget.setRowCount(m)
-        self.matrix_grid_widget.setColumnCount(n)
+        self.matrix_model = MatrixEntryModel(m, n)
+        self.matrix_grid_widget = QTableView()
+        self.matrix_grid_widget.setModel(self.matrix_model)
+        # Pastes whole blocks copied from a spreadsheet or text file
+        self.paste_shortcut = QShortcut(QKeySequence.Paste, self.matrix_grid_widget)
+        self.paste_shortcut.setContext(QtCore.Qt.WidgetWithChildrenShortcut)
+        self.paste_shortcut.activated.connect(self.paste_from_clipboard)
+
+        self.import_button = QPushButton()
+        self.import_button.setText("Import " + name + " from File")
+        self.import_button.clicked.connect(self._choose_import_file)
 
         # Matrix Widget
         self.matrix_label = QLabel(name)
         self.matrix_widget_layout = QVBoxLayout()
         self.matrix_widget_layout.addWidget(self.matrix_label)
         self.matrix_widget_layout.addWidget(self.matrix_grid_widget)
+        self.matrix_widget_layout.addWidget(self.import_button)
 
         # Combine label and matrix grid
         self.setLayout(self.matrix_widget_layout)
 
     def resize_self(self, m: int, n: int):
-        """Resizes input matrix (QTableWidget) dimensions and clears all current entries in the matrix
+        """Resizes input matrix dimensions and clears all current entries in the matrix
 
         Args:
             m -- new row dimension
             n -- new column dimension
         """
-        # Clear Widgets
-        self.matrix_grid_widget.clear()
-        # Resize
-        self.matrix_grid_widget.setRowCount(m)
-        self.matrix_grid_widget.setColumnCount(n)
-        for i in range(m):
-            for j in range(n):
-                self.matrix_grid_widget.setItem(i, j, QTableWidgetItem(""))
+        self.matrix_model.set_array(np.full((m, n), np.nan))
         self.matrix_grid_widget.adjustSize()
 
-    def randomize_self(self, row_size: int, col_size: int):
-        """Resizes matrix_grid_widget and then fills it with random ints between 1, 100.
+    def randomize_self(
+        self, row_size: int, col_size: int, rng: np.random.Generator = None
+    ):
+        """Resizes the matrix and then fills it with random ints between 0, 100.
         Args:
             row_size -- new row dimension
             col_size -- new column dimension
+            rng -- numpy Generator to draw from, a freshly seeded one when None
+
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        self.set_matrix(RandomMatrixSpec().make_matrix(rng, (row_size, col_size)))
+
+    def set_matrix(self, matrix: np.ndarray):
+        """Replaces the entered matrix, and its dimensions, with matrix in one go"""
+        self.matrix_model.set_array(matrix)
+        if self.matrix_model.array().size <= self.RESIZE_TO_CONTENTS_LIMIT:
+            self.matrix_grid_widget.resizeColumnsToContents()
+
+    def paste_text(self, text: str, row: int = 0, col: int = 0) -> FailureMessage:
+        """Writes a TSV/CSV block with its top left corner at (row, col), see matrix_io.parse_delimited"""
+        try:
+            block = parse_delimited(text)
+        except ValueError as e:
+            return FailureMessage(str(e))
+        if block.size == 0:
+            return FailureMessage("Nothing to paste")
+        self.matrix_model.set_block(row, col, block)
+        return None
+
+    def paste_from_clipboard(self) -> FailureMessage:
+        """Pastes the clipboard at the current cell, or the top left cell when there is none"""
+        current = self.matrix_grid_widget.currentIndex()
+        row, col = (current.row(), current.column()) if current.isValid() else (0, 0)
+        fm = self.paste_text(QApplication.clipboard().text(), row, col)
+        if fm is not None:
+            self._show_error("Could not paste: " + str(fm))
+        return fm
+
+    def import_file(self, file_name: str, dataset: str = None) -> FailureMessage:
+        """Replaces the entered matrix with one read from a .npy, .csv or .h5 file, see matrix_io.load_matrix_file"""
+        try:
+            matrix = load_matrix_file(file_name, dataset)
+        except Exception as e:
+            return FailureMessage(str(e))
+        self.set_matrix(matrix)
+        return None
+
+    def _choose_import_file(self):
+        file_name, _ = QFileDialog.getOpenFileName(
+            self,
+            "Import " + self.matrix_name,
+            "",
+            "Matrices (" + " ".join("*" + e for e in IMPORT_EXTENSIONS) + ")",
+        )
+        if file_name == "":
+            return
+        fm = self.import_file(file_name)
+        if fm is not None:
+            self._show_error("Could not import " + file_name + ": " + str(fm))
 
+    def _show_error(self, text: str):
+        msg = QMessageBox()
+        msg.setText(text)
+        self.x = msg.exec_()
+
+    def return_matrix(self) -> (np.ndarray, FailureMessage):
+        """ Exports the entered values as a 2D array where array[row,col] corresponds to cell (row,col),
+        in the narrowest dtype that holds them exactly, see narrow_dtypes.narrow.
+        The error names the first empty or out of range cell
         """
-        self.resize_self(row_size, col_size)
-        for row in range(row_size):
-            for col in range(col_size):
-                number = str(random.randint(0, 100))
-                self.matrix_grid_widget.setItem(row, col, QTableWidgetItem(number))
-        self.matrix_grid_widget.resizeColumnsToContents()
-
-    def return_matrix(self) -> (List[List[float]], FailureMessage):
-        """ Exports matrix_grid_widget values as a 2D list where list[row,col] corresponds to matrix_grid_widget.item(row,col)"""
-        self.matrix_grid_widget.update()
-        my_matrix = []
-        for row in range(self.matrix_grid_widget.rowCount()):
-            my_matrix.append([])
-            for col in range(self.matrix_grid_widget.columnCount()):
-
-                item = self.matrix_grid_widget.item(row, col)
-                if item is None:
-                    return (
-                        [],
-                        FailureMessage("Cannot Have Empty Matrix Values"),
-                    )
-                try:
-                    value = float(item.text())
-                    # https://stackoverflow.com/questions/7604966/maximum-and-minimum-values-for-ints
-                    if value > sys.maxsize or value < -sys.maxsize - 1:
-                        return (
-                            [[]],
-                            FailureMessage(
-                                "All values must be between -sys.maxint -1 and sys.maxint"
-                            ),
-                        )
-                except Exception as e:
-                    return (
-                        [[]],
-                        FailureMessage(
-                            self.matrix_name
-                            + ":  Invalid Matrix Entry: "
-                            + str(e)
-                            + " -- Remember to press enter after entering your last digit into each matrix."
-                        ),
-                    )
-
-                my_matrix[row].append(value)
-        return my_matrix, None
+        matrix = self.matrix_model.array()
+        invalid = find_invalid_cell(matrix)
+        if invalid is not None:
+            row, col, reason = invalid
+            # Selects the cell so it can be fixed right away
+            self.matrix_grid_widget.setCurrentIndex(self.matrix_model.index(row, col))
+            return (
+                np.empty((0, 0)),
+                FailureMessage(
+                    reason
+                    + " (row "
+                    + str(row + 1)
+                    + ", column "
+                    + str(col + 1)
+                    + " of "
+                    + self.matrix_name
+                    + ")"
+                ),
+            )
+        # Copy so later edits do not change an already calculated run
+        matrix = narrow(matrix)
+        return matrix.copy() if matrix is self.matrix_model.array() else matrix, None
 
 
 def main():
@@ -0,0 +1,188 @@
+"""
+small_matrix_app.matrix_app.matrix_io.py
+Reads whole matrices for the MatrixEntry in one go: pasted TSV/CSV blocks and .npy, .csv and .h5 files,
+and checks an entered matrix in one vectorized pass. Writes matrices and stats to .npy and .csv files
+for the command line (cli.py). No Qt dependency.
+"""
+
+import warnings
+
+from os import path
+
+import h5py
+import numpy as np
+
+from matrix_app.sparse_matrices import to_dense
+
+# Values must be strictly inside this range. The MatrixEntry keeps its cells in float64, NaN for empty ones,
+# which holds every integer below 2**53 exactly. Larger ones are rounded, e.g. 2**53 + 1 to 2**53,
+# before they are narrowed, so 2**53 itself may already be a rounded value
+MIN_VALUE = -(2 ** 53)
+MAX_VALUE = 2 ** 53
+RANGE_ERROR = "All values must be strictly between -2**53 and 2**53 to be entered exactly"
+
+IMPORT_EXTENSIONS = (".npy", ".csv", ".h5")
+EXPORT_EXTENSIONS = (".npy", ".csv")
+
+
+def parse_delimited(text: str) -> np.ndarray:
+    """Parses a block of rows copied from a spreadsheet or a text file into a float matrix.
+    Cells are split on tabs, else on commas, else on whitespace. Empty and missing cells become NaN
+    Raises ValueError naming the first cell that is not a number
+    """
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    # A copied block usually ends with a newline
+    while lines and lines[-1].strip() == "":
+        lines.pop()
+    if not lines:
+        return np.empty((0, 0))
+    if "\t" in text:
+        delimiter = "\t"
+    elif "," in text:
+        delimiter = ","
+    else:
+        delimiter = None
+    rows = [line.split(delimiter) for line in lines]
+    width = max(len(r) for r in rows)
+    if all(len(r) == width for r in rows):
+        # Full rectangular blocks are parsed in C. Empty or bad cells change the count
+        # and fall through to the cell by cell path below
+        # Older numpy warns about unparsed text, newer numpy raises
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            try:
+                flat = np.fromstring(
+                    "\n".join(lines).replace(delimiter or " ", " "),
+                    dtype=float,
+                    sep=" ",
+                )
+            except ValueError:
+                flat = np.empty(0)
+        if flat.size == len(rows) * width:
+            return flat.reshape(len(rows), width)
+    cells = np.full((len(rows), width), "", dtype=object)
+    for i, r in enumerate(rows):
+        cells[i, : len(r)] = r
+    cells = np.char.strip(cells.astype(str))
+    cells = np.where(cells == "", "nan", cells)
+    try:
+        return cells.astype(float)
+    except ValueError:
+        # Only for the error message, so the slow search is fine
+        for (row, col), cell in np.ndenumerate(cells):
+            try:
+                float(cell)
+            except ValueError:
+                raise ValueError(
+                    "'"
+                    + cell
+                    + "' at row "
+                    + str(row + 1)
+                    + ", column "
+                    + str(col + 1)
+                    + " is not a number"
+                )
+        raise
+
+
+def load_matrix_file(file_name: str, dataset: str = None) -> np.ndarray:
+    """Reads a 2-d float matrix from a .npy, .csv or .h5 file
+    Args:
+        file_name -- file to read
+        dataset -- for .h5 files, the dataset to read, e.g. "matrices/A" of a saved run.
+            The first 2-d dataset of the file when None
+    """
+    extension = path.splitext(file_name)[1].lower()
+    if extension == ".npy":
+        matrix = np.load(file_name, allow_pickle=False)
+    elif extension == ".csv":
+        with open(file_name) as f:
+            matrix = parse_delimited(f.read())
+    elif extension == ".h5":
+        with h5py.File(file_name, "r") as hdf:
+            if dataset is None:
+                dataset = _first_matrix_dataset(hdf)
+            if dataset is None or dataset not in hdf:
+                raise ValueError("No matrix found in " + file_name)
+            matrix = np.array(hdf[dataset])
+    else:
+        raise ValueError(
+            "Cannot import "
+            + file_name
+            + ", supported files are "
+            + ", ".join(IMPORT_EXTENSIONS)
+        )
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    if matrix.ndim != 2:
+        raise ValueError("Expected a 2-d matrix, got shape " + str(matrix.shape))
+    if matrix.dtype.kind in "iu" and matrix.size > 0:
+        # Checked before the float conversion rounds them
+        if matrix.min() <= MIN_VALUE or matrix.max() >= MAX_VALUE:
+            raise ValueError(RANGE_ERROR + ", " + file_name + " has larger integers")
+    return np.asarray(matrix, dtype=float)
+
+
+def save_matrix_file(file_name: str, matrix):
+    """Writes a matrix, or a stat, to a .npy or .csv file. Sparse matrices are written dense.
+    In .csv files a cumulative product kept as sign and log10 magnitude (see log_cumprod.py) is written
+    as e.g. -10^336.25, and single values and vectors as one row
+    """
+    matrix = to_dense(matrix)
+    extension = path.splitext(file_name)[1].lower()
+    if extension == ".npy":
+        np.save(file_name, matrix, allow_pickle=False)
+    elif extension == ".csv":
+        matrix = np.atleast_2d(matrix)
+        if matrix.dtype.names == ("sign", "log10"):
+            with open(file_name, "w") as f:
+                for row in matrix:
+                    f.write(",".join(_log_form_text(v) for v in row) + "\n")
+        else:
+            np.savetxt(
+                file_name,
+                matrix,
+                delimiter=",",
+                fmt="%d" if matrix.dtype.kind in "biu" else "%.17g",
+            )
+    else:
+        raise ValueError(
+            "Cannot export "
+            + file_name
+            + ", supported files are "
+            + ", ".join(EXPORT_EXTENSIONS)
+        )
+
+
+def _log_form_text(value) -> str:
+    if value["sign"] == 0:
+        return "0"
+    return ("-" if value["sign"] < 0 else "") + "10^" + repr(float(value["log10"]))
+
+
+def _first_matrix_dataset(hdf) -> str:
+    found = []
+
+    def visit(name, obj):
+        if isinstance(obj, h5py.Dataset) and obj.ndim == 2:
+            found.append(name)
+            return True
+        return None
+
+    hdf.visititems(visit)
+    return found[0] if found else None
+
+
+def find_invalid_cell(matrix: np.ndarray):
+    """Returns (row, column, reason) of the first empty or out of range cell in row-major order,
+    or None when every cell is valid. The check is one vectorized pass over the matrix
+    """
+    matrix = np.asarray(matrix, dtype=float)
+    # NaN compares False, so it fails the range check too
+    valid = (matrix > MIN_VALUE) & (matrix < MAX_VALUE)
+    if valid.all():
+        return None
+    row, col = np.unravel_index(np.argmin(valid), matrix.shape)
+    if np.isnan(matrix[row, col]):
+        return int(row), int(col), "Cannot Have Empty Matrix Values"
+    return int(row), int(col), RANGE_ERROR
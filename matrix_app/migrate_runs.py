@@ -0,0 +1,77 @@
+"""
+small_matrix_app.matrix_app.migrate_runs.py
+Converts a database directory of per-run .h5 files into a single file store (see run_stores.py).
+The HDF5 groups are copied as they are, so chunking, compression and dtypes are kept and no data is decoded.
+The source directory is left untouched. Run from the repository root:
+    python -m matrix_app.migrate_runs SavedRuns SavedRunsSingleFile
+"""
+
+import sys
+
+from matrix_app.db_widget import DatabaseModel
+from matrix_app.run_index import RunIndexEntry
+from matrix_app.run_stores import PerFileRunStore, SingleFileRunStore
+
+
+def migrate_to_single_file(src_dir: str, dst_dir: str) -> int:
+    """Copies every run of the per-file database in src_dir into the single file database in dst_dir.
+    Runs already in dst_dir are skipped.
+    Returns the number of migrated runs
+    """
+    src = DatabaseModel(src_dir, cache_bytes=0, backend=PerFileRunStore)
+    try:
+        dst = DatabaseModel(dst_dir, cache_bytes=0, backend=SingleFileRunStore)
+    except Exception:
+        src.close()
+        raise
+    migrated = 0
+    try:
+        # Catches run files added by hand since the index was last written
+        src.rebuild_index()
+        entries = []
+        for entry in src._index.entries():
+            if dst._index.get(entry.run_name) is not None:
+                continue
+            location = dst.store.new_location(entry.run_name, entry.has_stats)
+            with src.store.read(entry.file_name) as source:
+                with dst.store.write(location) as target:
+                    # e.g. the generator of runs saved as a seed
+                    for name, value in source.attrs.items():
+                        target.attrs[name] = value
+                    for group_name in (src.MATRIX_GROUP, src.STATS_GROUP):
+                        if group_name in source:
+                            source.copy(source[group_name], target)
+                    shapes, dtypes = dst._file_layout(target)
+                    nbytes, scalars = dst._file_summary(target)
+            entries.append(
+                RunIndexEntry(
+                    entry.run_name,
+                    location,
+                    entry.has_stats,
+                    shapes,
+                    dtypes,
+                    entry.random,
+                    nbytes=nbytes,
+                    scalars=scalars,
+                )
+            )
+        # Recorded and synced as one group commit
+        migrated = sum(err is None for err in dst._commit_runs(entries)) if entries else 0
+    finally:
+        src.close()
+        dst.close()
+    return migrated
+
+
+def main():
+    if len(sys.argv) != 3:
+        print(
+            "usage: python -m matrix_app.migrate_runs <per-file directory> <single file directory>"
+        )
+        sys.exit(2)
+    count = migrate_to_single_file(sys.argv[1], sys.argv[2])
+    print("Migrated " + str(count) + " runs from " + sys.argv[1] + " to " + sys.argv[2])
+
+
+if __name__ == "__main__":
+    main()
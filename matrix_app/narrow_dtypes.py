@@ -0,0 +1,126 @@
+"""
+small_matrix_app.matrix_app.narrow_dtypes.py
+Picks the narrowest dtype that holds a matrix exactly (int8, int16, int32, int64, float32 or float64),
+and the dtypes a product A x B is computed and returned in so that it cannot overflow.
+Entered matrices are narrowed before they are multiplied, so small integer inputs take 1/8 of the memory
+and disk of float64 ones, and their product takes the narrowest integer dtype its worst case fits in.
+No Qt dependency.
+"""
+
+import numpy as np
+
+from matrix_app.sparse_matrices import dtype_of, is_sparse
+
+INT_DTYPES = tuple(np.dtype(d) for d in ("int8", "int16", "int32", "int64"))
+FLOAT_DTYPES = tuple(np.dtype(d) for d in ("float32", "float64"))
+
+# Integers up to these magnitudes, and every sum of them, are exact in float32 and float64,
+# so integer products below them can be taken by the BLAS float kernels
+FLOAT32_EXACT_INT = 2 ** 24
+FLOAT64_EXACT_INT = 2 ** 53
+
+
+def int_dtype_for(low, high) -> np.dtype:
+    """Narrowest of INT_DTYPES that holds every integer from low to high, None if int64 does not"""
+    low, high = int(low), int(high)
+    for dtype in INT_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return None
+
+
+def narrowest_dtype(matrix) -> np.dtype:
+    """Narrowest dtype that holds every value of matrix exactly: an integer dtype when every value is a
+    whole number in the int64 range, else float32 when every value survives the cast, else its own dtype.
+    Other dtypes (bools, structured arrays) are kept as they are
+    """
+    values = matrix.data if is_sparse(matrix) else np.asarray(matrix)
+    dtype = values.dtype
+    if dtype.kind not in "iuf" or values.size == 0:
+        return dtype
+    low, high = values.min(), values.max()
+    if dtype.kind in "iu":
+        fits = int_dtype_for(low, high)
+        return dtype if fits is None or fits.itemsize >= dtype.itemsize else fits
+    if np.isfinite(low) and np.isfinite(high) and (np.trunc(values) == values).all():
+        fits = int_dtype_for(low, high)
+        if fits is not None:
+            return fits
+    if dtype.itemsize > 4:
+        with np.errstate(over="ignore"):
+            single = values.astype(np.float32)
+        if ((single == values) | (np.isnan(single) & np.isnan(values))).all():
+            return np.dtype(np.float32)
+    return dtype
+
+
+def narrow(matrix):
+    """matrix in its narrowest exact dtype, see narrowest_dtype. Dense or sparse, as it came"""
+    dtype = narrowest_dtype(matrix)
+    if dtype == dtype_of(matrix):
+        return matrix
+    return matrix.astype(dtype)
+
+
+def max_magnitude(matrix):
+    """Largest absolute value in matrix, as a Python int or float so it cannot overflow"""
+    if np.prod(np.shape(matrix)) == 0:
+        return 0
+    low, high = matrix.min(), matrix.max()
+    if dtype_of(matrix).kind in "iu":
+        return max(-int(low), int(high))
+    return max(-float(low), float(high))
+
+
+def _magnitude_bound(matrix):
+    """max_magnitude of an in memory matrix, the largest value of its dtype for anything else,
+    e.g. an h5py dataset, so it is not read just for this
+    """
+    dtype = dtype_of(matrix)
+    if isinstance(matrix, np.ndarray) or is_sparse(matrix):
+        return max_magnitude(matrix)
+    if dtype.kind in "iu":
+        info = np.iinfo(dtype)
+        return max(-int(info.min), int(info.max))
+    if dtype.kind == "f":
+        return float(np.finfo(dtype).max)
+    return None
+
+
+def product_dtypes(A, B) -> (np.dtype, np.dtype):
+    """(dtype A x B is computed in, dtype it is returned in), chosen so that no entry, nor any partial
+    sum of one, can overflow. For integers the returned dtype is the narrowest that holds
+    k * max|A| * max|B|, and the product is computed in float32 or float64 when that bound is exact in
+    them, so it still runs on BLAS. Integer products past int64 are returned as float64, which rounds
+    instead of wrapping around. float32 products that could overflow are computed in float64.
+    Anything else is computed as numpy would.
+    Args:
+        A -- mxk matrix: ndarray, sparse matrix, or anything else with a dtype and a shape, e.g. an h5py dataset
+        B -- kxn matrix
+    """
+    a, b = dtype_of(A), dtype_of(B)
+    result = np.result_type(a, b)
+    if a.kind not in "iuf" or b.kind not in "iuf":
+        return result, result
+    k = np.shape(A)[-1]
+    if result.kind == "f":
+        if result.itemsize < 8:
+            bound = float(k) * _magnitude_bound(A) * _magnitude_bound(B)
+            if not bound <= float(np.finfo(result).max):
+                return FLOAT_DTYPES[-1], FLOAT_DTYPES[-1]
+        return result, result
+    bound = k * _magnitude_bound(A) * _magnitude_bound(B)
+    out = int_dtype_for(-bound, bound)
+    if out is None:
+        return FLOAT_DTYPES[-1], FLOAT_DTYPES[-1]
+    if bound <= FLOAT32_EXACT_INT:
+        return FLOAT_DTYPES[0], out
+    if bound <= FLOAT64_EXACT_INT:
+        return FLOAT_DTYPES[1], out
+    return out, out
+
+
+def sum_dtype(dtype) -> np.dtype:
+    """dtype sums and means of values of dtype are accumulated in: float64, or wider for wider floats"""
+    return np.result_type(np.dtype(dtype), np.float64)
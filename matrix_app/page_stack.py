@@ -0,0 +1,48 @@
+"""
+small_matrix_app.matrix_app.page_stack.py
+The pages of the main window are built once and kept in a PageStack, a QStackedWidget, instead of
+being built again, with all their child widgets and connections, every time the user goes to them.
+Pages follow a reset/refresh protocol so a page that is shown again looks like a new one:
+reset is called on the page that is left and drops what it showed, refresh is called on the page
+that is shown and brings it up to date with anything that changed while it was hidden.
+"""
+
+from typing import Callable
+
+from PyQt5.QtWidgets import QStackedWidget, QWidget
+
+
+class Page(QWidget):
+    """A page of the PageStack. Pages override reset and refresh when they hold data"""
+
+    def reset(self):
+        """Drops what the page shows once it is left, so it does not keep its data alive while hidden"""
+
+    def refresh(self):
+        """Brings the page up to date before it is shown again"""
+
+
+class PageStack(QStackedWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pages = {}  # key -> Page
+        self.built = 0  # pages built so far, each one once
+
+    def page(self, key, build: Callable) -> Page:
+        """The page kept under key, built by calling build the first time it is asked for"""
+        page = self._pages.get(key)
+        if page is None:
+            page = build()
+            self._pages[key] = page
+            self.addWidget(page)
+            self.built += 1
+        return page
+
+    def show_page(self, page: Page) -> Page:
+        """Makes page the one shown, resetting the page that is left and refreshing page"""
+        current = self.currentWidget()
+        if current is not page and current is not None:
+            current.reset()
+        page.refresh()
+        self.setCurrentWidget(page)
+        return page
@@ -0,0 +1,111 @@
+"""
+small_matrix_app.matrix_app.prefetcher.py
+Loads the runs the user is likely to open next into the DatabaseModel's run cache, on a thread pool,
+while the user looks at the current run. Likely runs are the neighbors of the opened run in the
+saved runs list, then the runs viewed most recently.
+Runs are opened through RunPrefetcher.load_run, which waits for a prefetch that is still reading the run
+instead of reading it a second time, and counts how many opened runs had been prefetched.
+No Qt dependency.
+"""
+
+import threading
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from matrix_app.db_widget import DatabaseModel, RunData
+
+
+class RunPrefetcher:
+    def __init__(self, db: DatabaseModel, workers: int = 2, recent: int = 3):
+        """
+        Args:
+        db -- DatabaseModel whose run cache is filled. Nothing is prefetched when its cache is disabled
+        workers -- runs read at the same time
+        recent -- how many recently viewed runs are kept prefetched
+        """
+        self.db = db
+        self.opened = 0  # runs opened through load_run
+        self.hits = 0  # of those, runs that were prefetched
+        self.prefetched = 0  # prefetches started
+        self._recent = deque(maxlen=recent)
+        self._pending = {}  # run name -> Future of its prefetch
+        self._prefetched_runs = set()
+        # Reentrant since cancelling a future calls its done callback on the spot
+        self._lock = threading.RLock()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+
+    def load_run(self, run_name: str, lazy: bool = False) -> RunData:
+        """Opens a run like DatabaseModel.load_run, so it can stand in for the DatabaseModel when loading"""
+        with self._lock:
+            future = self._pending.get(run_name)
+            cached = future is not None or self.db.is_cached(run_name)
+            self.opened += 1
+            if run_name in self._prefetched_runs and cached:
+                self.hits += 1
+            self._prefetched_runs.discard(run_name)
+            if run_name in self._recent:
+                self._recent.remove(run_name)
+            self._recent.append(run_name)
+        if future is not None:
+            try:
+                future.result()
+            except Exception:
+                # A failed prefetch is no reason to fail the load, which reports its own errors
+                pass
+        # A cached run is already in memory, which beats a lazy load
+        return self.db.load_run(run_name, lazy=lazy and not cached)
+
+    def prefetch(self, run_names: List[str]):
+        """Loads run_names, then the recently viewed runs, into the run cache in the background.
+        Queued prefetches of runs that are no longer wanted are dropped
+        """
+        wanted = list(run_names) + [r for r in reversed(self._recent) if r not in run_names]
+        with self._lock:
+            for name, future in list(self._pending.items()):
+                if name not in wanted:
+                    future.cancel()
+            for name in wanted:
+                if name in self._pending or not self._worth_prefetching(name):
+                    continue
+                self.prefetched += 1
+                self._prefetched_runs.add(name)
+                future = self._pool.submit(self.db.load_run, name)
+                self._pending[name] = future
+                future.add_done_callback(lambda f, name=name: self._done(name, f))
+
+    def _worth_prefetching(self, run_name: str) -> bool:
+        cache = self.db.run_cache
+        if cache.max_bytes == 0 or self.db.is_cached(run_name):
+            return False
+        try:
+            entry = self.db.run_summary(run_name)
+        except Exception:
+            return False
+        # A run that would push most of the cache out costs more than it saves
+        return entry.nbytes <= cache.max_bytes // 2
+
+    def _done(self, run_name: str, future):
+        with self._lock:
+            if self._pending.get(run_name) is future:
+                del self._pending[run_name]
+
+    def hit_rate(self) -> float:
+        """Fraction of the opened runs that were prefetched"""
+        return self.hits / self.opened if self.opened else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "opened": self.opened,
+            "hits": self.hits,
+            "prefetched": self.prefetched,
+            "hit_rate": self.hit_rate(),
+        }
+
+    def close(self):
+        """Drops queued prefetches and waits for the ones being read"""
+        with self._lock:
+            for future in list(self._pending.values()):
+                future.cancel()
+        self._pool.shutdown(wait=True)
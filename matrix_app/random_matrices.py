@@ -0,0 +1,169 @@
+"""
+small_matrix_app.matrix_app.random_matrices.py
+Generates random input matrices with numpy.random.Generator, whole arrays at a time.
+A RandomMatrixSpec says what to generate (dimensions, dtype, distribution, density) and a seed makes it reproducible,
+so a generated run can be saved as its seed and spec instead of its data (see DatabaseModel.save_run).
+No Qt dependency: used by the MatrixEntryPage and the batch engine alike.
+"""
+
+import json
+
+from typing import List
+
+import numpy as np
+
+from matrix_app.db_widget import DisplayData
+from matrix_app.narrow_dtypes import narrow
+from matrix_app.stats_engine import calculate_stats, multiply
+
+DTYPES = ("int8", "int16", "int32", "int64", "float32", "float64")
+# The narrowest of DTYPES that holds the generated values exactly, see narrow_dtypes.narrow
+AUTO_DTYPE = "auto"
+DTYPE_CHOICES = (AUTO_DTYPE,) + DTYPES
+
+UNIFORM_INT = "uniform_int"  # integers from low to high, both included
+UNIFORM = "uniform"  # floats in [low, high)
+NORMAL = "normal"  # mean (low + high) / 2, standard deviation (high - low) / 6
+DISTRIBUTIONS = (UNIFORM_INT, UNIFORM, NORMAL)
+
+
+class RandomMatrixSpec:
+    def __init__(
+        self,
+        max_dim: int = 10,
+        low: int = 0,
+        high: int = 100,
+        dtype: str = "float64",
+        distribution: str = UNIFORM_INT,
+        density: float = 1.0,
+    ):
+        """Describes randomly generated input matrices. The defaults are what the MatrixEntryPage always generated
+        Args:
+            max_dim -- every dimension is drawn from 1 to max_dim
+            low -- smallest possible entry
+            high -- largest possible entry
+            dtype -- one of DTYPES, or AUTO_DTYPE
+            distribution -- one of DISTRIBUTIONS
+            density -- fraction of entries that are not zero, 1 for dense matrices
+        """
+        if dtype != AUTO_DTYPE and np.dtype(dtype).name not in DTYPES:
+            raise ValueError("dtype must be one of " + ", ".join(DTYPE_CHOICES))
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError("distribution must be one of " + ", ".join(DISTRIBUTIONS))
+        if not 0 <= density <= 1:
+            raise ValueError("density must be between 0 and 1")
+        if high < low:
+            raise ValueError("high must not be smaller than low")
+        self.max_dim = max_dim
+        self.low = low
+        self.high = high
+        self.dtype = dtype if dtype == AUTO_DTYPE else np.dtype(dtype).name
+        self.distribution = distribution
+        self.density = density
+
+    def make_matrix(self, rng: np.random.Generator, shape) -> np.ndarray:
+        """Returns one random matrix of the given shape"""
+        # AUTO_DTYPE draws the values as float64 does, then narrows them
+        dtype = np.dtype("float64" if self.dtype == AUTO_DTYPE else self.dtype)
+        if self.distribution == UNIFORM_INT:
+            low, high = self.low, self.high
+            if dtype.kind == "i":
+                info = np.iinfo(dtype)
+                low, high = max(low, info.min), min(high, info.max)
+                matrix = rng.integers(low, high, size=shape, dtype=dtype, endpoint=True)
+            else:
+                matrix = rng.integers(low, high, size=shape, endpoint=True).astype(dtype)
+        else:
+            float_dtype = dtype if dtype.kind == "f" else np.dtype("float64")
+            if self.distribution == UNIFORM:
+                matrix = rng.random(size=shape, dtype=float_dtype)
+                matrix *= self.high - self.low
+                matrix += self.low
+            else:
+                matrix = rng.standard_normal(size=shape, dtype=float_dtype)
+                matrix *= (self.high - self.low) / 6
+                matrix += (self.low + self.high) / 2
+            if dtype.kind == "i":
+                info = np.iinfo(dtype)
+                matrix = np.clip(np.rint(matrix), info.min, info.max).astype(dtype)
+        if self.density < 1:
+            matrix[rng.random(size=shape) >= self.density] = 0
+        if self.dtype == AUTO_DTYPE:
+            matrix = narrow(matrix)
+        return matrix
+
+    def make_matrices(self, rng: np.random.Generator) -> (np.ndarray, np.ndarray):
+        """Returns a random mxn matrix and a random nxk matrix"""
+        match_dim = int(rng.integers(1, self.max_dim + 1))
+        d1_size = int(rng.integers(1, self.max_dim + 1))
+        d2_size = int(rng.integers(1, self.max_dim + 1))
+        A = self.make_matrix(rng, (d1_size, match_dim))
+        B = self.make_matrix(rng, (match_dim, d2_size))
+        return A, B
+
+    def to_dict(self) -> dict:
+        return {
+            "max_dim": self.max_dim,
+            "low": self.low,
+            "high": self.high,
+            "dtype": self.dtype,
+            "distribution": self.distribution,
+            "density": self.density,
+        }
+
+    @classmethod
+    def from_dict(cls, spec: dict) -> "RandomMatrixSpec":
+        return cls(**spec)
+
+
+def new_seed() -> int:
+    """A fresh seed from the OS entropy pool, small enough to type back in"""
+    return int(np.random.SeedSequence().generate_state(1, dtype=np.uint64)[0] >> 1)
+
+
+def spawn_seeds(seed: int, count: int) -> List[int]:
+    """count independent seeds derived from seed, one per run of a batch"""
+    return [
+        int(child.generate_state(1, dtype=np.uint64)[0] >> 1)
+        for child in np.random.SeedSequence(seed).spawn(count)
+    ]
+
+
+class RunGenerator:
+    def __init__(self, spec: RandomMatrixSpec, seed: int):
+        """How the input matrices of a run were generated. Enough to generate them again
+        Args:
+            spec -- what was generated
+            seed -- seed of the numpy Generator
+        """
+        self.spec = spec
+        self.seed = int(seed)
+
+    def make_matrices(self) -> (np.ndarray, np.ndarray):
+        return self.spec.make_matrices(np.random.default_rng(self.seed))
+
+    def to_json(self) -> str:
+        return json.dumps({"seed": self.seed, "spec": self.spec.to_dict()})
+
+    @classmethod
+    def from_json(cls, text: str) -> "RunGenerator":
+        record = json.loads(text)
+        return cls(RandomMatrixSpec.from_dict(record["spec"]), record["seed"])
+
+    def __eq__(self, other):
+        return isinstance(other, RunGenerator) and self.to_json() == other.to_json()
+
+    def __str__(self):
+        return "seed " + str(self.seed) + " " + json.dumps(self.spec.to_dict())
+
+
+def regenerate_matrices(generator: RunGenerator, with_stats: bool) -> (
+    List[DisplayData],
+    List[DisplayData],
+):
+    """Rebuilds the matrices, and the stats when with_stats, of a run saved as its generator"""
+    A, B = generator.make_matrices()
+    C = multiply(A, B)
+    matrices = [DisplayData("A", A), DisplayData("B", B), DisplayData("C", C)]
+    stats = calculate_stats(C) if with_stats else []
+    return matrices, stats
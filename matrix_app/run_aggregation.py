@@ -0,0 +1,200 @@
+"""
+small_matrix_app.matrix_app.run_aggregation.py
+Statistics across many saved runs, see DatabaseModel.aggregate_runs.
+The element-wise mean, min and max of C are taken over the runs whose C has the same shape. Each run is read
+a block of rows at a time, on a thread pool, and folded into running sums, mins and maxes, so only those
+and one block per worker are ever in memory however many runs there are.
+The distributions of the single value stats (min, mean and max of C) come straight from the run index.
+No Qt dependency.
+"""
+
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from matrix_app.all_exceptions import InternalDbError
+from matrix_app.blocked_multiply import DEFAULT_MEMORY_LIMIT
+from matrix_app.sparse_matrices import to_dense
+
+
+class ElementwiseAggregate:
+    def __init__(self, shape: Tuple[int, int], dtype):
+        """
+        Running element-wise sum, min and max of matrices of one shape
+        Args:
+            shape -- shape of the matrices
+            dtype -- dtype every matrix can be cast to without loss, kept by the min and max
+        """
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.run_names = []
+        self.sum = np.zeros(self.shape, dtype=np.float64)
+        if self.dtype.kind in "iu":
+            info = np.iinfo(self.dtype)
+            low, high = info.min, info.max
+        else:
+            low, high = -np.inf, np.inf
+        self.min = np.full(self.shape, high, dtype=self.dtype)
+        self.max = np.full(self.shape, low, dtype=self.dtype)
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        return len(self.run_names)
+
+    def add_block(self, r0: int, block: np.ndarray):
+        """Folds in rows r0 to r0 + len(block) of one matrix. Safe to call from several threads"""
+        rows = slice(r0, r0 + block.shape[0])
+        with self._lock:
+            self.sum[rows] += block
+            np.minimum(self.min[rows], block, out=self.min[rows])
+            np.maximum(self.max[rows], block, out=self.max[rows])
+
+    def add_run(self, run_name: str):
+        """Counts a matrix once all its rows were added"""
+        with self._lock:
+            self.run_names.append(run_name)
+
+    def mean(self) -> np.ndarray:
+        return self.sum / max(1, self.count)
+
+
+class ScalarDistribution:
+    # Order of summary() and of the columns of the comparison view
+    SUMMARY = ("runs", "mean", "std", "min", "25%", "median", "75%", "max")
+
+    def __init__(self, label: str, run_names: List[str], values: List[float]):
+        """Values of one single value stat across runs
+        Args:
+            label -- label of the stat
+            run_names -- runs that have the stat
+            values -- its value in each of those runs
+        """
+        self.label = label
+        self.run_names = list(run_names)
+        self.values = np.asarray(values, dtype=np.float64)
+
+    def summary(self) -> List[float]:
+        """Count, mean, standard deviation, min, quartiles and max, in the order of SUMMARY"""
+        v = self.values
+        if v.size == 0:
+            return [0] + [np.nan] * (len(self.SUMMARY) - 1)
+        q1, median, q3 = np.percentile(v, [25, 50, 75])
+        return [v.size, v.mean(), v.std(), v.min(), q1, median, q3, v.max()]
+
+    def histogram(self, bins: int = 10) -> (np.ndarray, np.ndarray):
+        """Counts and bin edges, as np.histogram"""
+        return np.histogram(self.values[np.isfinite(self.values)], bins=bins)
+
+
+class RunAggregate:
+    def __init__(self):
+        """Result of DatabaseModel.aggregate_runs"""
+        self.label = "C"
+        self.groups = {}  # type: Dict[Tuple[int, ...], ElementwiseAggregate]
+        self.scalars = {}  # type: Dict[str, ScalarDistribution]
+        self.skipped = {}  # type: Dict[str, str]  # run name -> why it was left out
+
+
+def aggregate_runs(
+    db,
+    run_names: List[str],
+    label: str = "C",
+    workers: int = 4,
+    memory_limit: int = DEFAULT_MEMORY_LIMIT,
+    progress: Callable = None,
+) -> RunAggregate:
+    """See DatabaseModel.aggregate_runs"""
+    aggregate = RunAggregate()
+    aggregate.label = label
+    shapes = {}
+    dtypes = {}
+    scalars = {}
+    for name in run_names:
+        try:
+            entry = db.run_summary(name)
+        except Exception as e:
+            aggregate.skipped[name] = str(e)
+            continue
+        for stat, value in entry.scalars.items():
+            scalars.setdefault(stat, ([], []))
+            scalars[stat][0].append(name)
+            scalars[stat][1].append(value)
+        shape = tuple(entry.shapes.get(label, ()))
+        if len(shape) != 2:
+            aggregate.skipped[name] = "no matrix " + label
+            continue
+        shapes[name] = shape
+        dtypes.setdefault(shape, []).append(np.dtype(entry.dtypes[label]))
+
+    aggregate.scalars = {
+        stat: ScalarDistribution(stat, names, values)
+        for stat, (names, values) in scalars.items()
+    }
+    for shape, group_dtypes in dtypes.items():
+        aggregate.groups[shape] = ElementwiseAggregate(
+            shape, np.result_type(*group_dtypes)
+        )
+    if not shapes:
+        return aggregate
+
+    workers = max(1, min(workers, len(shapes)))
+    # Every worker holds one block of rows at a time
+    block_bytes = max(1, memory_limit // workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                _fold_run, db, name, label, aggregate.groups[shape], block_bytes
+            ): name
+            for name, shape in shapes.items()
+        }
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                name = futures[future]
+                try:
+                    future.result()
+                except _PartlyFolded as e:
+                    raise InternalDbError(str(e))
+                except Exception as e:
+                    aggregate.skipped[name] = str(e)
+                if progress is not None:
+                    progress(done, len(futures))
+        except BaseException:
+            # Stopped by progress: runs that did not start are dropped
+            for future in futures:
+                future.cancel()
+            raise
+    # Groups whose every run failed
+    for shape in [s for s, g in aggregate.groups.items() if g.count == 0]:
+        del aggregate.groups[shape]
+    return aggregate
+
+
+class _PartlyFolded(Exception):
+    """Part of a run is already in the sums, mins and maxes, which are now wrong"""
+
+
+def _fold_run(
+    db, run_name: str, label: str, group: ElementwiseAggregate, block_bytes: int
+):
+    with db.open_run_matrix(run_name, label) as matrix:
+        if tuple(matrix.shape) != group.shape:
+            raise ValueError(
+                "shape " + str(tuple(matrix.shape)) + " does not match the run index"
+            )
+        m, n = group.shape
+        rows = int(max(1, block_bytes // max(1, n * matrix.dtype.itemsize)))
+        for r0 in range(0, m, rows):
+            try:
+                block = to_dense(matrix[r0 : r0 + rows])
+            except Exception as e:
+                if r0 == 0:
+                    raise
+                raise _PartlyFolded(
+                    "ERROR: Could not read all of " + run_name + ": " + str(e)
+                )
+            group.add_block(r0, block)
+    group.add_run(run_name)
@@ -0,0 +1,88 @@
+"""
+small_matrix_app.matrix_app.run_cache.py
+Read-through cache of loaded runs for the DatabaseModel.
+Entries (RunData) are keyed by run name and run file modification time and evicted least recently used first
+once the cached matrices and stats go over a byte budget.
+Safe to use from several threads, such as the loads of DatabaseModel.load_runs and the RunPrefetcher.
+"""
+
+import threading
+
+from collections import OrderedDict
+
+from matrix_app.sparse_matrices import nbytes
+
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+
+
+def run_nbytes(run_data) -> int:
+    """Bytes held by the matrices and stats of a run"""
+    return sum(nbytes(d.data) for d in (run_data.matrices or []) + (run_data.stats or []))
+
+
+class RunCache:
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        """
+        Args:
+            max_bytes -- budget for the matrices and stats of every cached run. 0 disables the cache
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # run name -> (mtime, nbytes, RunData)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, run_name: str):
+        return run_name in self._entries
+
+    def get(self, run_name: str, mtime):
+        """Returns the cached run, or None if it is not cached or its file changed since it was cached"""
+        with self._lock:
+            entry = self._entries.get(run_name)
+            if entry is None or entry[0] != mtime:
+                if entry is not None:
+                    self.invalidate(run_name)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(run_name)
+            self.hits += 1
+            return entry[2]
+
+    def peek(self, run_name: str, mtime) -> bool:
+        """Whether the run is cached and unchanged, without counting a lookup or refreshing its place"""
+        with self._lock:
+            entry = self._entries.get(run_name)
+            return entry is not None and entry[0] == mtime
+
+    def put(self, run_name: str, mtime, run_data):
+        """Caches a run, evicting the least recently used runs to stay within max_bytes.
+        Runs larger than the whole budget are not cached"""
+        nbytes = run_nbytes(run_data)
+        with self._lock:
+            self.invalidate(run_name)
+            if nbytes > self.max_bytes:
+                return
+            self._entries[run_name] = (mtime, nbytes, run_data)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_bytes, _) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+
+    def invalidate(self, run_name: str):
+        with self._lock:
+            entry = self._entries.pop(run_name, None)
+            if entry is not None:
+                self.current_bytes -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
@@ -0,0 +1,367 @@
+"""
+small_matrix_app.matrix_app.run_index.py
+Persistent catalog of the saved runs, kept in an SQLite file inside the database directory.
+It records where each run is saved and what it holds, so the DatabaseModel does not have to scan
+the directory on startup or probe for files on every load and save.
+The index can always be rebuilt from the run files:
+    python -m matrix_app.run_index SavedRuns
+    python -m matrix_app.run_index --single-file SavedRuns
+"""
+
+import functools
+import json
+import sqlite3
+import sys
+import threading
+import time
+
+from os import path
+from typing import Callable, Dict, List, Tuple
+
+
+class RunIndexEntry:
+    def __init__(
+        self,
+        run_name: str,
+        file_name: str,
+        has_stats: bool,
+        shapes: Dict[str, Tuple[int, ...]] = None,
+        dtypes: Dict[str, str] = None,
+        random: str = "",
+        created: float = None,
+        modified: float = None,
+        nbytes: int = 0,
+        scalars: Dict[str, float] = None,
+    ):
+        """
+        Everything the index knows about one saved run
+        Args:
+        run_name -- name of the run
+        file_name -- where the run is stored, relative to the database directory: its file,
+            or its group for a single file store (see run_stores.py)
+        has_stats -- whether stats were saved with the run
+        shapes -- shape of every matrix and stat, by label
+        dtypes -- dtype of every matrix and stat, by label
+        random -- id of the run, as in RunData
+        created -- time the run was first saved
+        modified -- time the run was last saved
+        nbytes -- bytes the datasets of the run take up in the store
+        scalars -- single value stats of C, such as its min, mean and max, by label
+        """
+        now = time.time()
+        self.run_name = run_name
+        self.file_name = file_name
+        self.has_stats = has_stats
+        self.shapes = shapes or {}
+        self.dtypes = dtypes or {}
+        self.random = random
+        self.created = now if created is None else created
+        self.modified = self.created if modified is None else modified
+        self.nbytes = nbytes
+        self.scalars = scalars or {}
+
+
+def _locked(method):
+    """Runs method holding the index's lock, since every thread shares the one connection"""
+
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return locked
+
+
+class RunIndex:
+    FILE_NAME = ".run_index.sqlite"
+    # Bump when the schema changes. An index with a different version is rebuilt from the run files
+    SCHEMA_VERSION = 3
+    # Orders the SavedRunsPage can list the runs in, by the columns of their sort key.
+    # The run name comes last in every key so rows with equal keys keep a stable order
+    SORT_KEYS = {
+        "name": ("run_name COLLATE NOCASE",),
+        "created": ("created",),
+        "shape": ("c_rows", "c_cols"),
+    }
+
+    _COLUMNS = (
+        "run_name, file_name, has_stats, shapes, dtypes, random, created, modified, "
+        "nbytes, scalars"
+    )
+
+    def __init__(self, db_dir: str):
+        """Opens (or creates) the index of the runs saved in db_dir"""
+        self.db_dir = db_dir
+        self.index_file = path.join(db_dir, self.FILE_NAME)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            self.index_file, timeout=30, check_same_thread=False
+        )
+        with self._conn:
+            # Other processes sharing the directory may be opening the index at the same time:
+            # exactly one of them creates the table, and it is the one that rebuilds it
+            self._conn.execute("BEGIN IMMEDIATE")
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            self.needs_rebuild = version != self.SCHEMA_VERSION
+            if self.needs_rebuild:
+                self._conn.execute("DROP TABLE IF EXISTS runs")
+                self._conn.execute(
+                    "CREATE TABLE runs ("
+                    "run_name TEXT PRIMARY KEY, "
+                    "file_name TEXT NOT NULL, "
+                    "has_stats INTEGER NOT NULL, "
+                    "shapes TEXT NOT NULL, "
+                    "dtypes TEXT NOT NULL, "
+                    "random TEXT NOT NULL, "
+                    "created REAL NOT NULL, "
+                    "modified REAL NOT NULL, "
+                    "nbytes INTEGER NOT NULL, "
+                    "scalars TEXT NOT NULL, "
+                    "c_rows INTEGER NOT NULL, "
+                    "c_cols INTEGER NOT NULL)"
+                )
+                # One index per sort order, so a page of runs is read without sorting the whole table
+                self._conn.execute(
+                    "CREATE INDEX runs_by_name ON runs (run_name COLLATE NOCASE, run_name)"
+                )
+                self._conn.execute(
+                    "CREATE INDEX runs_by_created ON runs (created, run_name)"
+                )
+                self._conn.execute(
+                    "CREATE INDEX runs_by_shape ON runs (c_rows, c_cols, run_name)"
+                )
+                self._conn.execute("PRAGMA user_version = " + str(self.SCHEMA_VERSION))
+
+    @_locked
+    def close(self):
+        self._conn.close()
+
+    @_locked
+    def record(self, entry: RunIndexEntry):
+        """Adds or replaces the entry of a run in one transaction"""
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO runs (" + self._COLUMNS + ", c_rows, c_cols) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self._to_row(entry),
+            )
+
+    @_locked
+    def record_new(self, entries: List[RunIndexEntry], conflict: Callable) -> List[str]:
+        """Adds the entries of newly saved runs in one transaction, which holds the index's write lock
+        from its first read so no other process records one of the runs in between.
+        A run that is already in the index keeps its creation time.
+        Args:
+        entries -- entries of the new runs
+        conflict -- conflict(existing entry, new entry) returns why the new entry cannot replace the
+            existing one, or None if it can
+        Returns the reason each entry was rejected, None for every recorded entry
+        """
+        reasons = []
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            for entry in entries:
+                row = self._conn.execute(
+                    "SELECT " + self._COLUMNS + " FROM runs WHERE run_name = ?",
+                    (entry.run_name,),
+                ).fetchone()
+                reason = None
+                if row is not None:
+                    existing = self._from_row(row)
+                    reason = conflict(existing, entry)
+                    entry.created = existing.created
+                if reason is None:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO runs (" + self._COLUMNS + ", c_rows, c_cols) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        self._to_row(entry),
+                    )
+                reasons.append(reason)
+        return reasons
+
+    @_locked
+    def remove(self, run_name: str):
+        with self._conn:
+            self._conn.execute("DELETE FROM runs WHERE run_name = ?", (run_name,))
+
+    @_locked
+    def get(self, run_name: str) -> RunIndexEntry:
+        """Returns the entry of a run, or None if the run is not in the index"""
+        row = self._conn.execute(
+            "SELECT " + self._COLUMNS + " FROM runs WHERE run_name = ?", (run_name,)
+        ).fetchone()
+        if row is None:
+            return None
+        return self._from_row(row)
+
+    @_locked
+    def entries(self) -> List[RunIndexEntry]:
+        rows = self._conn.execute(
+            "SELECT " + self._COLUMNS + " FROM runs ORDER BY created"
+        ).fetchall()
+        return [self._from_row(r) for r in rows]
+
+    @_locked
+    def page(
+        self,
+        sort: str = "name",
+        descending: bool = False,
+        contains: str = "",
+        after: RunIndexEntry = None,
+        limit: int = 200,
+    ) -> List[RunIndexEntry]:
+        """Returns the next runs in a sort order, reading only as many rows as asked for
+        Args:
+        sort -- one of SORT_KEYS
+        descending -- reverses the order
+        contains -- only runs whose name contains this text, ignoring case
+        after -- last entry of the previous page, None for the first page
+        limit -- largest number of entries returned
+        """
+        key = self._sort_key(sort)
+        where, params = self._contains_clause(contains)
+        if after is not None:
+            # Seeks to the last entry through the index of the sort order, however far down it is
+            where.append(self._compare(key, "<" if descending else ">"))
+            params.extend(self._key_values(sort, after))
+        query = "SELECT " + self._COLUMNS + " FROM runs" + self._where(where)
+        query += " ORDER BY " + self._order_by(key, descending) + " LIMIT ?"
+        rows = self._conn.execute(query, params + [limit]).fetchall()
+        return [self._from_row(r) for r in rows]
+
+    @_locked
+    def position(
+        self, prefix: str, sort: str = "name", descending: bool = False, contains: str = ""
+    ) -> int:
+        """Row, in the order given as for page, of the first run whose name starts with prefix.
+        -1 if there is none
+        """
+        key = self._sort_key(sort)
+        where, params = self._contains_clause(contains)
+        query = "SELECT " + self._COLUMNS + " FROM runs"
+        query += self._where(where + ["run_name LIKE ? ESCAPE '\\'"])
+        query += " ORDER BY " + self._order_by(key, descending) + " LIMIT 1"
+        row = self._conn.execute(query, params + [_escape_like(prefix) + "%"]).fetchone()
+        if row is None:
+            return -1
+        # Its row is the number of runs that come before it
+        where.append(self._compare(key, ">" if descending else "<"))
+        params.extend(self._key_values(sort, self._from_row(row)))
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM runs" + self._where(where), params
+        ).fetchone()[0]
+
+    def _sort_key(self, sort: str) -> tuple:
+        if sort not in self.SORT_KEYS:
+            raise ValueError("sort must be one of " + ", ".join(self.SORT_KEYS))
+        return self.SORT_KEYS[sort] + ("run_name",)
+
+    @staticmethod
+    def _key_values(sort: str, entry: RunIndexEntry) -> list:
+        if sort == "name":
+            return [entry.run_name, entry.run_name]
+        if sort == "created":
+            return [entry.created, entry.run_name]
+        return list(_product_shape(entry)) + [entry.run_name]
+
+    @staticmethod
+    def _contains_clause(contains: str) -> (list, list):
+        if not contains:
+            return [], []
+        return ["run_name LIKE ? ESCAPE '\\'"], ["%" + _escape_like(contains) + "%"]
+
+    @staticmethod
+    def _compare(key: tuple, operator: str) -> str:
+        return "(" + ", ".join(key) + ") " + operator + " (" + ", ".join("?" * len(key)) + ")"
+
+    @staticmethod
+    def _where(conditions: list) -> str:
+        return " WHERE " + " AND ".join(conditions) if conditions else ""
+
+    @staticmethod
+    def _order_by(key: tuple, descending: bool) -> str:
+        return ", ".join(k + (" DESC" if descending else "") for k in key)
+
+    @_locked
+    def replace_all(self, entries: List[RunIndexEntry], since: float = None):
+        """Replaces the whole index in one transaction and marks it as up to date
+        Args:
+        entries -- entries of every run
+        since -- when entries were collected. Runs recorded after that, e.g. by other processes, are kept
+        """
+        with self._conn:
+            if since is None:
+                self._conn.execute("DELETE FROM runs")
+            else:
+                self._conn.execute("DELETE FROM runs WHERE modified < ?", (since,))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO runs (" + self._COLUMNS + ", c_rows, c_cols) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [self._to_row(e) for e in entries],
+            )
+            self._conn.execute("PRAGMA user_version = " + str(self.SCHEMA_VERSION))
+        self.needs_rebuild = False
+
+    @staticmethod
+    def _to_row(entry: RunIndexEntry) -> tuple:
+        return (
+            entry.run_name,
+            entry.file_name,
+            int(entry.has_stats),
+            json.dumps({k: list(v) for k, v in entry.shapes.items()}),
+            json.dumps(entry.dtypes),
+            entry.random,
+            entry.created,
+            entry.modified,
+            entry.nbytes,
+            json.dumps(entry.scalars),
+        ) + _product_shape(entry)
+
+    @staticmethod
+    def _from_row(row: tuple) -> RunIndexEntry:
+        return RunIndexEntry(
+            run_name=row[0],
+            file_name=row[1],
+            has_stats=bool(row[2]),
+            shapes={k: tuple(v) for k, v in json.loads(row[3]).items()},
+            dtypes=json.loads(row[4]),
+            random=row[5],
+            created=row[6],
+            modified=row[7],
+            nbytes=row[8],
+            scalars=json.loads(row[9]),
+        )
+
+
+def _product_shape(entry: RunIndexEntry) -> (int, int):
+    """Shape of C, which the runs are sorted by. (0, 0) when it is not known"""
+    shape = tuple(entry.shapes.get("C", ()))
+    if len(shape) != 2:
+        return 0, 0
+    return int(shape[0]), int(shape[1])
+
+
+def _escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def main():
+    args = sys.argv[1:]
+    single_file = "--single-file" in args
+    if single_file:
+        args.remove("--single-file")
+    if len(args) != 1:
+        print("usage: python -m matrix_app.run_index [--single-file] <database directory>")
+        sys.exit(2)
+    from matrix_app.db_widget import DatabaseModel
+    from matrix_app.run_stores import PerFileRunStore, SingleFileRunStore
+
+    backend = SingleFileRunStore if single_file else PerFileRunStore
+    db = DatabaseModel(args[0], backend=backend)
+    count = db.rebuild_index()
+    db.close()
+    print("Indexed " + str(count) + " runs in " + args[0])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""
+small_matrix_app.matrix_app.run_stores.py
+Backends that decide where the DatabaseModel keeps the HDF5 data of each run.
+A run is stored as a group holding a "matrices" and a "stats" group. Each backend hands the
+DatabaseModel that group for a run's location, which is what the run index records as file_name.
+    PerFileRunStore -- one .h5 file per run in the database directory (the original layout)
+    SingleFileRunStore -- every run is a group in one container file that stays open for the process lifetime
+A run is written under a temporary name and only moved to its location once it is complete, so readers,
+other processes and a crash never see half of a run. The move never replaces a run another writer saved
+at the same location meanwhile: write raises FileExistsError instead.
+"""
+
+import errno
+import os
+import time
+import uuid
+
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from os import listdir, path
+from os.path import isfile, join
+from typing import Callable, List, Tuple
+
+import h5py
+import numpy as np
+
+from matrix_app.sparse_matrices import is_sparse_group, read_matrix
+
+# Suffix of the runs saved without stats
+NO_STATS_RUN = "-No_Stats_Run"
+# Suffix of the runs being written. Temporary names also start with a dot, so scans skip them
+TEMP_SUFFIX = ".tmp"
+
+
+def _memmap_offset(dataset):
+    """Byte offset of dataset in its file when it can be memory mapped, otherwise None"""
+    if is_sparse_group(dataset):
+        return None
+    if (
+        dataset.chunks is None
+        and dataset.compression is None
+        and dataset.shape != ()
+        and dataset.size > 0
+        and not dataset.dtype.hasobject
+    ):
+        return dataset.id.get_offset()
+    return None
+
+
+class RunStore(ABC):
+    """Interface of the run backends. A location names where one run is stored,
+    relative to the database directory"""
+
+    def __init__(self, db_dir: str):
+        self.db_dir = db_dir
+
+    def close(self):
+        pass
+
+    def has_stats(self, location: str) -> bool:
+        return NO_STATS_RUN not in location
+
+    @abstractmethod
+    def new_location(self, run_name: str, has_stats: bool) -> str:
+        """Location of the run, with or without stats"""
+
+    def probe(self, run_name: str) -> str:
+        """Location of a run missing from the index, or None. The fullest version of the run wins"""
+        for has_stats in (True, False):
+            location = self.new_location(run_name, has_stats)
+            if self.exists(location):
+                return location
+        return None
+
+    @abstractmethod
+    def exists(self, location: str) -> bool:
+        """Whether a run is stored at location"""
+
+    @abstractmethod
+    def scan(self) -> List[Tuple[str, str, float]]:
+        """(run name, location, modification time) of every stored run, for rebuilding the index"""
+
+    @abstractmethod
+    def version(self, location: str) -> int:
+        """Changes whenever the run at location is rewritten. Keys the run cache"""
+
+    @contextmanager
+    @abstractmethod
+    def read(self, location: str):
+        """Yields the group of the run at location"""
+
+    @contextmanager
+    @abstractmethod
+    def write(self, location: str):
+        """Yields a new, empty group for the run at location. The run only shows up at location once the
+        block exits without error, and nothing is left behind if writing fails.
+        Raises FileExistsError if another writer saved a run at location in the meantime
+        """
+
+    @abstractmethod
+    def remove(self, location: str):
+        """Deletes the run at location. Raises OSError or KeyError when there is none"""
+
+    def sync(self):
+        """Makes the runs written so far survive a crash of the machine. Called once per batch of saves"""
+
+    def clean_up(self) -> int:
+        """Removes what writers that crashed left behind. Returns the number of removed leftovers"""
+        return 0
+
+    def finish_write(self, run_name: str, location: str):
+        """A run saved with stats replaces the same run saved without them"""
+        if self.has_stats(location):
+            no_stats = self.new_location(run_name, False)
+            try:
+                self.remove(no_stats)
+            except (OSError, KeyError):
+                # Never saved, or already removed by another writer
+                pass
+
+    @abstractmethod
+    def dataset_loader(self, location: str, dataset) -> Callable:
+        """Returns a function that loads dataset of the run at location: a memory map when the dataset
+        is stored contiguously and uncompressed, otherwise a full read of the dataset.
+        A sparse matrix, saved as a group, is read whole"""
+
+    @staticmethod
+    def _run_name(name: str) -> str:
+        return name.split(".")[0].split("-")[0]
+
+
+class PerFileRunStore(RunStore):
+    """One .h5 file per run. Locations are file names in the database directory.
+    A run is written to a hidden temporary file, synced to disk and then hard linked to its file name.
+    Linking fails when the name exists, so of several processes saving the same run exactly one wins,
+    without any lock. Temporary files older than STALE_TEMP_SECONDS are from writers that crashed
+    """
+
+    STALE_TEMP_SECONDS = 3600
+
+    def _path(self, location: str) -> str:
+        return join(self.db_dir, location)
+
+    def new_location(self, run_name: str, has_stats: bool) -> str:
+        if has_stats:
+            return run_name + ".h5"
+        return run_name + NO_STATS_RUN + ".h5"
+
+    def exists(self, location: str) -> bool:
+        return path.exists(self._path(location))
+
+    def scan(self) -> List[Tuple[str, str, float]]:
+        return [
+            (self._run_name(f), f, path.getmtime(self._path(f)))
+            for f in listdir(self.db_dir)
+            if isfile(self._path(f)) and f.endswith(".h5")
+        ]
+
+    def version(self, location: str) -> int:
+        return os.stat(self._path(location)).st_mtime_ns
+
+    @contextmanager
+    def read(self, location: str):
+        with h5py.File(self._path(location), "r") as hdf:
+            yield hdf
+
+    @contextmanager
+    def write(self, location: str):
+        temp_file = self._path("." + location + "." + uuid.uuid4().hex + TEMP_SUFFIX)
+        try:
+            with h5py.File(temp_file, "w") as hdf:
+                yield hdf
+            _fsync_file(temp_file)
+            self._publish(temp_file, self._path(location))
+        finally:
+            if path.exists(temp_file):
+                os.remove(temp_file)
+
+    @staticmethod
+    def _publish(temp_file: str, run_file: str):
+        try:
+            # Atomic and never replaces an existing file
+            os.link(temp_file, run_file)
+        except FileExistsError:
+            raise FileExistsError(errno.EEXIST, "Another writer saved this run", run_file)
+        except (OSError, AttributeError):
+            # File systems without hard links: the check and the rename can race with another writer
+            if path.exists(run_file):
+                raise FileExistsError(errno.EEXIST, "Another writer saved this run", run_file)
+            os.replace(temp_file, run_file)
+
+    def remove(self, location: str):
+        os.remove(self._path(location))
+
+    def sync(self):
+        # The new directory entries, since each file was synced before it was linked
+        if os.name != "posix":
+            return
+        fd = os.open(self.db_dir, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def clean_up(self) -> int:
+        # Recent temporary files may belong to writers in other processes
+        stale = time.time() - self.STALE_TEMP_SECONDS
+        removed = 0
+        for f in listdir(self.db_dir):
+            if f.startswith(".") and f.endswith(TEMP_SUFFIX):
+                try:
+                    if path.getmtime(self._path(f)) < stale:
+                        os.remove(self._path(f))
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def dataset_loader(self, location: str, dataset) -> Callable:
+        run_file = self._path(location)
+        offset = _memmap_offset(dataset)
+        name = dataset.name
+        shape = getattr(dataset, "shape", None)
+        dtype = getattr(dataset, "dtype", None)
+
+        def load():
+            if offset is not None:
+                return np.memmap(
+                    run_file, mode="r", dtype=dtype, offset=offset, shape=shape
+                )
+            with h5py.File(run_file, "r") as hdf:
+                return read_matrix(hdf[name])
+
+        return load
+
+
+class SingleFileRunStore(RunStore):
+    """Every run is a group under /runs in one container file, opened once and kept open until close().
+    Saves and loads then cost no file opens or directory updates.
+    HDF5 does not give back the space of removed runs; `h5repack` compacts the container.
+    Only one process can have the container open for writing.
+    A run is written to a hidden group and moved to its location when complete. HDF5 itself is not
+    crash safe, so a crash while the container is open can still damage it
+    """
+
+    FILE_NAME = "runs.h5"
+    RUNS_GROUP = "runs"
+    VERSION_ATTR = "saved_ns"
+
+    def __init__(self, db_dir: str):
+        super().__init__(db_dir)
+        self.container_file = join(db_dir, self.FILE_NAME)
+        self._hdf = h5py.File(self.container_file, "a")
+        self._runs = self._hdf.require_group(self.RUNS_GROUP)
+        # Only this process has the container open for writing, so every hidden group is a leftover
+        self.clean_up()
+
+    def close(self):
+        if self._hdf:
+            self._hdf.close()
+
+    def new_location(self, run_name: str, has_stats: bool) -> str:
+        if has_stats:
+            return self.RUNS_GROUP + "/" + run_name
+        return self.RUNS_GROUP + "/" + run_name + NO_STATS_RUN
+
+    def exists(self, location: str) -> bool:
+        return location in self._hdf
+
+    def scan(self) -> List[Tuple[str, str, float]]:
+        return [
+            (
+                self._run_name(name),
+                self.RUNS_GROUP + "/" + name,
+                group.attrs.get(self.VERSION_ATTR, 0) / 1e9,
+            )
+            for name, group in self._runs.items()
+            if not name.startswith(".")
+        ]
+
+    def version(self, location: str) -> int:
+        if location not in self._hdf:
+            raise OSError("No run stored at " + location)
+        return int(self._hdf[location].attrs.get(self.VERSION_ATTR, 0))
+
+    @contextmanager
+    def read(self, location: str):
+        yield self._hdf[location]
+
+    @contextmanager
+    def write(self, location: str):
+        temp = self.RUNS_GROUP + "/." + uuid.uuid4().hex + TEMP_SUFFIX
+        group = self._hdf.create_group(temp)
+        try:
+            yield group
+            group.attrs[self.VERSION_ATTR] = time.time_ns()
+            if location in self._hdf:
+                raise FileExistsError(errno.EEXIST, "Another writer saved this run", location)
+            self._hdf.move(temp, location)
+            # Memory maps of the container only see data that was flushed
+            self._hdf.flush()
+        finally:
+            if temp in self._hdf:
+                del self._hdf[temp]
+
+    def remove(self, location: str):
+        del self._hdf[location]
+        self._hdf.flush()
+
+    def sync(self):
+        self._hdf.flush()
+        _fsync_file(self.container_file)
+
+    def clean_up(self) -> int:
+        leftovers = [name for name in self._runs if name.startswith(".")]
+        for name in leftovers:
+            del self._runs[name]
+        if leftovers:
+            self._hdf.flush()
+        return len(leftovers)
+
+    def dataset_loader(self, location: str, dataset) -> Callable:
+        offset = _memmap_offset(dataset)
+        name = dataset.name
+        shape = getattr(dataset, "shape", None)
+        dtype = getattr(dataset, "dtype", None)
+        container_file = self.container_file
+        hdf = self._hdf
+
+        def load():
+            if offset is not None:
+                return np.memmap(
+                    container_file, mode="r", dtype=dtype, offset=offset, shape=shape
+                )
+            return read_matrix(hdf[name])
+
+        return load
+
+
+def _fsync_file(file_name: str):
+    with open(file_name, "rb+") as f:
+        os.fsync(f.fileno())
@@ -0,0 +1,62 @@
+"""
+small_matrix_app.matrix_app.run_text.py
+Plain text for saved runs and single matrix entries, shared by the pages of the app and the command line (cli.py).
+Neither Qt nor numpy is imported, so the command line can list runs without loading them.
+"""
+
+import time
+
+from matrix_app.run_index import RunIndexEntry
+
+
+def format_value(value) -> str:
+    """Formats a single matrix entry for display"""
+    dtype = getattr(value, "dtype", None)
+    if dtype is not None and dtype.names == ("sign", "log10"):
+        # A cumulative product kept as sign and log10 magnitude, see log_cumprod.py
+        if value["sign"] == 0:
+            return "0"
+        sign = "-" if value["sign"] < 0 else ""
+        return sign + "10^" + "{:.6g}".format(value["log10"])
+    # numpy scalars as the Python number they hold
+    value = value.item() if dtype is not None else value
+    if isinstance(value, float):
+        if value.is_integer() and abs(value) < 2 ** 53:
+            return str(int(value))
+        return "{:.6g}".format(value)
+    return str(value)
+
+
+def format_bytes(nbytes: int) -> str:
+    for unit in ("bytes", "KB", "MB", "GB"):
+        if nbytes < 1024 or unit == "GB":
+            return (str(nbytes) if unit == "bytes" else "{:.1f}".format(nbytes)) + " " + unit
+        nbytes /= 1024
+
+
+def format_time(seconds: float) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(seconds))
+
+
+def summary_text(entry: RunIndexEntry) -> str:
+    """What the preview pane of the saved runs page, and the list command, show of a run"""
+    lines = [entry.run_name, "Saved: " + format_time(entry.created)]
+    if entry.modified != entry.created:
+        lines.append("Modified: " + format_time(entry.modified))
+    lines.append("Stats saved: " + ("yes" if entry.has_stats else "no"))
+    lines.append("Size on disk: " + format_bytes(entry.nbytes))
+    lines.append("")
+    for label, shape in entry.shapes.items():
+        if len(shape) == 2:
+            lines.append(
+                label
+                + ": "
+                + " x ".join(str(d) for d in shape)
+                + " "
+                + entry.dtypes.get(label, "")
+            )
+    if entry.scalars:
+        lines.append("")
+    for label, value in entry.scalars.items():
+        lines.append(label + ": " + format_value(value))
+    return "\n".join(lines)
@@ -3,59 +3,307 @@ small_matrix_app.matrix_app.saved_runs_widget.py
 Saved Runs Widget displays the names of all previous saved runs
 in a list to the user can click on the run he/she wants
 to see the stats from.
+The list is a view on the run index: rows are read a page at a time as the user scrolls,
+and filtering, sorting and typeahead search are queries on the index, so the page opens
+in the same time for ten runs or a hundred thousand.
+The preview pane shows what the index knows about the current run, so no run is read to preview it.
+The page is built once by the main window. When it is shown again the runs are read again from the
+index, keeping the filter, the sort and the current run.
 """
 
+import time
+
+from PyQt5 import QtCore
+from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import (
     QApplication,
-    QWidget,
-    QScrollArea,
     QVBoxLayout,
-    QGroupBox,
+    QHBoxLayout,
     QLabel,
+    QLineEdit,
     QPushButton,
-    QFormLayout,
+    QTableView,
+    QHeaderView,
+    QAbstractItemView,
+    QSplitter,
 )
 
 from typing import Callable, List
 
+from matrix_app.page_stack import Page
+from matrix_app.run_index import RunIndexEntry
+from matrix_app.run_text import summary_text
+
+
+class SavedRunsModel(QtCore.QAbstractTableModel):
+    # Rows read from the run index per fetchMore
+    BATCH = 200
+    COLUMNS = ("Name", "Saved", "Shape of C")
+    SORTS = ("name", "created", "shape")  # sort order of each column, see RunIndex.SORT_KEYS
+
+    def __init__(self, db, batch: int = BATCH):
+        """Lists the runs of a DatabaseModel, reading them from its run index as they are needed
+        Args:
+        db -- DatabaseModel whose runs are listed
+        batch -- rows read per fetch
+        """
+        super().__init__()
+        self.db = db
+        self.batch = batch
+        self.sort_by = "name"
+        self.descending = False
+        self.contains = ""
+        self._entries = []
+        self._has_more = True
+        self._fetch()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._entries)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        entry = self._entries[index.row()]
+        column = index.column()
+        if column == 0:
+            return entry.run_name
+        if column == 1:
+            return time.strftime("%Y-%m-%d %H:%M", time.localtime(entry.created))
+        shape = entry.shapes.get("C")
+        return "" if shape is None else " x ".join(str(d) for d in shape)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return not parent.isValid() and self._has_more
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return
+        self._fetch()
+
+    def _fetch(self, at_least: int = 0):
+        """Reads the next batch of runs, or enough batches to have at_least rows"""
+        wanted = max(self.batch, at_least - len(self._entries))
+        page = self.db.query_runs(
+            self.sort_by,
+            self.descending,
+            self.contains,
+            after=self._entries[-1] if self._entries else None,
+            limit=wanted + 1,
+        )
+        # One row more than wanted says whether there is anything left to fetch
+        self._has_more = len(page) > wanted
+        page = page[:wanted]
+        if not page:
+            return
+        first = len(self._entries)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(page) - 1)
+        self._entries.extend(page)
+        self.endInsertRows()
+
+    def _reset(self):
+        self.beginResetModel()
+        self._entries = []
+        self._has_more = True
+        self.endResetModel()
+        self._fetch()
+
+    def refresh(self, run_name: str = None) -> int:
+        """Reads the runs again, as many as were read before, since runs may have been saved or removed.
+        Returns the row of run_name now, -1 if it is not listed
+        """
+        rows = len(self._entries)
+        self._reset()
+        if rows > len(self._entries) and self._has_more:
+            self._fetch(at_least=rows)
+        for row, entry in enumerate(self._entries):
+            if entry.run_name == run_name:
+                return row
+        return -1
+
+    def sort(self, column: int, order=Qt.AscendingOrder):
+        self.sort_by = self.SORTS[column]
+        self.descending = order == Qt.DescendingOrder
+        self._reset()
+
+    def set_filter(self, contains: str):
+        """Only lists the runs whose name contains this text, ignoring case"""
+        if contains != self.contains:
+            self.contains = contains
+            self._reset()
+
+    def run_name(self, row: int) -> str:
+        return self._entries[row].run_name
+
+    def entry(self, row: int) -> RunIndexEntry:
+        return self._entries[row]
+
+    def neighbors(self, run_name: str, before: int = 1, after: int = 2) -> List[str]:
+        """Names of the runs listed after, then before, run_name: the ones likely to be opened next"""
+        rows = [r for r, e in enumerate(self._entries) if e.run_name == run_name]
+        if not rows:
+            return []
+        row = rows[0]
+        if row + after >= len(self._entries) and self._has_more:
+            self._fetch()
+        following = self._entries[row + 1 : row + 1 + after]
+        preceding = self._entries[max(0, row - before) : row][::-1]
+        return [e.run_name for e in following + preceding]
 
-class SavedRunsPage(QWidget):
-    def __init__(self, _previous_runs: List[str], display_method: Callable):
+    def find(self, prefix: str) -> int:
+        """Row of the first run whose name starts with prefix, fetching up to it. -1 if there is none"""
+        row = self.db.find_run_row(prefix, self.sort_by, self.descending, self.contains)
+        if row >= len(self._entries):
+            self._fetch(at_least=row + 1)
+        return row
+
+
+class SavedRunsView(QTableView):
+    def __init__(self, model: SavedRunsModel):
+        """Table of saved runs. Typing a name jumps to the first run starting with it,
+        looked up in the run index rather than among the rows fetched so far
+        """
+        super().__init__()
+        self.setModel(model)
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
+        # Several runs can be selected to compare them
+        self.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setSortingEnabled(True)
+        self.horizontalHeader().setSortIndicator(0, Qt.AscendingOrder)
+        self.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        # Fixed row heights so only the visible rows are ever measured
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.verticalHeader().hide()
+        self._search = ""
+        self._last_key = 0.0
+
+    def keyboardSearch(self, search: str):
+        now = time.monotonic()
+        if now - self._last_key > QApplication.keyboardInputInterval() / 1000:
+            self._search = ""
+        self._last_key = now
+        self._search += search
+        self.find(self._search)
+
+    def find(self, prefix: str) -> int:
+        """Selects and scrolls to the first run starting with prefix. Returns its row, -1 if there is none"""
+        row = self.model().find(prefix)
+        if row >= 0:
+            index = self.model().index(row, 0)
+            self.setCurrentIndex(index)
+            self.scrollTo(index, QAbstractItemView.PositionAtTop)
+        return row
+
+
+class SavedRunsPage(Page):
+    def __init__(self, db, display_method: Callable):
         """Will list all previous runs in the UI so the user can click on the run he/she wants to see the stats from.
         Doing so will trigger the display_method which, if successful, will result in a new central widget for the
         Main Window that displays the stats associated with that run
 
-        display_method -- method connected to each previous-run button in the UI. The method triggers a new
-        central widget displays the stats related to the run on the button to be displayed in the MainWindow
+        db -- DatabaseModel whose saved runs are listed
+        display_method -- method called with the name of the run that is opened, by double clicking it,
+        pressing enter on it or with the open button. The method triggers a new
+        central widget displays the stats related to the run to be displayed in the MainWindow
         """
         super().__init__()
-        self._previous_runs = _previous_runs
         self._title = "Previous Runs"
-        self._button_list = []
         self.display_method = display_method
+        self.runs_model = SavedRunsModel(db)
+        self._stale = False  # whether runs may have been saved since they were read
         self._initUi()
 
     def _initUi(self):
         self.setWindowTitle(self._title)
-        form_layout = QFormLayout()
-        group_box = QGroupBox()
-        label_list = []
-        combo_list = []
-        for i in range(len(self._previous_runs)):
-            label_list.append(QLabel())
-            button = QPushButton(self._previous_runs[i])
-            button.setText(self._previous_runs[i])
-            button.clicked.connect(
-                lambda state, x=str(self._previous_runs[i]): self.display_method(x)
-            )
-            combo_list.append(button)
-            self._button_list.append(button)
-            form_layout.addRow(label_list[i], combo_list[i])
-        group_box.setLayout(form_layout)
-        scroll = QScrollArea()
-        scroll.setWidget(group_box)
-        scroll.setWidgetResizable(True)
-        scroll_layout = QVBoxLayout(self)
-        scroll_layout.addWidget(scroll)
-        self.setLayout(scroll_layout)
-        self.adjustSize()
+        self.filter_box = QLineEdit()
+        self.filter_box.setPlaceholderText("Filter runs by name")
+        self.filter_box.setClearButtonEnabled(True)
+        # Filters once typing pauses instead of on every key
+        self._filter_timer = QtCore.QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(150)
+        self._filter_timer.timeout.connect(self._apply_filter)
+        self.filter_box.textChanged.connect(self._filter_timer.start)
+
+        self.open_button = QPushButton("Open")
+        self.open_button.clicked.connect(self._open_current)
+        # Connected by the MainWindow, see selected_runs
+        self.compare_button = QPushButton("Compare Selected")
+
+        self.runs_view = SavedRunsView(self.runs_model)
+        self.runs_view.activated.connect(self._open)
+        self.runs_view.selectionModel().currentRowChanged.connect(self._show_preview)
+        self.runs_model.modelReset.connect(self._show_preview)
+
+        self.preview_label = QLabel()
+        self.preview_label.setAlignment(Qt.AlignTop | Qt.AlignLeft)
+        self.preview_label.setWordWrap(True)
+        self.preview_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        self.preview_label.setMinimumWidth(200)
+        self._show_preview()
+
+        splitter = QSplitter(Qt.Horizontal)
+        splitter.addWidget(self.runs_view)
+        splitter.addWidget(self.preview_label)
+        splitter.setStretchFactor(0, 2)
+        splitter.setStretchFactor(1, 1)
+
+        top_layout = QHBoxLayout()
+        top_layout.addWidget(self.filter_box)
+        top_layout.addWidget(self.open_button)
+        top_layout.addWidget(self.compare_button)
+        layout = QVBoxLayout(self)
+        layout.addLayout(top_layout)
+        layout.addWidget(splitter)
+        self.setLayout(layout)
+
+    def reset(self):
+        """Runs may be saved while the page is hidden, so they are read again when it is shown"""
+        self._stale = True
+
+    def refresh(self):
+        if not self._stale:
+            return
+        self._stale = False
+        current = self.runs_view.currentIndex()
+        run_name = self.runs_model.run_name(current.row()) if current.isValid() else None
+        row = self.runs_model.refresh(run_name)
+        if row >= 0:
+            self.runs_view.setCurrentIndex(self.runs_model.index(row, 0))
+
+    def _show_preview(self, current: QtCore.QModelIndex = None, *args):
+        if current is None or not current.isValid():
+            self.preview_label.setText("Select a run to preview it")
+            return
+        self.preview_label.setText(summary_text(self.runs_model.entry(current.row())))
+
+    def _apply_filter(self):
+        self.runs_model.set_filter(self.filter_box.text())
+
+    def selected_runs(self) -> List[str]:
+        """Names of the selected runs, in list order"""
+        rows = sorted(i.row() for i in self.runs_view.selectionModel().selectedRows())
+        return [self.runs_model.run_name(r) for r in rows]
+
+    def neighbors(self, run_name: str) -> List[str]:
+        """Runs listed around run_name, see SavedRunsModel.neighbors"""
+        return self.runs_model.neighbors(run_name)
+
+    def _open(self, index: QtCore.QModelIndex):
+        if index.isValid():
+            self.display_method(self.runs_model.run_name(index.row()))
+
+    def _open_current(self):
+        self._open(self.runs_view.currentIndex())
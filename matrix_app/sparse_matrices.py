@@ -0,0 +1,169 @@
+"""
+small_matrix_app.matrix_app.sparse_matrices.py
+Sparse (CSR/CSC) matrices for inputs and products that are mostly zeros.
+A matrix whose share of nonzero entries is at most SPARSE_DENSITY is kept as a scipy.sparse CSR matrix
+by the multiply and the stats, so their memory and time scale with its nonzero entries
+instead of its full size. scipy is optional: without it every matrix stays dense.
+Saved runs keep a sparse matrix as a group of its data, indices and indptr datasets, see DatabaseModel,
+and a dense one as a dataset, so a load returns each matrix the way it was saved.
+No Qt dependency.
+"""
+
+import numpy as np
+
+try:
+    import scipy.sparse as sparse
+except ImportError:
+    sparse = None
+
+# Largest share of nonzero entries a matrix is kept sparse at
+SPARSE_DENSITY = 0.1
+# Matrices with fewer entries stay dense, since there is nothing to gain
+MIN_SPARSE_SIZE = 4096
+# A saved sparse matrix is an HDF5 group with this attribute, its shape and one dataset per part
+SPARSE_FORMAT_ATTR = "sparse_format"
+SHAPE_ATTR = "shape"
+SPARSE_PARTS = ("data", "indices", "indptr")
+
+
+def is_sparse(matrix) -> bool:
+    return sparse is not None and sparse.issparse(matrix)
+
+
+def density(matrix) -> float:
+    """Share of the entries of matrix that are not zero"""
+    size = int(np.prod(matrix.shape))
+    if size == 0:
+        return 0.0
+    if is_sparse(matrix):
+        return matrix.count_nonzero() / size
+    return np.count_nonzero(matrix) / size
+
+
+def auto_sparse(
+    matrix, threshold: float = SPARSE_DENSITY, min_size: int = MIN_SPARSE_SIZE
+):
+    """Returns matrix as a CSR matrix when it is 2-d, has at least min_size entries and at most
+    threshold of them are not zero, as a dense array when it is sparse but too dense, otherwise as it is
+    """
+    if sparse is None or np.ndim(matrix) != 2 or np.prod(matrix.shape) < min_size:
+        return matrix
+    if is_sparse(matrix):
+        if density(matrix) > threshold:
+            return matrix.toarray()
+        return matrix.tocsr()
+    matrix = np.asarray(matrix)
+    if matrix.dtype.kind not in "biuf" or density(matrix) > threshold:
+        return matrix
+    return sparse.csr_matrix(matrix)
+
+
+def to_dense(matrix) -> np.ndarray:
+    if is_sparse(matrix):
+        return matrix.toarray()
+    return np.asarray(matrix)
+
+
+def nbytes(matrix) -> int:
+    """Bytes held by a dense or sparse matrix"""
+    if is_sparse(matrix):
+        matrix = matrix.tocsr() if matrix.format not in ("csr", "csc") else matrix
+        return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+    return np.asarray(matrix).nbytes
+
+
+def from_parts(fmt: str, shape, data, indices, indptr):
+    """Rebuilds a CSR or CSC matrix from its arrays, as saved by DatabaseModel"""
+    if sparse is None:
+        raise ImportError("scipy is needed to load sparse matrices")
+    cls = sparse.csr_matrix if fmt == "csr" else sparse.csc_matrix
+    return cls((data, indices, indptr), shape=tuple(shape))
+
+
+def leading_entries(matrix):
+    """Leading nonzero entries of every row of a CSR matrix, or every column of a CSC one: the entries at
+    positions 0, 1, 2, ... of the row up to its first zero. A cumulative product along the rows (columns)
+    is zero everywhere else, so it has no more nonzero entries than the matrix.
+    Returns (indptr of the leading entries, their positions in matrix.data)
+    """
+    matrix.sum_duplicates()
+    matrix.sort_indices()
+    indptr, indices, data = matrix.indptr, matrix.indices, matrix.data
+    counts = np.diff(indptr)
+    segment = np.repeat(np.arange(counts.size), counts)
+    rank = np.arange(indices.size) - indptr[:-1][segment]
+    # An entry is leading when it and every entry before it in its row is in place and not zero
+    misplaced = np.cumsum((indices != rank) | (data == 0))
+    before = np.concatenate(([0], misplaced))[indptr[:-1]]
+    leading = np.flatnonzero(misplaced == before[segment])
+    lengths = np.bincount(segment[leading], minlength=counts.size)
+    return np.concatenate(([0], np.cumsum(lengths))), leading
+
+
+def segment_scan(values: np.ndarray, indptr: np.ndarray, op) -> np.ndarray:
+    """Running op (np.multiply or np.add) within each segment of values given by indptr.
+    Entry by entry in order, so it gives exactly what op.accumulate gives on each segment
+    """
+    out = values.copy()
+    lengths = np.diff(indptr)
+    active = np.flatnonzero(lengths > 1)
+    p = 1
+    while active.size:
+        at = indptr[active] + p
+        out[at] = op(out[at - 1], values[at])
+        p += 1
+        active = active[lengths[active] > p]
+    return out
+
+
+def is_sparse_group(node) -> bool:
+    """Whether node is the HDF5 group of a saved sparse matrix"""
+    return SPARSE_FORMAT_ATTR in getattr(node, "attrs", ())
+
+
+def write_sparse(group, label: str, matrix, dataset_options):
+    """Saves a sparse matrix in group as the group label
+    Args:
+        group -- h5py group the matrix is saved in
+        label -- name of the matrix
+        matrix -- sparse matrix, saved as CSR unless it is CSC
+        dataset_options -- called with (shape, dtype) of each part, returns its create_dataset keyword arguments
+    """
+    if matrix.format not in ("csr", "csc"):
+        matrix = matrix.tocsr()
+    node = group.create_group(label)
+    node.attrs[SPARSE_FORMAT_ATTR] = matrix.format
+    node.attrs[SHAPE_ATTR] = matrix.shape
+    for part in SPARSE_PARTS:
+        values = getattr(matrix, part)
+        node.create_dataset(
+            part, data=values, **dataset_options(values.shape, values.dtype)
+        )
+    return node
+
+
+def read_sparse(node):
+    return from_parts(
+        node.attrs[SPARSE_FORMAT_ATTR],
+        node.attrs[SHAPE_ATTR],
+        *(node[part][()] for part in SPARSE_PARTS)
+    )
+
+
+def read_matrix(node):
+    """Reads a saved matrix or stat: an ndarray, or a sparse matrix when it was saved sparse"""
+    if is_sparse_group(node):
+        return read_sparse(node)
+    return np.array(node)
+
+
+def sparse_layout(node) -> (tuple, np.dtype):
+    """Shape and dtype of a saved sparse matrix, without reading it"""
+    return tuple(int(d) for d in node.attrs[SHAPE_ATTR]), node["data"].dtype
+
+
+def dtype_of(matrix) -> np.dtype:
+    """dtype of a dense or sparse matrix, or of e.g. an h5py dataset without reading it"""
+    if hasattr(matrix, "dtype"):
+        return np.dtype(matrix.dtype)
+    return np.asarray(matrix).dtype
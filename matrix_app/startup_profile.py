@@ -0,0 +1,188 @@
+"""
+small_matrix_app.matrix_app.startup_profile.py
+Times the cold start of the app: every module imported, self and cumulative like python -X importtime,
+and the steps of starting the GUI up to the first paint of the main window.
+Used by python -m matrix_app.main --profile-startup, which prints the report and exits once the home
+screen is painted. Only imports made on the thread that installed the profile are timed.
+No Qt dependency.
+"""
+
+import sys
+import threading
+import time
+
+from importlib.abc import Loader, MetaPathFinder
+from typing import List
+
+# The home screen should be painted within this many seconds of the profiler starting
+FIRST_PAINT_TARGET = 0.3
+
+
+class ImportTime:
+    def __init__(self, name: str, self_time: float, total: float, depth: int):
+        """
+        Args:
+        name -- module name
+        self_time -- seconds spent importing the module itself, without the modules it imported
+        total -- seconds spent importing the module and the modules it imported
+        depth -- how many imports were in progress when it was imported, 0 for the ones made by the app
+        """
+        self.name = name
+        self.self_time = self_time
+        self.total = total
+        self.depth = depth
+
+    def package(self) -> str:
+        return self.name.split(".")[0]
+
+
+class StartupProfile:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.imports = []  # ImportTime, in the order the imports finished
+        self.steps = []  # (label, seconds since start), in the order they were marked
+        self._stack = []  # [start, seconds of nested imports] of the imports in progress
+        self._thread = threading.get_ident()
+        self._finder = _TimingFinder(self)
+
+    def install(self):
+        """Starts timing imports. Modules imported before are not timed"""
+        if self._finder not in sys.meta_path:
+            sys.meta_path.insert(0, self._finder)
+
+    def uninstall(self):
+        if self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+
+    def mark(self, label: str) -> float:
+        """Records that a step of the start up is done, returns the seconds since start"""
+        elapsed = time.perf_counter() - self.start
+        self.steps.append((label, elapsed))
+        return elapsed
+
+    def step_time(self, label: str) -> float:
+        """Seconds since start at which the step was marked, None if it was not"""
+        for step, elapsed in self.steps:
+            if step == label:
+                return elapsed
+        return None
+
+    def package_times(self) -> List[tuple]:
+        """(top level package, seconds spent importing its modules), slowest first"""
+        totals = {}
+        for module in self.imports:
+            totals[module.package()] = totals.get(module.package(), 0.0) + module.self_time
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+    def report(self, min_time: float = 0.002, paint_step: str = "first paint") -> str:
+        """Text report: imports that took at least min_time seconds, nested as they were imported,
+        the import time per package, the start up steps and how the first paint compares to the target
+        """
+        lines = ["Imports (ms)", "{:>10} {:>10}  {}".format("self", "cumulative", "module")]
+        for module in self.imports:
+            if module.total >= min_time:
+                lines.append(
+                    "{:>10.1f} {:>10.1f}  {}{}".format(
+                        1000 * module.self_time,
+                        1000 * module.total,
+                        "  " * module.depth,
+                        module.name,
+                    )
+                )
+        lines += ["", "Imports per package (ms)"]
+        for package, seconds in self.package_times():
+            if seconds >= min_time:
+                lines.append("{:>10.1f}  {}".format(1000 * seconds, package))
+        lines += ["", "Start up (ms since the profiler started)"]
+        previous = 0.0
+        for label, elapsed in self.steps:
+            lines.append(
+                "{:>10.1f} {:>+10.1f}  {}".format(1000 * elapsed, 1000 * (elapsed - previous), label)
+            )
+            previous = elapsed
+        painted = self.step_time(paint_step)
+        if painted is not None:
+            lines += [
+                "",
+                "{} after {:.0f} ms, target {:.0f} ms: {}".format(
+                    paint_step.capitalize(),
+                    1000 * painted,
+                    1000 * FIRST_PAINT_TARGET,
+                    "ok" if painted <= FIRST_PAINT_TARGET else "too slow",
+                ),
+            ]
+        return "\n".join(lines)
+
+    def _begin(self):
+        self._stack.append([time.perf_counter(), 0.0])
+
+    def _end(self, name: str, find_time: float):
+        start, nested = self._stack.pop()
+        total = time.perf_counter() - start + find_time
+        self.imports.append(ImportTime(name, total - nested, total, len(self._stack)))
+        if self._stack:
+            self._stack[-1][1] += total
+
+
+class _TimingFinder(MetaPathFinder):
+    """Finds modules with the finders after it and wraps their loaders to time the import"""
+
+    def __init__(self, profile: StartupProfile):
+        self.profile = profile
+
+    def find_spec(self, name, import_path, target=None):
+        if threading.get_ident() != self.profile._thread:
+            return None
+        start = time.perf_counter()
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, import_path, target)
+            if spec is not None:
+                break
+        else:
+            # Let the import system report the missing module as usual
+            return None
+        if spec.loader is None or not hasattr(spec.loader, "exec_module"):
+            return spec
+        spec.loader = _TimedLoader(
+            spec.loader, self.profile, name, time.perf_counter() - start
+        )
+        return spec
+
+
+class _TimedLoader(Loader):
+    """Stands in for a module's loader while it is imported, then puts the loader back on the module"""
+
+    def __init__(self, loader, profile: StartupProfile, name: str, find_time: float):
+        self.loader = loader
+        self.profile = profile
+        self.name = name
+        self.find_time = find_time
+        self._timing = False
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+    def create_module(self, spec):
+        # Extension modules are initialized here, so their time counts too
+        self.profile._begin()
+        self._timing = True
+        try:
+            return self.loader.create_module(spec)
+        except BaseException:
+            self._timing = False
+            self.profile._end(self.name, self.find_time)
+            raise
+
+    def exec_module(self, module):
+        if not self._timing:
+            self.profile._begin()
+        self._timing = False
+        try:
+            self.loader.exec_module(module)
+        finally:
+            module.__loader__ = self.loader
+            if getattr(module, "__spec__", None) is not None:
+                module.__spec__.loader = self.loader
+            self.profile._end(self.name, self.find_time)
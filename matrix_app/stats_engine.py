@@ -0,0 +1,417 @@
+"""
+small_matrix_app.matrix_app.stats_engine.py
+Computes the product and the stats of a run without any Qt dependencies,
+so the same code can be used by the DisplayStatsPage and by headless tools.
+Mostly zero matrices are multiplied and summarized as sparse matrices, see sparse_matrices.py
+"""
+
+import sys
+
+from typing import Callable, List
+
+import numpy as np
+
+from matrix_app.db_widget import DisplayData
+from matrix_app.log_cumprod import LogCumprod, lazy_log_factors, out_of_range
+from matrix_app.narrow_dtypes import product_dtypes, sum_dtype
+from matrix_app.sparse_matrices import (
+    auto_sparse,
+    is_sparse,
+    leading_entries,
+    segment_scan,
+    sparse,
+    to_dense,
+)
+
+# Labels of the min, mean and max of C. Saved runs keep these in their metadata, see DatabaseModel.run_summary
+MIN_LABEL = "Minimum Value in Matrix"
+MEAN_LABEL = "Mean across Matrix"
+MAX_LABEL = "Max across Matrix"
+
+
+def multiply(A, B):
+    """Returns the matrix product A x B in a dtype it cannot overflow, see narrow_dtypes.product_dtypes.
+    When A or B is mostly zeros, see sparse_matrices.auto_sparse, the product is taken on the sparse
+    matrix and is itself sparse if it is mostly zeros
+    Args:
+        A -- mxn matrix, dense or sparse
+        B -- nxk matrix, dense or sparse
+    """
+    A = auto_sparse(A)
+    B = auto_sparse(B)
+    compute, out = product_dtypes(A, B)
+    if not (is_sparse(A) or is_sparse(B)):
+        A = np.asarray(A).astype(compute, copy=False)
+        B = np.asarray(B).astype(compute, copy=False)
+        return A.dot(B).astype(out, copy=False)
+    if A.shape[1] != B.shape[0]:
+        raise ValueError(
+            "shapes " + str(A.shape) + " and " + str(B.shape) + " not aligned"
+        )
+    # Sparse products do not use BLAS, so they are taken in the returned dtype
+    A = A.astype(out, copy=False) if is_sparse(A) else np.asarray(A, dtype=out)
+    B = B.astype(out, copy=False) if is_sparse(B) else np.asarray(B, dtype=out)
+    if not is_sparse(A):
+        # dense x sparse as (sparse.T x dense.T).T, so the sparse matrix drives the product
+        return auto_sparse(np.asarray(B.T @ A.T).T)
+    return auto_sparse(A @ B)
+
+
+def summary_stats(C) -> List[DisplayData]:
+    """Only the min, mean and max of C, labeled like calculate_stats"""
+    if is_sparse(C):
+        # The implicit zeros count
+        return [
+            DisplayData(MIN_LABEL, C.min()),
+            DisplayData(
+                MEAN_LABEL, C.sum(dtype=sum_dtype(C.dtype)) / max(1, np.prod(C.shape))
+            ),
+            DisplayData(MAX_LABEL, C.max()),
+        ]
+    C = np.asarray(C)
+    return [
+        DisplayData(MIN_LABEL, C.min()),
+        DisplayData(MEAN_LABEL, C.mean(dtype=sum_dtype(C.dtype))),
+        DisplayData(MAX_LABEL, C.max()),
+    ]
+
+
+def cumulative_product_dtype(dtype) -> np.dtype:
+    """dtype numpy gives the cumulative product of a matrix of the given dtype"""
+    return np.cumprod(np.empty(0, dtype)).dtype
+
+
+class StatsAccumulator:
+    # Blocks of rows are sized to stay in cache while every stat is taken from them
+    BLOCK_BYTES = 256 * 1024
+
+    def __init__(self, shape: (int, int), dtype, cumprod_out=None, log_out=None):
+        """
+        Collects every global, per-row and per-column stat of C from consecutive blocks of its rows.
+        Each block is visited while it is still in cache, so C is read from memory once.
+        Args:
+            shape -- shape of the full matrix C
+            dtype -- dtype of C
+            cumprod_out -- optional (flat, down columns, across rows) targets for the cumulative products,
+            e.g. h5py datasets, so they can be streamed to disk instead of being held in memory
+            log_out -- optional (flat, down columns, across rows) callables, called with (shape, dtype) to create
+            the targets of the cumulative products in log space should they leave their range, see LogCumprod
+        """
+        self.shape = shape
+        self.dtype = np.dtype(dtype)
+        m, n = shape
+        self.rows_done = 0
+
+        # Same dtype numpy would pick for C.cumprod(). Sums, and so means, are accumulated in float64
+        cumprod_dtype = cumulative_product_dtype(self.dtype)
+        sums = sum_dtype(self.dtype)
+        self.cumprod_dtype = cumprod_dtype
+        if cumprod_out is None:
+            cumprod_out = (
+                np.empty(m * n, dtype=cumprod_dtype),
+                np.empty((m, n), dtype=cumprod_dtype),
+                np.empty((m, n), dtype=cumprod_dtype),
+            )
+        self._cprod, self._cprodc, self._cprodr = cumprod_out
+        self._cprod_carry = None
+        self._cprodc_carry = None
+        self._cprod_max = None
+        self._cprodc_max = None
+        self._cprodr_max = None
+        log_out = log_out or (None, None, None)
+        self._log_cprods = [
+            LogCumprod(axis, shape, cumprod_dtype, make_target)
+            for axis, make_target in zip((None, 0, 1), log_out)
+        ]
+
+        self._row_min = np.empty(m, dtype=self.dtype)
+        self._row_max = np.empty(m, dtype=self.dtype)
+        self._row_mean = np.empty(m, dtype=sums)
+        self._col_min = None
+        self._col_max = None
+        self._col_sum = np.zeros(n, dtype=sums)
+
+    def rows_per_block(self) -> int:
+        return max(1, self.BLOCK_BYTES // max(1, self.shape[1] * self.dtype.itemsize))
+
+    def update(self, block: np.ndarray):
+        """Adds the next block of rows of C"""
+        block = np.asarray(block)
+        r0 = self.rows_done
+        r1 = r0 + block.shape[0]
+        n = self.shape[1]
+
+        self._row_min[r0:r1] = block.min(axis=1)
+        self._row_max[r0:r1] = block.max(axis=1)
+        row_sum = block.sum(axis=1, dtype=self._col_sum.dtype)
+        self._row_mean[r0:r1] = row_sum / n
+        self._col_sum += block.sum(axis=0, dtype=self._col_sum.dtype)
+        if self._col_min is None:
+            self._col_min = block.min(axis=0)
+            self._col_max = block.max(axis=0)
+        else:
+            np.minimum(self._col_min, block.min(axis=0), out=self._col_min)
+            np.maximum(self._col_max, block.max(axis=0), out=self._col_max)
+
+        # Cumulative products continue from the last value of the previous block,
+        # which gives exactly the same result as one cumprod over the whole matrix.
+        # Once one has left its range only its log space form is kept up
+        log_cprod, log_cprodc, log_cprodr = self._log_cprods
+        flat = cols = rows = None
+        with np.errstate(over="ignore", invalid="ignore"):
+            if not log_cprod.out_of_range:
+                flat = _block_target(
+                    self._cprod, slice(r0 * n, r1 * n), (block.size,), self.cumprod_dtype
+                )
+                flat[:] = block.ravel()
+                if self._cprod_carry is not None:
+                    flat[0] *= self._cprod_carry
+                np.cumprod(flat, out=flat)
+                self._cprod_carry = flat[-1]
+                if not isinstance(self._cprod, np.ndarray):
+                    self._cprod[r0 * n : r1 * n] = flat
+                # The overflow checks look at each block while it is still in cache
+                self._cprod_max = _running_max(self._cprod_max, flat)
+
+            if not log_cprodc.out_of_range:
+                cols = _block_target(
+                    self._cprodc, slice(r0, r1), block.shape, self.cumprod_dtype
+                )
+                cols[:] = block
+                if self._cprodc_carry is not None:
+                    cols[0] *= self._cprodc_carry
+                np.cumprod(cols, axis=0, out=cols)
+                self._cprodc_carry = cols[-1].copy()
+                if not isinstance(self._cprodc, np.ndarray):
+                    self._cprodc[r0:r1] = cols
+                self._cprodc_max = _running_max(self._cprodc_max, cols)
+
+            if not log_cprodr.out_of_range:
+                rows = _block_target(
+                    self._cprodr, slice(r0, r1), block.shape, self.cumprod_dtype
+                )
+                np.cumprod(block, axis=1, out=rows)
+                if not isinstance(self._cprodr, np.ndarray):
+                    self._cprodr[r0:r1] = rows
+                self._cprodr_max = _running_max(self._cprodr_max, rows)
+
+        factors = lazy_log_factors(block)
+        for log, raw, target in zip(
+            self._log_cprods, (flat, cols, rows), (self._cprod, self._cprodc, self._cprodr)
+        ):
+            log.update(raw, factors, r0, target)
+        self.rows_done = r1
+
+    def finish(self) -> List[DisplayData]:
+        """Returns every stat of C. The labels and order are the ones saved to disk"""
+        if self.rows_done != self.shape[0]:
+            raise ValueError("Not every row of C was added to the stats")
+        return stats_list(
+            self.shape,
+            (self._cprod, self._cprodc, self._cprodr),
+            (self._cprod_max, self._cprodc_max, self._cprodr_max),
+            (self._col_min, self._col_max, self._col_sum),
+            (self._row_min, self._row_max, self._row_mean),
+            log_forms(self._log_cprods),
+        )
+
+
+def log_forms(log_cprods: List[LogCumprod]) -> tuple:
+    """The log space form of each cumulative product that left its range, None for the others"""
+    return tuple(l.target if l.out_of_range > 0 else None for l in log_cprods)
+
+
+def stats_list(
+    shape: (int, int),
+    cumprods,
+    cumprod_maxes,
+    columns,
+    rows,
+    log_cumprods=(None, None, None),
+) -> List[DisplayData]:
+    """Labels the stats of C in the order they are saved to disk
+    Args:
+        shape -- shape of C
+        cumprods -- (flat, down columns, across rows) cumulative products
+        cumprod_maxes -- largest value of each of the cumulative products, for the overflow labels
+        columns -- (min, max, sum) of each column
+        rows -- (min, max, mean) of each row
+        log_cumprods -- sign and log10 magnitude form, see log_cumprod.py, of the cumulative products
+            that overflowed or underflowed, None for the others. It replaces the raw values
+    """
+    m, n = shape
+    cprod, cprodc, cprodr = cumprods
+    log_cprod, log_cprodc, log_cprodr = log_cumprods
+    cprod_max, cprodc_max, cprodr_max = cumprod_maxes
+    col_min, col_max, col_sum = columns
+    row_min, row_max, row_mean = rows
+    stats = []
+
+    # Across all entries
+    if log_cprod is not None:
+        stats.append(
+            DisplayData("Cumulative Product Sign and Log10 Magnitude", log_cprod)
+        )
+    elif not cprod_max > sys.maxsize:
+        stats.append(DisplayData("Cumulative Product Matrix ", cprod))
+    else:
+        stats.append(
+            DisplayData("Cumulative Product Too Large For Full Display", cprod)
+        )
+
+    stats.append(DisplayData(MIN_LABEL, col_min.min()))
+    stats.append(DisplayData(MEAN_LABEL, col_sum.sum() / (m * n)))
+    stats.append(DisplayData(MAX_LABEL, col_max.max()))
+
+    # Across columns
+    if log_cprodc is not None:
+        stats.append(
+            DisplayData(
+                "Cumulative Product Down Each Column Sign and Log10 Magnitude",
+                log_cprodc,
+            )
+        )
+    elif not cprodc_max > sys.maxsize:
+        stats.append(DisplayData("Cumulative Product down each Column", cprodc))
+    else:
+        stats.append(
+            DisplayData(
+                "Cumulative Product Down Each Column Too Large For Full Display",
+                cprodc,
+            )
+        )
+
+    stats.append(DisplayData("Minimum Value per Column", col_min))
+    stats.append(DisplayData("Mean of each Column", col_sum / m))
+    stats.append(DisplayData("Max of each Column", col_max))
+
+    # Across rows
+    if log_cprodr is not None:
+        stats.append(
+            DisplayData(
+                "Cumulative Product Across Each Row Sign and Log10 Magnitude",
+                log_cprodr,
+            )
+        )
+    elif not cprodr_max > sys.maxsize:
+        stats.append(DisplayData("Cumulative Product across each Row ", cprodr))
+    else:
+        stats.append(
+            DisplayData(
+                "Cumulative Product Across Each Row Too Large For Full Display",
+                cprodr,
+            )
+        )
+    # ROW VECTOR to COL
+    stats.append(DisplayData("Minimum Value per Row", row_min.reshape(-1, 1)))
+    stats.append(DisplayData("Mean of each Row", row_mean.reshape(-1, 1)))
+    stats.append(DisplayData("Max of each Row", row_max.reshape(-1, 1)))
+    return stats
+
+
+def _block_target(out, rows: slice, shape, dtype) -> np.ndarray:
+    """Returns where a block of a cumulative product is computed: straight into out when it is an
+    ndarray, otherwise into a block sized buffer that is written to out afterwards"""
+    if isinstance(out, np.ndarray):
+        return out[rows]
+    return np.empty(shape, dtype=dtype)
+
+
+def _running_max(current, block: np.ndarray):
+    block_max = block.max()
+    if current is None or block_max > current or np.isnan(block_max):
+        return block_max
+    return current
+
+
+def calculate_stats(
+    C, progress: Callable = None, cumprod_out=None, log_out=None
+) -> List[DisplayData]:
+    """Calculates every stat for the product matrix C in one blocked pass over C.
+    The labels and order of the returned stats are the ones saved to disk
+    Args:
+        C -- product of the two entered matrices, e.g. an np.memmap of a saved run, or a sparse matrix,
+            see sparse_stats
+        progress -- called with (rows done, total rows) after every block. Raising from it stops the pass
+        cumprod_out, log_out -- where the cumulative products go, see StatsAccumulator. For a huge C they
+            can be datasets on disk, so the three full size products are never held in memory
+    """
+    if is_sparse(C) and cumprod_out is None and log_out is None:
+        return sparse_stats(C, progress)
+    C = to_dense(C)
+    accumulator = StatsAccumulator(C.shape, C.dtype, cumprod_out, log_out)
+    step = accumulator.rows_per_block()
+    for r0 in range(0, C.shape[0], step):
+        accumulator.update(C[r0 : r0 + step])
+        if progress is not None:
+            progress(min(C.shape[0], r0 + step), C.shape[0])
+    return accumulator.finish()
+
+
+def sparse_stats(C, progress: Callable = None) -> List[DisplayData]:
+    """calculate_stats of a sparse C in time and memory that scale with its nonzero entries.
+    The min, max and mean count its implicit zeros. A cumulative product is zero from the first zero on,
+    so each of them is a sparse matrix of the leading nonzero entries of every row, column or of the whole
+    of C in row-major order. The flat cumulative product is a 1 x m*n matrix.
+    When a cumulative product leaves its range the stats are taken on the dense C instead, so that
+    its sign and log10 magnitude form matches calculate_stats
+    """
+    m, n = C.shape
+    if m * n == 0:
+        return calculate_stats(C.toarray(), progress)
+    dtype = C.dtype
+    cumprod_dtype = cumulative_product_dtype(dtype)
+    sums = sum_dtype(dtype)
+    cumprods = []
+    for axis in (None, 0, 1):
+        cumprod = _sparse_cumprod(C, axis, cumprod_dtype)
+        if cumprod is None:
+            return calculate_stats(C.toarray(), progress)
+        cumprods.append(cumprod)
+
+    col_min = C.min(axis=0).toarray().ravel()
+    col_max = C.max(axis=0).toarray().ravel()
+    col_sum = np.asarray(C.sum(axis=0, dtype=sums)).ravel()
+    row_min = C.min(axis=1).toarray().ravel()
+    row_max = C.max(axis=1).toarray().ravel()
+    row_mean = np.asarray(C.sum(axis=1, dtype=sums)).ravel() / n
+    if progress is not None:
+        progress(m, m)
+    return stats_list(
+        (m, n),
+        cumprods,
+        [c.max() for c in cumprods],
+        (col_min, col_max, col_sum),
+        (row_min, row_max, row_mean),
+    )
+
+
+def _sparse_cumprod(C, axis, dtype):
+    """Cumulative product of a sparse C over all entries in row-major order (axis None, as a 1 x m*n matrix),
+    down each column (axis 0) or across each row (axis 1). None if it leaves the range of dtype
+    """
+    m, n = C.shape
+    M = C.tocsc() if axis == 0 else C.tocsr()
+    indptr, leading = leading_entries(M)
+    indices = M.indices[leading]
+    if axis is None:
+        # Only the rows before the first row with a zero take part, and the leading entries of that row
+        lengths = np.diff(indptr)
+        full = np.flatnonzero(lengths < n)
+        count = m * n if full.size == 0 else full[0] * n + lengths[full[0]]
+        leading = leading[:count]
+        indices = np.arange(count)
+        indptr = np.array([0, count])
+    factors = M.data[leading]
+    with np.errstate(over="ignore", under="ignore", invalid="ignore", divide="ignore"):
+        raw = segment_scan(factors.astype(dtype), indptr, np.multiply)
+        logs = segment_scan(
+            np.log10(np.abs(factors), dtype=np.float64), indptr, np.add
+        )
+    if out_of_range(raw, logs).any():
+        return None
+    if axis is None:
+        return sparse.csr_matrix((raw, indices, indptr), shape=(1, m * n))
+    if axis == 0:
+        return sparse.csc_matrix((raw, indices, indptr), shape=(m, n))
+    return sparse.csr_matrix((raw, indices, indptr), shape=(m, n))
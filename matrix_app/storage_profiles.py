@@ -0,0 +1,159 @@
+"""
+small_matrix_app.matrix_app.storage_profiles.py
+Storage profiles describe how the DatabaseModel lays out each matrix and stat in a run file:
+chunk shapes tuned to row or column access, gzip/lzf compression with the shuffle filter,
+and whether floats are downcast to float32 or every value is kept in its narrowest exact dtype.
+"""
+
+import numpy as np
+
+from matrix_app import narrow_dtypes
+from matrix_app.sparse_matrices import is_sparse
+
+# Rough size of one HDF5 chunk
+CHUNK_BYTES = 1024 * 1024
+
+# Float downcasting policies
+KEEP_FLOATS = "keep"
+FLOAT32 = "float32"  # float64 as float32, losing precision, unless values are out of float32 range
+LOSSLESS_FLOAT32 = "lossless_float32"  # float32 only when every value survives the cast
+NARROWEST = "narrowest"  # any matrix or stat in the narrowest dtype that holds it exactly, see narrow_dtypes
+
+
+def row_chunks(shape, itemsize: int, chunk_bytes: int = CHUNK_BYTES) -> tuple:
+    """Chunk shape of about chunk_bytes that holds whole rows where possible"""
+    if len(shape) == 1:
+        return (int(max(1, min(shape[0], chunk_bytes // itemsize))),)
+    m, n = shape
+    if n * itemsize <= chunk_bytes:
+        return (int(max(1, min(m, chunk_bytes // (n * itemsize)))), n)
+    return (1, int(chunk_bytes // itemsize))
+
+
+def column_chunks(shape, itemsize: int, chunk_bytes: int = CHUNK_BYTES) -> tuple:
+    """Chunk shape of about chunk_bytes that holds whole columns where possible"""
+    if len(shape) == 1:
+        return row_chunks(shape, itemsize, chunk_bytes)
+    m, n = shape
+    if m * itemsize <= chunk_bytes:
+        return (m, int(max(1, min(n, chunk_bytes // (m * itemsize)))))
+    return (int(chunk_bytes // itemsize), 1)
+
+
+class StorageProfile:
+    ROWS = "rows"
+    COLUMNS = "columns"
+
+    def __init__(
+        self,
+        name: str,
+        chunk_layout: str = None,
+        compression: str = None,
+        compression_opts=None,
+        shuffle: bool = False,
+        float_policy: str = KEEP_FLOATS,
+        chunk_bytes: int = CHUNK_BYTES,
+    ):
+        """
+        Args:
+        name -- name of the profile
+        chunk_layout -- StorageProfile.ROWS, StorageProfile.COLUMNS or None for contiguous storage
+        compression -- "gzip", "lzf" or None
+        compression_opts -- compression level for gzip
+        shuffle -- whether to apply the byte shuffle filter before compression
+        float_policy -- KEEP_FLOATS, FLOAT32, LOSSLESS_FLOAT32 or NARROWEST
+        chunk_bytes -- rough size of one chunk
+        """
+        if compression is not None and chunk_layout is None:
+            raise ValueError("Compressed storage needs a chunk layout")
+        self.name = name
+        self.chunk_layout = chunk_layout
+        self.compression = compression
+        self.compression_opts = compression_opts
+        self.shuffle = shuffle
+        self.float_policy = float_policy
+        self.chunk_bytes = chunk_bytes
+
+    def __str__(self):
+        return self.name
+
+    def convert(self, data):
+        """Applies the float downcasting policy to data about to be saved.
+        Data written block by block (see DatabaseModel.save_run_out_of_core) is never downcast
+        since its values are not known when its dataset is created"""
+        if is_sparse(data):
+            converted = data.copy()
+            converted.data = self.convert(data.data)
+            return converted
+        data = np.asarray(data)
+        if self.float_policy == NARROWEST:
+            return narrow_dtypes.narrow(data)
+        if data.dtype != np.float64 or self.float_policy == KEEP_FLOATS:
+            return data
+        with np.errstate(over="ignore"):
+            narrow = data.astype(np.float32)
+        if self.float_policy == LOSSLESS_FLOAT32:
+            exact = (narrow == data) | (np.isnan(narrow) & np.isnan(data))
+            if not exact.all():
+                return data
+        elif (np.isinf(narrow) & np.isfinite(data)).any():
+            # e.g. large cumulative products
+            return data
+        return narrow
+
+    def dataset_options(self, shape, dtype) -> dict:
+        """Keyword arguments for h5py create_dataset"""
+        shape = tuple(shape)
+        if self.chunk_layout is None or len(shape) == 0 or 0 in shape:
+            return {}
+        itemsize = np.dtype(dtype).itemsize
+        if self.chunk_layout == self.COLUMNS:
+            chunks = column_chunks(shape, itemsize, self.chunk_bytes)
+        else:
+            chunks = row_chunks(shape, itemsize, self.chunk_bytes)
+        options = {"chunks": chunks}
+        if self.compression is not None:
+            options["compression"] = self.compression
+            if self.compression_opts is not None:
+                options["compression_opts"] = self.compression_opts
+            options["shuffle"] = self.shuffle
+        return options
+
+
+DEFAULT_PROFILE = StorageProfile("default")
+
+PROFILES = {
+    p.name: p
+    for p in (
+        DEFAULT_PROFILE,
+        StorageProfile("rows", StorageProfile.ROWS),
+        StorageProfile("columns", StorageProfile.COLUMNS),
+        StorageProfile("rows_lzf", StorageProfile.ROWS, "lzf", shuffle=True),
+        StorageProfile("rows_gzip", StorageProfile.ROWS, "gzip", 4, shuffle=True),
+        StorageProfile("columns_gzip", StorageProfile.COLUMNS, "gzip", 4, shuffle=True),
+        StorageProfile(
+            "rows_gzip_lossless_float32",
+            StorageProfile.ROWS,
+            "gzip",
+            4,
+            shuffle=True,
+            float_policy=LOSSLESS_FLOAT32,
+        ),
+        StorageProfile(
+            "rows_gzip_float32",
+            StorageProfile.ROWS,
+            "gzip",
+            4,
+            shuffle=True,
+            float_policy=FLOAT32,
+        ),
+        StorageProfile(
+            "rows_gzip_narrowest",
+            StorageProfile.ROWS,
+            "gzip",
+            4,
+            shuffle=True,
+            float_policy=NARROWEST,
+        ),
+    )
+}
@@ -0,0 +1,42 @@
+"""small_matrix_app.matrix_app.tests.helpers.py
+Assertions and runs shared by the tests
+"""
+
+import numpy as np
+
+from matrix_app.db_widget import DisplayData, RunData
+from matrix_app.stats_engine import calculate_stats
+
+
+def assert_stat_close(got, expected, rtol):
+    """Cumulative products that left their range are compared in their sign and log10 form"""
+    got, expected = np.asarray(got), np.asarray(expected)
+    if expected.dtype.names is not None:
+        assert got.dtype == expected.dtype
+        np.testing.assert_array_equal(got["sign"], expected["sign"])
+        np.testing.assert_allclose(got["log10"], expected["log10"], rtol=rtol)
+    else:
+        np.testing.assert_allclose(got, expected, rtol=rtol)
+
+
+def make_run(
+    run_name: str, A=None, B=None, with_stats: bool = True, seed: int = 0
+) -> RunData:
+    """A run of A, B and C = A x B, with the stats of C unless with_stats is False
+    Args:
+        run_name -- name of the run
+        A -- mxk matrix, a 12x5 float matrix of random integers from 0 to 100 when None
+        B -- kxn matrix, a 5x7 float matrix of random integers from 0 to 100 when None
+        with_stats -- whether the run holds the stats of C
+        seed -- seeds the random A and B
+    """
+    rng = np.random.default_rng(seed)
+    if A is None:
+        A = rng.integers(0, 101, size=(12, 5)).astype(float)
+    if B is None:
+        B = rng.integers(0, 101, size=(5, 7)).astype(float)
+    C = A.dot(B)
+    stats = calculate_stats(C) if with_stats else []
+    return RunData(
+        run_name, [DisplayData("A", A), DisplayData("B", B), DisplayData("C", C)], stats
+    )
@@ -0,0 +1,91 @@
+"""small_matrix_app.matrix_app.tests.test_batch_engine.py
+Tests for the headless Batch Engine
+"""
+import sys
+
+sys.path.insert(0, "..")
+import unittest
+
+import shutil
+import tempfile
+import numpy as np
+
+from matrix_app.batch_engine import BatchEngine, RandomRunSpec
+from matrix_app.db_widget import DatabaseModel
+
+
+class TestBatchEngine(unittest.TestCase):
+    """Test batch_engine without any QApplication"""
+
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.db = DatabaseModel(self.db_dir + "/SavedRuns")
+
+    def test_run_pairs_saves_products(self):
+        """Every (A, B) pair becomes a saved run holding A, B and C = AB"""
+        A = np.array([[1.0, 2.0], [3.0, 4.0]])
+        B = np.array([[5.0], [6.0]])
+        engine = BatchEngine(self.db, workers=2, run_prefix="Pairs")
+        report = engine.run_pairs((A * i, B) for i in range(5))
+
+        assert len(report.saved) == 5
+        assert report.failures == []
+        assert report.runs_per_sec > 0
+        run_data = self.db.load_run("Pairs3")
+        matrices = {m.label: m.data for m in run_data.matrices}
+        np.testing.assert_array_equal(matrices["C"], (A * 3).dot(B))
+        assert len(run_data.stats) == 12
+
+    def test_run_random_is_reproducible(self):
+        """The same seed produces the same runs"""
+        spec = RandomRunSpec(max_dim=6)
+        BatchEngine(self.db, workers=2, run_prefix="First").run_random(4, spec, 7)
+        report = BatchEngine(self.db, workers=2, run_prefix="Second").run_random(
+            4, spec, 7
+        )
+
+        assert len(report.saved) == 4
+        for i in range(4):
+            first = self.db.load_run("First" + str(i)).matrices
+            second = self.db.load_run("Second" + str(i)).matrices
+            for f, s in zip(first, second):
+                np.testing.assert_array_equal(f.data, s.data)
+
+    def test_seed_only_runs_regenerate(self):
+        """Runs saved as their seed load with the same matrices as fully saved ones"""
+        spec = RandomRunSpec(max_dim=6, dtype="int32")
+        BatchEngine(self.db, workers=2, run_prefix="Full").run_random(3, spec, 11)
+        BatchEngine(self.db, workers=2, run_prefix="Seed", seed_only=True).run_random(
+            3, spec, 11
+        )
+        for i in range(3):
+            full = self.db.load_run("Full" + str(i))
+            seed = self.db.load_run("Seed" + str(i))
+            assert seed.generator == full.generator
+            for f, s in zip(full.matrices + full.stats, seed.matrices + seed.stats):
+                np.testing.assert_array_equal(f.data, s.data)
+
+    def test_name_conflicts_are_reported(self):
+        """Runs that cannot be saved are reported as failures instead of raising"""
+        engine = BatchEngine(self.db, workers=1, run_prefix="Same", with_stats=False)
+        engine.run_random(2)
+        report = engine.run_random(2)
+        assert len(report.saved) == 0
+        assert len(report.failures) == 2
+
+    def test_compute_failures_are_named(self):
+        """A pair that cannot be multiplied is reported under its run name"""
+        A = np.ones((2, 3))
+        pairs = [(A, np.ones((3, 2))), (A, np.ones((2, 2))), (A, np.ones((3, 1)))]
+        report = BatchEngine(self.db, workers=2, run_prefix="Bad").run_pairs(pairs)
+        assert sorted(report.saved) == ["Bad0", "Bad2"]
+        assert [name for name, error in report.failures] == ["Bad1"]
+        assert report.failures[0][1].startswith("Could not compute run: ")
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.db_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""small_matrix_app.matrix_app.tests.test_blocked_multiply.py
+Tests for the tiled out-of-core multiply
+"""
+import sys
+
+sys.path.insert(0, "..")
+import unittest
+
+import shutil
+import tempfile
+import numpy as np
+
+from matrix_app.blocked_multiply import blocked_multiply, plan_tiles
+from matrix_app.db_widget import DatabaseModel, DisplayData, RunData
+from matrix_app.stats_engine import StatsAccumulator, calculate_stats
+from test.helpers import assert_stat_close
+
+
+class TestBlockedMultiply(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        self.A = rng.random((53, 31))
+        self.B = rng.random((31, 47))
+        self.db_dir = tempfile.mkdtemp()
+        self.db = DatabaseModel(self.db_dir + "/SavedRuns")
+
+    def test_plan_tiles_respects_limit(self):
+        rows, k_tile, n_tile = plan_tiles(10000, 10000, 10000, 8, 64 * 1024 * 1024)
+        held = 8 * (19 * rows * 10000 + rows * k_tile + k_tile * n_tile + rows * n_tile)
+        assert held <= 64 * 1024 * 1024
+        assert rows >= 1 and k_tile >= 1 and n_tile >= 1
+
+    def test_small_memory_limit_matches_dot(self):
+        """Many tiny tiles give the same product and stats as the in-memory path"""
+        stats = StatsAccumulator((53, 47), np.float64)
+        C = blocked_multiply(self.A, self.B, memory_limit=8 * 1024, stats=stats)
+        np.testing.assert_allclose(C, self.A.dot(self.B), rtol=1e-12)
+        for got, expected in zip(stats.finish(), calculate_stats(C)):
+            assert got.label == expected.label
+            assert_stat_close(got.data, expected.data, rtol=1e-12)
+
+    def test_save_run_out_of_core_from_saved_run(self):
+        """A and B are read from a saved run's .h5 file and C is written into a new run file"""
+        source = RunData(
+            "Source",
+            [DisplayData("A", self.A), DisplayData("B", self.B)],
+            [],
+        )
+        assert self.db.save_run(source) is None
+
+        with self.db.open_run_matrix("Source", "A") as a:
+            with self.db.open_run_matrix("Source", "B") as b:
+                fm = self.db.save_run_out_of_core(
+                    "Blocked", a, b, memory_limit=16 * 1024
+                )
+        assert fm is None
+
+        run_data = self.db.load_run("Blocked")
+        matrices = {m.label: m.data for m in run_data.matrices}
+        np.testing.assert_allclose(matrices["C"], self.A.dot(self.B), rtol=1e-12)
+        expected = {s.label: s.data for s in calculate_stats(matrices["C"])}
+        stats = {s.label: s.data for s in run_data.stats}
+        assert stats.keys() == expected.keys()
+        for label in expected:
+            assert_stat_close(stats[label], expected[label], rtol=1e-12)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.db_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+"""small_matrix_app.matrix_app.tests.test_cli.py
+Tests for the command line interface, python -m matrix_app
+"""
+import sys
+
+sys.path.insert(0, "..")
+import unittest
+
+import io
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+
+import numpy as np
+
+from matrix_app import cli
+
+# Repository root, so the subprocesses can import matrix_app
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_cli(*argv) -> (int, str):
+    """Exit status and output of one command, run in this process"""
+    out = io.StringIO()
+    with redirect_stdout(out), redirect_stderr(out):
+        status = cli.main(list(argv))
+    return status, out.getvalue()
+
+
+def imported_modules(*argv) -> list:
+    """Runs a command in a fresh interpreter, returns which of the heavy packages it imported"""
+    code = (
+        "import sys\n"
+        "from matrix_app import cli\n"
+        "cli.main(sys.argv[1:])\n"
+        "heavy = [m for m in ('PyQt5', 'numpy', 'h5py', 'scipy') if m in sys.modules]\n"
+        "print('imported: ' + ' '.join(heavy))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code] + list(argv),
+        cwd=ROOT,
+        stdout=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    )
+    return result.stdout.splitlines()[-1].split()[1:]
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_dir = os.path.join(self.tmp_dir, "SavedRuns")
+        rng = np.random.default_rng(0)
+        self.A = rng.integers(0, 101, size=(6, 4)).astype(float)
+        self.B = rng.integers(0, 101, size=(4, 5))
+        self.a_file = os.path.join(self.tmp_dir, "A.npy")
+        self.b_file = os.path.join(self.tmp_dir, "B.csv")
+        np.save(self.a_file, self.A)
+        np.savetxt(self.b_file, self.B, delimiter=",", fmt="%d")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_multiply_and_stats(self):
+        c_file = os.path.join(self.tmp_dir, "C.npy")
+        status, out = run_cli("multiply", self.a_file, self.b_file, "-o", c_file)
+        assert status == 0
+        assert out.startswith("C: 6 x 5 int32")
+        C = np.load(c_file)
+        np.testing.assert_array_equal(C, self.A.dot(self.B))
+
+        stats_dir = os.path.join(self.tmp_dir, "stats")
+        status, out = run_cli("stats", c_file, "-o", stats_dir, "--format", "csv")
+        assert status == 0
+        assert "Max across Matrix: " + str(C.max()) in out
+        assert len(os.listdir(stats_dir)) == 12
+        status, out = run_cli("stats", self.a_file, self.b_file)
+        assert "Minimum Value in Matrix: " + str(C.min()) in out
+
+    def test_save_list_load_export(self):
+        db = ["--db", self.db_dir]
+        status, out = run_cli("save", "Run1", self.a_file, self.b_file, *db)
+        assert status == 0 and "Stats saved: yes" in out
+        status, out = run_cli("save", "Run2", self.a_file, self.b_file, "--no-stats", *db)
+        assert status == 0
+        status, out = run_cli("save", "Run1", self.a_file, self.b_file, *db)
+        assert status == 1 and "already exists" in out
+
+        status, out = run_cli("list", *db)
+        assert [line.split()[0] for line in out.splitlines()] == ["Run1", "Run2"]
+        status, out = run_cli("list", "--contains", "2", "--json", *db)
+        record = json.loads(out)
+        assert record["name"] == "Run2" and record["shapes"]["C"] == [6, 5]
+
+        status, out = run_cli("load", "Run1", "--print", "C", *db)
+        assert status == 0
+        assert "A: 6 x 4 int8" in out
+        assert str(self.A.dot(self.B)[0, 0].astype(int)) in out
+        status, out = run_cli("load", "Missing", *db)
+        assert status == 1 and out.startswith("error:")
+
+        export_dir = os.path.join(self.tmp_dir, "export")
+        status, out = run_cli("export", "Run1", export_dir, *db)
+        assert status == 0
+        np.testing.assert_array_equal(np.load(os.path.join(export_dir, "A.npy")), self.A)
+        assert len(os.listdir(export_dir)) == 15
+
+    def test_list_rebuilds_a_missing_index(self):
+        run_cli("save", "Run1", self.a_file, self.b_file, "--db", self.db_dir)
+        os.remove(os.path.join(self.db_dir, ".run_index.sqlite"))
+        status, out = run_cli("list", "--db", self.db_dir)
+        assert status == 0 and out.startswith("Run1")
+        status, out = run_cli("list", "--db", os.path.join(self.tmp_dir, "Nothing"))
+        assert status == 0 and "No saved runs" in out
+
+    def test_commands_do_not_import_qt(self):
+        run_cli("save", "Run1", self.a_file, self.b_file, "--db", self.db_dir)
+        # The run index alone answers list
+        assert imported_modules("list", "--db", self.db_dir) == []
+        assert "PyQt5" not in imported_modules("multiply", self.a_file, self.b_file)
+        assert "PyQt5" not in imported_modules("load", "Run1", "--db", self.db_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
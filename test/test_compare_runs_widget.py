@@ -0,0 +1,67 @@
+"""small_matrix_app.matrix_app.tests.test_compare_runs_widget.py
+Tests for the Compare Runs Page
+"""
+import sys
+
+sys.path.insert(0, "..")
+import unittest
+
+import shutil
+import tempfile
+import numpy as np
+from PyQt5.QtCore import QItemSelectionModel
+from PyQt5.QtWidgets import QApplication
+
+from matrix_app.compare_runs_widget import CompareRunsPage
+from matrix_app.db_widget import DatabaseModel, DisplayData, RunData
+from matrix_app.saved_runs_widget import SavedRunsPage
+
+
+class TestCompareRunsPage(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication(sys.argv)
+
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.db = DatabaseModel(self.db_dir + "/SavedRuns")
+        for i in range(3):
+            A = np.full((2, 2), float(i + 1))
+            C = A.dot(np.eye(2))
+            matrices = [DisplayData("A", A), DisplayData("B", np.eye(2)), DisplayData("C", C)]
+            assert self.db.save_run(RunData("Run" + str(i), matrices, [])) is None
+
+    def test_compare_selected_runs(self):
+        saved_runs_page = SavedRunsPage(self.db, print)
+        selection = saved_runs_page.runs_view.selectionModel()
+        for row in (0, 2):
+            selection.select(
+                saved_runs_page.runs_model.index(row, 0),
+                QItemSelectionModel.Select | QItemSelectionModel.Rows,
+            )
+        assert saved_runs_page.selected_runs() == ["Run0", "Run2"]
+        saved_runs_page.close()
+
+        page = CompareRunsPage(self.db.aggregate_runs(["Run0", "Run2"]))
+        assert page.scalars_table.rowCount() == 3
+        header = page.scalars_table.verticalHeaderItem(2).text()
+        assert header == "Max across Matrix"
+        assert page.scalars_table.item(2, 1).text() == "2"  # mean of the maxes 1 and 3
+        np.testing.assert_array_equal(page.elementwise_data, np.full((2, 2), 2.0))
+        page.elementwise_box.setCurrentIndex(2)
+        np.testing.assert_array_equal(page.elementwise_data, np.full((2, 2), 3.0))
+        assert page.shape_box.currentText() == "2 x 2 (2 runs)"
+        page.close()
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.db_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app.quit()
+        cls.app = None
+
+
+if __name__ == "__main__":
+    unittest.main()
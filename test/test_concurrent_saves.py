@@ -0,0 +1,188 @@
+"""small_matrix_app.matrix_app.tests.test_concurrent_saves.py
+Stress tests for several processes and threads saving runs to one database directory
+"""
+import sys
+
+sys.path.insert(0, "..")
+import unittest
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+import h5py
+import numpy as np
+
+from matrix_app.db_widget import DatabaseModel, DisplayData, RunData
+from matrix_app.run_stores import TEMP_SUFFIX, SingleFileRunStore
+from matrix_app.stats_engine import calculate_stats
+
+WRITERS = 6
+RUNS = 30
+BATCH = 4
+
+
+def writer_run(run_name: str, writer: int) -> RunData:
+    """The run one writer saves under run_name. Every writer saves different data"""
+    rng = np.random.default_rng([writer, RUNS, len(run_name), int(run_name[3:])])
+    A = rng.integers(0, 101, size=(8, 4)).astype(float)
+    B = rng.integers(0, 101, size=(4, 6)).astype(float)
+    C = A.dot(B)
+    return RunData(
+        run_name,
+        [DisplayData("A", A), DisplayData("B", B), DisplayData("C", C)],
+        calculate_stats(C),
+        random=str(writer),
+    )
+
+
+def save_as_writer(db_name: str, writer: int) -> list:
+    """Worker process: saves every run in batches, in its own order. Returns the runs it won"""
+    db = DatabaseModel(db_name, cache_bytes=0)
+    names = ["Run" + str(i) for i in range(RUNS)]
+    names = names[writer:] + names[:writer]
+    won = []
+    try:
+        for b in range(0, RUNS, BATCH):
+            batch = [writer_run(name, writer) for name in names[b : b + BATCH]]
+            for run_data, err in zip(batch, db.save_runs(batch)):
+                if err is None:
+                    won.append(run_data.run_name)
+    finally:
+        db.close()
+    return won
+
+
+class TestConcurrentSaves(unittest.TestCase):
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.db_name = self.db_dir + "/SavedRuns"
+
+    def tearDown(self):
+        shutil.rmtree(self.db_dir)
+
+    def assert_one_winner_per_run(self, winners: dict):
+        db = DatabaseModel(self.db_name, cache_bytes=0)
+        try:
+            assert sorted(winners) == sorted("Run" + str(i) for i in range(RUNS))
+            for name, writer_list in winners.items():
+                assert len(writer_list) == 1, name + " saved by " + str(writer_list)
+                # The saved data and the index both come from the winner
+                loaded = db.load_run(name)
+                expected = writer_run(name, writer_list[0])
+                for got, want in zip(loaded.matrices, expected.matrices):
+                    np.testing.assert_array_equal(got.data, want.data)
+                assert db.run_summary(name).random == str(writer_list[0])
+            files = os.listdir(self.db_name)
+            assert [f for f in files if f.endswith(TEMP_SUFFIX)] == []
+            assert len([f for f in files if f.endswith(".h5")]) == RUNS
+            assert db.rebuild_index() == RUNS
+        finally:
+            db.close()
+
+    def test_writer_processes(self):
+        with ProcessPoolExecutor(max_workers=WRITERS) as pool:
+            results = list(
+                pool.map(save_as_writer, [self.db_name] * WRITERS, range(WRITERS))
+            )
+        winners = {}
+        for writer, won in enumerate(results):
+            for name in won:
+                winners.setdefault(name, []).append(writer)
+        self.assert_one_winner_per_run(winners)
+
+    def test_writer_threads(self):
+        db = DatabaseModel(self.db_name, cache_bytes=0)
+        winners = {}
+        lock = threading.Lock()
+
+        def save(writer):
+            names = ["Run" + str(i) for i in range(RUNS)]
+            for name in names[writer:] + names[:writer]:
+                if db.save_run(writer_run(name, writer)) is None:
+                    with lock:
+                        winners.setdefault(name, []).append(writer)
+
+        threads = [threading.Thread(target=save, args=(w,)) for w in range(WRITERS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        db.close()
+        self.assert_one_winner_per_run(winners)
+
+
+class TestAtomicSaves(unittest.TestCase):
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.db_name = self.db_dir + "/SavedRuns"
+
+    def tearDown(self):
+        shutil.rmtree(self.db_dir)
+
+    def test_failed_write_leaves_nothing(self):
+        db = DatabaseModel(self.db_name)
+        with self.assertRaises(RuntimeError):
+            with db.store.write("Broken.h5") as hdf:
+                hdf.create_dataset("x", data=np.arange(3))
+                assert os.listdir(self.db_name) != []
+                assert not db.store.exists("Broken.h5")
+                raise RuntimeError("crash while writing")
+        assert [f for f in os.listdir(self.db_name) if "Broken" in f] == []
+        db.close()
+
+    def test_taken_location_is_never_replaced(self):
+        db = DatabaseModel(self.db_name)
+        with h5py.File(self.db_name + "/Run2.h5", "w") as hdf:
+            hdf.attrs["writer"] = "other"
+        # As if another writer saved the run after the name was checked
+        db.store.exists = lambda location: False
+        err = db.save_run(writer_run("Run2", 0))
+        assert err is not None
+        with h5py.File(self.db_name + "/Run2.h5", "r") as hdf:
+            assert hdf.attrs["writer"] == "other"
+        assert [f for f in os.listdir(self.db_name) if f.endswith(TEMP_SUFFIX)] == []
+        db.close()
+
+    def test_group_commit(self):
+        db = DatabaseModel(self.db_name)
+        runs = [writer_run("Run" + str(i), 0) for i in range(5)]
+        runs.append(writer_run("Run2", 1))
+        errors = db.save_runs(runs)
+        assert errors[:5] == [None] * 5
+        assert errors[5] is not None
+        assert db.get_previous_runs() == ["Run" + str(i) for i in range(5)]
+        assert db.run_summary("Run2").random == "0"
+        db.close()
+
+    def test_stale_temp_files_are_removed_on_rebuild(self):
+        db = DatabaseModel(self.db_name)
+        stale = self.db_name + "/.Run1.h5.dead" + TEMP_SUFFIX
+        fresh = self.db_name + "/.Run2.h5.busy" + TEMP_SUFFIX
+        for f in (stale, fresh):
+            open(f, "wb").close()
+        old = time.time() - 2 * db.store.STALE_TEMP_SECONDS
+        os.utime(stale, (old, old))
+        assert db.rebuild_index() == 0
+        # A recent one may belong to a writer in another process
+        assert not os.path.exists(stale)
+        assert os.path.exists(fresh)
+        db.close()
+
+    def test_single_file_leftovers_are_removed_on_open(self):
+        db = DatabaseModel(self.db_name, backend=SingleFileRunStore)
+        assert db.save_run(writer_run("Run1", 0)) is None
+        db.store._runs.create_group(".dead" + TEMP_SUFFIX)
+        db.close()
+        db = DatabaseModel(self.db_name, backend=SingleFileRunStore)
+        assert list(db.store._runs.keys()) == ["Run1"]
+        assert db.rebuild_index() == 1
+        db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,6 +9,8 @@ sys.path.insert(0, "..")
 import random
 
 import unittest
+from unittest import mock
+
 from PyQt5 import QtCore
 from PyQt5.QtTest import QTest
 import numpy as np
@@ -16,7 +18,10 @@ from PyQt5.QtWidgets import QApplication
 
 # noinspection PyInterpreter
 from matrix_app.db_widget import DisplayData, DatabaseModel, RunData
-from matrix_app.display_stats_widget import DisplayStatsPage
+from matrix_app.display_stats_widget import DisplayStatsPage, TableModel
+from matrix_app.job_scheduler import JobScheduler
+from matrix_app.sparse_matrices import sparse
+from matrix_app.stats_engine import calculate_stats
 
 
 class TestDisplayStats(unittest.TestCase):
@@ -51,6 +56,72 @@ class TestDisplayStats(unittest.TestCase):
         assert self.dsp.data_display_layout.count() is not None
         assert self.dsp.calculate_current_stats_button.isHidden()
 
+    def test_calculate_in_background(self):
+        """With a scheduler the stats are calculated off the GUI thread and shown when done"""
+        scheduler = JobScheduler()
+        dsp = DisplayStatsPage(matrices=[self.A, self.B, self.C], scheduler=scheduler)
+        dsp.onCalculate()
+        assert not dsp.calculate_current_stats_button.isEnabled()
+        scheduler.wait_for_done()
+        QApplication.processEvents()
+        assert len(dsp.display_data) == 12
+        assert dsp.calculate_current_stats_button.isHidden()
+        dsp.close()
+
+    def test_product_multiplied_in_background(self):
+        """Without C the product is taken by the scheduler, never on the GUI thread"""
+        scheduler = JobScheduler()
+        dsp = DisplayStatsPage(matrices=[self.A, self.B], scheduler=scheduler)
+        with mock.patch("matrix_app.display_stats_widget.multiply") as inline_multiply:
+            dsp.onCalculate()
+            # The multiply job, then the stats job it hands C to
+            for _ in range(2):
+                scheduler.wait_for_done()
+                QApplication.processEvents()
+        assert inline_multiply.call_count == 0
+        assert len(dsp.display_data) == 12
+        expected = calculate_stats(self.A.data.dot(self.B.data))
+        np.testing.assert_array_equal(dsp.display_data[0].data, expected[0].data)
+        dsp.close()
+
+    def test_table_model_wraps_arrays(self):
+        """TableModel reads straight from scalars, 1-d and 2-d arrays"""
+        scalar = TableModel(np.float64(2.5))
+        assert (scalar.rowCount(None), scalar.columnCount(None)) == (1, 1)
+        assert scalar.data(scalar.index(0, 0), QtCore.Qt.DisplayRole) == "2.5"
+
+        row = TableModel(np.arange(4))
+        assert (row.rowCount(None), row.columnCount(None)) == (1, 4)
+        assert row.data(row.index(0, 3), QtCore.Qt.DisplayRole) == "3"
+
+        big = np.zeros((3000, 3000))
+        big[2999, 1] = 7.25
+        table = TableModel(big, cache_size=100)
+        assert (table.rowCount(None), table.columnCount(None)) == (3000, 3000)
+        assert table.data(table.index(2999, 1), QtCore.Qt.DisplayRole) == "7.25"
+
+        logs = np.zeros(3, dtype=[("sign", np.int8), ("log10", np.float64)])
+        logs["sign"] = [1, -1, 0]
+        logs["log10"] = [400.5, 336.25, -np.inf]
+        log_row = TableModel(logs)
+        shown = [log_row.data(log_row.index(0, c), QtCore.Qt.DisplayRole) for c in range(3)]
+        assert shown == ["10^400.5", "-10^336.25", "0"]
+
+        if sparse is not None:
+            matrix = sparse.csc_matrix(big)
+            table = TableModel(matrix)
+            assert (table.rowCount(None), table.columnCount(None)) == (3000, 3000)
+            assert table.data(table.index(2999, 1), QtCore.Qt.DisplayRole) == "7.25"
+            assert table.data(table.index(5, 5), QtCore.Qt.DisplayRole) == "0"
+
+    def test_table_model_cache_is_bounded(self):
+        """Formatted cells are cached, evicting the least recently used"""
+        table = TableModel(np.arange(100).reshape(10, 10), cache_size=5)
+        for c in range(10):
+            assert table.data(table.index(0, c), QtCore.Qt.DisplayRole) == str(c)
+        assert len(table._cache) == 5
+        assert (0, 9) in table._cache and (0, 0) not in table._cache
+
     @classmethod
     def tearDownClass(self):
         self.dsp.close()
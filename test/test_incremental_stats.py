@@ -0,0 +1,81 @@
+"""small_matrix_app.matrix_app.tests.test_incremental_stats.py
+Tests for the incremental stats engine
+"""
+import sys
+
+sys.path.insert(0, "..")
+import unittest
+
+import numpy as np
+
+from matrix_app.incremental_stats import IncrementalStats
+
+
+def assert_same_summary(live, C):
+    """min, mean and max of the live stats match those of C"""
+    np.testing.assert_allclose(live.summary(), [C.min(), C.mean(), C.max()], rtol=1e-9)
+
+
+class TestIncrementalStats(unittest.TestCase):
+    def test_cell_edits_match_full_recompute(self):
+        rng = np.random.default_rng(4)
+        for A, B in (
+            (rng.random((23, 6)) + 0.5, rng.random((6, 17)) + 0.5),
+            (rng.integers(-3, 4, size=(9, 5)), rng.integers(-3, 4, size=(5, 12))),
+        ):
+            live = IncrementalStats(A, B)
+            for edit in range(200):
+                if edit % 2 == 0:
+                    i, k = rng.integers(A.shape[0]), rng.integers(A.shape[1])
+                    A[i, k] = rng.integers(-3, 4)
+                    live.set_a(i, k, A[i, k])
+                else:
+                    k, j = rng.integers(B.shape[0]), rng.integers(B.shape[1])
+                    B[k, j] = rng.integers(-3, 4)
+                    live.set_b(k, j, B[k, j])
+                if edit % 25 == 0:
+                    assert_same_summary(live, A.dot(B))
+            np.testing.assert_allclose(live.C, A.dot(B))
+            assert_same_summary(live, A.dot(B))
+
+    def test_block_edits(self):
+        rng = np.random.default_rng(5)
+        A, B = rng.random((10, 4)), rng.random((4, 8))
+        live = IncrementalStats(A, B)
+        A[2:5] = rng.random((3, 4))
+        live.set_a_block(2, 0, A[2:5])
+        B[1:3, 5:8] = rng.random((2, 3))
+        live.set_b_block(1, 5, B[1:3, 5:8])
+        np.testing.assert_allclose(live.C, A.dot(B))
+        assert_same_summary(live, A.dot(B))
+
+    def test_float_edits_are_recomputed_eventually(self):
+        live = IncrementalStats(np.ones((3, 3)), np.ones((3, 3)))
+        live.RECOMPUTE_AFTER = 5
+        for v in range(6):
+            live.set_a(0, 0, v + 0.1)
+        assert live.edits < 5
+        np.testing.assert_allclose(live.C, live.A.dot(live.B))
+
+    def test_edits_past_the_input_dtype(self):
+        """Narrow integer inputs do not make C wrap around once edits grow it"""
+        A = np.full((2, 2), 100, dtype=np.int8)
+        B = np.ones((2, 2), dtype=np.int8)
+        live = IncrementalStats(A, B)
+        assert live.C.dtype == np.int64
+        live.set_b(0, 0, 100)
+        assert live.C[0, 0] == 10100
+        live.set_a(1, 0, 1000)
+        assert live.A[1, 0] == 1000
+        expected = live.A.dot(live.B)
+        np.testing.assert_array_equal(live.C, expected)
+        assert live.summary()[2] == expected.max()
+        assert IncrementalStats(A.astype(np.float32), B).C.dtype == np.float64
+
+    def test_misaligned_shapes_raise(self):
+        with self.assertRaises(ValueError):
+            IncrementalStats(np.ones((2, 3)), np.ones((2, 3)))
+
+
+if __name__ == "__main__":
+    unittest.main()
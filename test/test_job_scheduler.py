@@ -0,0 +1,157 @@
+"""small_matrix_app.matrix_app.tests.test_job_scheduler.py
+Tests for the background jobs, including how responsive the event loop stays while they run
+"""
+import sys
+
+sys.path.insert(0, "..")
+import unittest
+
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+import numpy as np
+
+from PyQt5.QtCore import QEventLoop, QThread, QTimer
+from PyQt5.QtWidgets import QApplication
+
+from matrix_app.db_widget import DatabaseModel, DisplayData, RunData
+from matrix_app import job_scheduler
+from matrix_app.job_scheduler import Job, JobScheduler
+from matrix_app.stats_engine import calculate_stats
+
+
+class Recorder:
+    """Records the signals of a job, see JobScheduler.submit"""
+
+    def __init__(self):
+        self.emitted = {"progress": [], "finished": [], "failed": [], "cancelled": []}
+        self.loop = QEventLoop()
+        self.slots = {
+            "progress": lambda d, t: self.emitted["progress"].append((d, t)),
+            "finished": lambda r: self._done("finished", r),
+            "failed": lambda e: self._done("failed", e),
+            "cancelled": lambda: self._done("cancelled", True),
+        }
+
+    def _done(self, name: str, value):
+        self.emitted[name].append(value)
+        self.loop.quit()
+
+    def wait(self, job: Job, timeout_ms: int = 60000) -> dict:
+        """Spins the event loop until job is done. Returns the signals the job emitted"""
+        QTimer.singleShot(timeout_ms, self.loop.quit)
+        if not (self.emitted["finished"] or self.emitted["failed"] or self.emitted["cancelled"]):
+            self.loop.exec_()
+        return self.emitted
+
+
+class TestJobScheduler(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication(sys.argv)
+
+    def setUp(self):
+        self.scheduler = JobScheduler()
+
+    def test_results_arrive_on_gui_thread(self):
+        rng = np.random.default_rng(0)
+        A = rng.random((300, 200))
+        B = rng.random((200, 100))
+        threads = []
+        recorder = Recorder()
+        recorder.slots["finished"] = lambda r: (
+            threads.append(QThread.currentThread()),
+            recorder._done("finished", r),
+        )
+        emitted = recorder.wait(self.scheduler.multiply(A, B, **recorder.slots))
+        np.testing.assert_allclose(emitted["finished"][0], A.dot(B))
+        assert threads == [self.app.thread()]
+        # Small enough for a single multiply
+        assert emitted["progress"] == [(0, 1), (1, 1)]
+        assert self.scheduler.pending_jobs() == 0
+
+    def test_large_products_run_in_panels(self):
+        rng = np.random.default_rng(0)
+        A = rng.random((300, 200))
+        B = rng.random((200, 100))
+        recorder = Recorder()
+        with mock.patch.object(job_scheduler, "PANEL_MEMORY", 100 * 1024):
+            emitted = recorder.wait(self.scheduler.multiply(A, B, **recorder.slots))
+        np.testing.assert_allclose(emitted["finished"][0], A.dot(B))
+        assert len(emitted["progress"]) > 2
+        assert emitted["progress"][-1] == (300, 300)
+
+    def test_event_loop_stays_responsive(self):
+        """The largest gap between timer ticks while a large stats job runs stays small"""
+        C = np.random.default_rng(1).random((3000, 3000))
+        ticks = []
+        timer = QTimer()
+        timer.timeout.connect(lambda: ticks.append(time.perf_counter()))
+        timer.start(5)
+        recorder = Recorder()
+        emitted = recorder.wait(self.scheduler.calculate_stats(C, **recorder.slots))
+        timer.stop()
+        assert len(emitted["finished"]) == 1
+        assert len(emitted["finished"][0]) == 12
+        assert len(ticks) > 10
+        latency = max(np.diff(ticks))
+        assert latency < 0.25, "event loop blocked for " + str(latency) + "s"
+
+    def test_cancel_running_job(self):
+        C = np.random.default_rng(2).random((3000, 3000))
+        recorder = Recorder()
+        jobs = []
+        recorder.slots["progress"] = lambda d, t: self.scheduler.cancel(jobs[0])
+        jobs.append(self.scheduler.calculate_stats(C, **recorder.slots))
+        emitted = recorder.wait(jobs[0])
+        assert emitted["cancelled"] == [True]
+        assert emitted["finished"] == []
+        assert self.scheduler.pending_jobs() == 0
+
+    def test_cancel_queued_job(self):
+        db_dir = tempfile.mkdtemp()
+        db = DatabaseModel(db_dir + "/SavedRuns")
+        C = np.ones((4, 4))
+        first, second = Recorder(), Recorder()
+        first_job = self.scheduler.save_run(
+            db, RunData("First", [DisplayData("C", C)], calculate_stats(C)), **first.slots
+        )
+        # Saves share one thread, so the second save waits behind the first
+        second_job = self.scheduler.save_run(
+            db, RunData("Second", [DisplayData("C", C)], []), **second.slots
+        )
+        self.scheduler.cancel(second_job)
+        assert first.wait(first_job)["finished"] == [None]
+        assert second.wait(second_job)["cancelled"] == [True]
+        self.scheduler.wait_for_done()
+        assert db.get_previous_runs() == ["First"]
+
+        load = Recorder()
+        loaded = load.wait(self.scheduler.load_run(db, "First", **load.slots))
+        assert len(loaded["finished"][0].stats) == 12
+        db.close()
+        shutil.rmtree(db_dir)
+
+    def test_failures_are_reported(self):
+        recorder = Recorder()
+        emitted = recorder.wait(
+            self.scheduler.multiply(np.ones((2, 3)), np.ones((2, 3)), **recorder.slots)
+        )
+        assert len(emitted["failed"]) == 1
+        assert "not aligned" in emitted["failed"][0]
+
+    def tearDown(self):
+        self.scheduler.cancel_all()
+        self.scheduler.wait_for_done()
+        self.scheduler = None
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app.quit()
+        cls.app = None
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+"""small_matrix_app.matrix_app.tests.test_lazy_loading.py
+Tests for lazily loaded, memory mapped runs
+"""
+import sys
+
+sys.path.insert(0, "..")
+import unittest
+
+import shutil
+import tempfile
+import numpy as np
+
+from matrix_app.db_widget import DatabaseModel, DisplayData, RunData
+from matrix_app.stats_engine import calculate_stats
+from matrix_app.storage_profiles import PROFILES
+
+
+class TestLazyLoading(unittest.TestCase):
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.db = DatabaseModel(self.db_dir + "/SavedRuns")
+        rng = np.random.default_rng(1)
+        self.A = rng.random((20, 6))
+        self.B = rng.random((6, 9))
+        C = self.A.dot(self.B)
+        run_data = RunData(
+            "Eager",
+            [DisplayData("A", self.A), DisplayData("B", self.B), DisplayData("C", C)],
+            calculate_stats(C),
+        )
+        assert self.db.save_run(run_data) is None
+
+    def test_lazy_run_matches_eager_run(self):
+        eager = self.db.load_run("Eager")
+        lazy = self.db.load_run("Eager", lazy=True)
+        assert not any(d.is_loaded() for d in lazy.matrices + lazy.stats)
+
+        eager_data = {d.label: d.data for d in eager.matrices + eager.stats}
+        assert len(lazy.matrices + lazy.stats) == len(eager_data)
+        for l in lazy.matrices + lazy.stats:
+            np.testing.assert_array_equal(eager_data[l.label], l.data)
+            assert l.is_loaded()
+
+    def test_contiguous_datasets_are_memory_mapped(self):
+        lazy = self.db.load_run("Eager", lazy=True)
+        matrices = {m.label: m for m in lazy.matrices}
+        assert isinstance(matrices["C"].data, np.memmap)
+        # Untouched matrices are never read
+        assert not matrices["A"].is_loaded()
+        scalars = [s for s in lazy.stats if s.label == "Max across Matrix"]
+        assert not isinstance(scalars[0].data, np.memmap)
+
+    def test_chunked_datasets_are_read(self):
+        """Chunked datasets cannot be memory mapped and are read on first access"""
+        self.db.storage_profile = PROFILES["rows_gzip"]
+        with self.db.open_run_matrix("Eager", "A") as a:
+            with self.db.open_run_matrix("Eager", "B") as b:
+                assert self.db.save_run_out_of_core("Chunked", a, b) is None
+        lazy = self.db.load_run("Chunked", lazy=True)
+        C = [m for m in lazy.matrices if m.label == "C"][0].data
+        assert not isinstance(C, np.memmap)
+        np.testing.assert_allclose(C, self.A.dot(self.B), rtol=1e-12)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.db_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,6 +4,7 @@ Tests for Matrix Entry
 import random
 import string
 import sys
+import time
 
 sys.path.insert(0, "..")
 
@@ -14,6 +15,7 @@ from PyQt5.QtWidgets import QApplication
 import unittest
 
 from matrix_app.db_widget import DisplayData, DatabaseModel, RunData
+from matrix_app.job_scheduler import JobScheduler
 from matrix_app.matrix_entry_widget import MatrixEntryPage
 
 
@@ -39,30 +41,154 @@ class TestMatrixEntry(unittest.TestCase):
         left_table = self.mep.matrix_entry_left
         right_table = self.mep.matrix_entry_right
         left_size = (
-            left_table.matrix_grid_widget.rowCount(),
-            left_table.matrix_grid_widget.columnCount(),
+            left_table.matrix_model.rowCount(),
+            left_table.matrix_model.columnCount(),
         )
         right_size = (
-            right_table.matrix_grid_widget.rowCount(),
-            right_table.matrix_grid_widget.columnCount(),
+            right_table.matrix_model.rowCount(),
+            right_table.matrix_model.columnCount(),
         )
 
         assert left_size[1] == right_size[0]
         for r in range(left_size[0]):
             for c in range(left_size[1]):
-                item = left_table.matrix_grid_widget.item(r, c)
-                value = float(item.text())
+                index = left_table.matrix_model.index(r, c)
+                value = float(left_table.matrix_model.data(index))
                 assert isinstance(value, float)
 
         for r in range(right_size[0]):
             for c in range(right_size[1]):
-                item = right_table.matrix_grid_widget.item(r, c)
-                value = float(item.text())
+                index = right_table.matrix_model.index(r, c)
+                value = float(right_table.matrix_model.data(index))
                 assert isinstance(value, float)
 
         assert not right_table.matrix_grid_widget.isHidden()
         assert not left_table.matrix_grid_widget.isHidden()
 
+    def test_seeded_random_matrices(self) -> None:
+        self.mep.random_dtype_box.setCurrentText("int8")
+        self.mep.random_seed_box.setText("1234")
+        self.mep._create_random_matrix()
+        first, err = self.mep.entered_matrices()
+        assert err is None
+        assert first[0].data.dtype == np.int8
+        assert self.mep.random_seed_label.text() == "Seed: 1234"
+        self.mep._create_random_matrix()
+        second, err = self.mep.entered_matrices()
+        for f, s in zip(first, second):
+            np.testing.assert_array_equal(f.data, s.data)
+
+        # An edit means the entries are no longer what the seed generates
+        self.mep.matrix_entry_left.paste_text("7", 0, 0)
+        assert self.mep.generator is None
+        self.mep.random_seed_box.setText("")
+        self.mep.random_dtype_box.setCurrentText("float64")
+
+    def test_live_stats_follow_edits(self) -> None:
+        self.mep.matrix_entry_left.set_matrix(self.A.data)
+        self.mep.matrix_entry_right.set_matrix(self.B.data)
+        self.mep.live_stats_box.setChecked(True)
+        np.testing.assert_array_equal(self.mep.live_product(), self.C.data)
+
+        model = self.mep.matrix_entry_left.matrix_model
+        model.setData(model.index(1, 2), "7")
+        A = self.A.data.copy()
+        A[1, 2] = 7
+        np.testing.assert_array_equal(self.mep.live_product(), A.dot(self.B.data))
+        assert "max " + str(A.dot(self.B.data).max()) in self.mep.live_stats_label.text()
+
+        # An empty cell pauses the live stats until it is filled in again
+        model.setData(model.index(0, 0), "")
+        assert self.mep.live_product() is None
+        model.setData(model.index(0, 0), "1")
+        np.testing.assert_array_equal(self.mep.live_product(), A.dot(self.B.data))
+        self.mep.live_stats_box.setChecked(False)
+        assert self.mep.live_product() is None
+
+    def test_integers_past_2_53_are_rejected(self) -> None:
+        entry = self.mep.matrix_entry_left
+        entry.set_matrix(np.array([[1, 2], [3, 4]]))
+        model = entry.matrix_model
+        # Would be rounded to 2**53 in the float64 cells
+        model.setData(model.index(1, 0), str(2 ** 53 + 1))
+        matrix, fm = entry.return_matrix()
+        assert "2**53" in str(fm) and "row 2, column 1" in str(fm)
+        model.setData(model.index(1, 0), str(2 ** 53 - 1))
+        matrix, fm = entry.return_matrix()
+        assert fm is None
+        assert matrix.dtype == np.int64 and matrix[1, 0] == 2 ** 53 - 1
+
+    def test_live_stats_in_background(self) -> None:
+        scheduler = JobScheduler()
+        page = MatrixEntryPage(scheduler=scheduler)
+        page.matrix_entry_left.set_matrix(self.A.data)
+        page.matrix_entry_right.set_matrix(self.B.data)
+        page.live_stats_box.setChecked(True)
+        # The product is not computed on the GUI thread, so the live stats start once it arrives
+        assert page.live_product() is None
+        assert page.live_stats_label.text() == "Calculating Matrix1 x Matrix2..."
+        scheduler.wait_for_done()
+        QApplication.processEvents()
+        np.testing.assert_array_equal(page.live_product(), self.C.data)
+
+        # A product of matrices that were replaced meanwhile is dropped
+        page.matrix_entry_left.set_matrix(2 * self.A.data)
+        page.matrix_entry_right.set_matrix(self.B.data[:, :1])
+        scheduler.wait_for_done()
+        QApplication.processEvents()
+        np.testing.assert_array_equal(page.live_product(), self.C.data[:, :1] * 2)
+        page.close()
+
+    def test_large_matrices_calculate(self) -> None:
+        """Dimensions past the old 10x10 ceiling go from entry to product without Python lists"""
+        self.mep.matrix_entry_left.randomize_self(1500, 1200)
+        self.mep.matrix_entry_right.randomize_self(1200, 1000)
+        dd, err = self.mep.calculate_matrix()
+        assert err is None
+        assert dd[2].data.shape == (1500, 1000)
+        # Entries 0 to 100 are entered as int8, and their product cannot overflow
+        assert dd[0].data.dtype == np.int8
+        assert dd[2].data.dtype == np.int32
+        np.testing.assert_array_equal(
+            dd[2].data, dd[0].data.astype(np.int64).dot(dd[1].data)
+        )
+
+    def test_empty_entry_fails(self) -> None:
+        self.mep.matrix_entry_left.resize_self(3, 3)
+        matrix, err = self.mep.matrix_entry_left.return_matrix()
+        assert err is not None
+        model = self.mep.matrix_entry_left.matrix_model
+        for r in range(3):
+            for c in range(3):
+                assert model.setData(model.index(r, c), str(r + c))
+        assert not model.setData(model.index(0, 0), "fish")
+        matrix, err = self.mep.matrix_entry_left.return_matrix()
+        assert err is None
+        np.testing.assert_array_equal(matrix, np.add.outer(range(3), range(3)))
+
+    def test_paste_and_bulk_fill(self) -> None:
+        """Pasted blocks land at the current cell and grow the matrix, bad cells are named"""
+        entry = self.mep.matrix_entry_left
+        entry.resize_self(2, 2)
+        assert entry.paste_text("1\t2\n3\t4\n", 1, 1) is None
+        matrix = entry.matrix_model.array()
+        assert matrix.shape == (3, 3)
+        np.testing.assert_array_equal(matrix[1:, 1:], [[1, 2], [3, 4]])
+        matrix, err = entry.return_matrix()
+        assert "row 1, column 1" in str(err)
+        assert entry.paste_text("1,2,3\n4,5,6\n7,8,9") is None
+        matrix, err = entry.return_matrix()
+        assert err is None and matrix.sum() == 45
+        assert entry.paste_text("1,x") is not None
+
+        big = np.random.default_rng(0).integers(0, 101, size=(2000, 2000))
+        start = time.perf_counter()
+        entry.set_matrix(big)
+        matrix, err = entry.return_matrix()
+        assert err is None
+        assert time.perf_counter() - start < 1
+        np.testing.assert_array_equal(matrix, big)
+
     @classmethod
     def tearDownClass(cls):
         cls.mep.close()
@@ -0,0 +1,99 @@
+"""small_matrix_app.matrix_app.tests.test_matrix_io.py
+Tests for pasting, importing and validating whole matrices
+"""
+import sys
+
+sys.path.insert(0, "..")
+import unittest
+
+import shutil
+import tempfile
+import h5py
+import numpy as np
+
+from matrix_app.log_cumprod import CUMPROD_LOG_DTYPE
+from matrix_app.matrix_io import (
+    find_invalid_cell,
+    load_matrix_file,
+    parse_delimited,
+    save_matrix_file,
+)
+
+
+class TestMatrixIO(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.matrix = np.arange(12, dtype=float).reshape(3, 4) / 4
+
+    def test_parse_spreadsheet_blocks(self):
+        tsv = "1\t2\t3\r\n4\t\t6\r\n"
+        np.testing.assert_array_equal(
+            parse_delimited(tsv), [[1, 2, 3], [4, np.nan, 6]]
+        )
+        np.testing.assert_array_equal(parse_delimited("1, 2\n3"), [[1, 2], [3, np.nan]])
+        np.testing.assert_array_equal(parse_delimited("1e3 -2.5\n"), [[1000, -2.5]])
+        with self.assertRaises(ValueError) as context:
+            parse_delimited("1,2\n3,fish")
+        assert "row 2, column 2" in str(context.exception)
+
+    def test_load_every_format(self):
+        np.save(self.tmp_dir + "/m.npy", self.matrix)
+        np.savetxt(self.tmp_dir + "/m.csv", self.matrix, delimiter=",")
+        with h5py.File(self.tmp_dir + "/m.h5", "w") as hdf:
+            hdf.create_dataset("matrices/A", data=self.matrix)
+            hdf.create_dataset("matrices/B", data=self.matrix.T)
+        for name in ("m.npy", "m.csv", "m.h5"):
+            np.testing.assert_array_equal(
+                load_matrix_file(self.tmp_dir + "/" + name), self.matrix
+            )
+        np.testing.assert_array_equal(
+            load_matrix_file(self.tmp_dir + "/m.h5", "matrices/B"), self.matrix.T
+        )
+        with self.assertRaises(ValueError):
+            load_matrix_file(self.tmp_dir + "/m.txt")
+
+    def test_save_every_format(self):
+        for extension in (".npy", ".csv"):
+            file_name = self.tmp_dir + "/m" + extension
+            save_matrix_file(file_name, self.matrix)
+            np.testing.assert_array_equal(load_matrix_file(file_name), self.matrix)
+        save_matrix_file(self.tmp_dir + "/ints.csv", np.array([[1, -2], [3, 4]]))
+        with open(self.tmp_dir + "/ints.csv") as f:
+            assert f.read() == "1,-2\n3,4\n"
+        logs = np.zeros(2, dtype=CUMPROD_LOG_DTYPE)
+        logs["sign"] = [-1, 0]
+        logs["log10"] = [336.25, -np.inf]
+        save_matrix_file(self.tmp_dir + "/logs.csv", logs)
+        with open(self.tmp_dir + "/logs.csv") as f:
+            assert f.read() == "-10^336.25,0\n"
+        with self.assertRaises(ValueError):
+            save_matrix_file(self.tmp_dir + "/m.h5", self.matrix)
+
+    def test_first_invalid_cell(self):
+        assert find_invalid_cell(self.matrix) is None
+        bad = self.matrix.copy()
+        bad[2, 0] = np.nan
+        bad[1, 3] = 1e300
+        row, col, reason = find_invalid_cell(bad)
+        assert (row, col) == (1, 3)
+        assert "between" in reason
+        bad[0, 1] = np.nan
+        assert find_invalid_cell(bad)[:2] == (0, 1)
+        assert "Empty" in find_invalid_cell(bad)[2]
+
+        # float64 cells hold integers exactly up to 2**53
+        exact = np.array([[2.0 ** 53 - 1, -(2.0 ** 53) + 1]])
+        assert find_invalid_cell(exact) is None
+        exact[0, 1] -= 1
+        assert find_invalid_cell(exact)[:2] == (0, 1)
+        big = np.array([[1, 2 ** 53]], dtype=np.int64)
+        np.save(self.tmp_dir + "/big.npy", big)
+        with self.assertRaises(ValueError):
+            load_matrix_file(self.tmp_dir + "/big.npy")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""small_matrix_app.matrix_app.tests.test_narrow_dtypes.py
+Tests for narrow dtypes and overflow safe products
+"""
+import sys
+
+sys.path.insert(0, "..")
+import unittest
+
+import numpy as np
+
+from matrix_app.blocked_multiply import blocked_multiply
+from matrix_app.narrow_dtypes import narrow, narrowest_dtype, product_dtypes
+from matrix_app.sparse_matrices import sparse
+from matrix_app.stats_engine import calculate_stats, multiply
+
+
+class TestNarrowDtypes(unittest.TestCase):
+    def test_narrowest_dtype(self):
+        assert narrowest_dtype(np.array([0.0, 100.0])) == np.int8
+        assert narrowest_dtype(np.array([-129.0, 5.0])) == np.int16
+        assert narrowest_dtype(np.array([2.0 ** 40])) == np.int64
+        assert narrowest_dtype(np.array([1.5, 2.25, np.nan])) == np.float32
+        assert narrowest_dtype(np.array([0.1])) == np.float64
+        # A whole number past int64 that float32 rounds
+        assert narrowest_dtype(np.array([1e20])) == np.float64
+        assert narrowest_dtype(np.array([1, 2], dtype=np.int64)) == np.int8
+        assert narrowest_dtype(np.array([1, 200], dtype=np.uint8)) == np.uint8
+        assert narrowest_dtype(np.array([True])) == np.bool_
+        assert narrowest_dtype(np.empty((0, 3))) == np.float64
+        A = np.arange(12.0).reshape(3, 4)
+        np.testing.assert_array_equal(narrow(A), A)
+        assert narrow(A).dtype == np.int8
+        if sparse is not None:
+            assert narrow(sparse.csr_matrix(A)).dtype == np.int8
+
+    def test_product_dtypes(self):
+        small = np.full((3, 10), 100, dtype=np.int8)
+        # 10 * 100 * 100 fits in int32, and is exact in float32
+        assert product_dtypes(small, small.T) == (np.float32, np.int32)
+        medium = np.full((3, 10), 2 ** 20, dtype=np.int64)
+        assert product_dtypes(medium, medium.T) == (np.float64, np.int64)
+        # Past 2 ** 53 float64 is not exact anymore
+        big = np.full((3, 10), 2 ** 25, dtype=np.int64)
+        assert product_dtypes(big, big.T) == (np.int64, np.int64)
+        huge = np.full((3, 10), 2 ** 40, dtype=np.int64)
+        assert product_dtypes(huge, huge.T) == (np.float64, np.float64)
+        floats = np.full((3, 10), 1e30, dtype=np.float32)
+        assert product_dtypes(floats, floats.T) == (np.float64, np.float64)
+        assert product_dtypes(floats / 1e30, floats.T / 1e30) == (np.float32, np.float32)
+
+    def test_products_do_not_overflow(self):
+        rng = np.random.default_rng(0)
+        for low, high, dtype in (
+            (-128, 127, np.int8),
+            (-2 ** 20, 2 ** 20, np.int32),
+            (-2 ** 26, 2 ** 26, np.int64),
+        ):
+            A = rng.integers(low, high, size=(30, 200), dtype=dtype, endpoint=True)
+            B = rng.integers(low, high, size=(200, 20), dtype=dtype, endpoint=True)
+            exact = A.astype(object).dot(B.astype(object))
+            C = multiply(A, B)
+            assert C.dtype.kind == "i"
+            assert (C.astype(object) == exact).all()
+            np.testing.assert_array_equal(blocked_multiply(A, B, memory_limit=4096), C)
+        # Past int64 the product is rounded instead of wrapping around
+        A = np.full((2, 4), 2 ** 40, dtype=np.int64)
+        C = multiply(A, A.T)
+        assert C.dtype == np.float64
+        assert C[0, 0] == 4.0 * 2 ** 80
+
+    def test_stats_accumulate_in_float64(self):
+        C = np.full((100, 100), 2 ** 20, dtype=np.float32) + np.float32(0.5)
+        stats = calculate_stats(C)
+        assert stats[2].data.dtype == np.float64
+        assert stats[2].data == 2 ** 20 + 0.5
+        assert stats[1].data.dtype == np.float32
+
+
+if __name__ == "__main__":
+    unittest.main()
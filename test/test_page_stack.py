@@ -0,0 +1,162 @@
+"""small_matrix_app.matrix_app.tests.test_page_stack.py
+Tests for the pages of the main window being built once and reused
+"""
+import sys
+
+sys.path.insert(0, "..")
+import unittest
+
+import shutil
+import tempfile
+from unittest import mock
+
+import numpy as np
+from PyQt5.QtWidgets import QApplication
+
+from matrix_app.db_widget import DisplayData, RunData
+from matrix_app.display_stats_widget import DatumDisplay, DisplayStatsPage
+from matrix_app.job_scheduler import JobScheduler
+from matrix_app.main_window import Window
+from matrix_app.narrow_dtypes import product_dtypes
+
+
+def run(name: str, size: int) -> RunData:
+    A = np.arange(size * size, dtype=float).reshape(size, size)
+    matrices = [DisplayData("A", A), DisplayData("B", np.eye(size)), DisplayData("C", A)]
+    stats = [DisplayData("min", A.min()), DisplayData("max", A.max())]
+    return RunData(name, matrices, stats)
+
+
+class TestPageStack(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication(sys.argv)
+
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.win = Window(db_name=self.db_dir + "/SavedRuns")
+
+    def tearDown(self):
+        db = self.win.data_run_model
+        self.win.close()
+        db.close()
+        shutil.rmtree(self.db_dir)
+
+    def test_pages_are_built_once(self):
+        win = self.win
+        assert win.pages.currentWidget() is win.home_screen_page
+        assert win.pages.built == 1
+        win.home_screen_page.saved_runs_button.click()
+        saved_runs_page = win.saved_runs_page
+        assert win.pages.currentWidget() is saved_runs_page
+        assert saved_runs_page.runs_model.rowCount() == 0
+
+        # Saved while the page is hidden, listed once it is shown again
+        assert win.data_run_model.save_run(run("Run1", 3)) is None
+        win._display_home_screen_page()
+        win._display_saved_runs_page()
+        assert win.saved_runs_page is saved_runs_page
+        assert saved_runs_page.runs_model.run_name(0) == "Run1"
+
+        win._display_matrix_entry()
+        win._display_home_screen_page()
+        win._display_matrix_entry()
+        assert win.pages.built == 3
+        assert win.pages.count() == 3
+
+    def test_matrix_entry_is_cleared_when_left(self):
+        win = self.win
+        win._display_matrix_entry()
+        entry_page = win.matrix_entry_page
+        entry_page.matrix_entry_left.set_matrix(np.ones((6, 2)))
+        entry_page.submission_box_left.sp1.setValue(6)
+        win._display_home_screen_page()
+        win.home_screen_page.create_run_button.click()
+        assert win.matrix_entry_page is entry_page
+        array = entry_page.matrix_entry_left.matrix_model.array()
+        assert array.shape == (4, 4) and np.isnan(array).all()
+        assert entry_page.submission_box_left.get_dimensions() == (4, 4)
+
+    def test_display_stats_reuses_its_tables(self):
+        win = self.win
+        win._display_display_stats_page(run_data=run("Run1", 3))
+        page = win.display_stats_page
+        displays = page.findChildren(DatumDisplay)
+        assert len(displays) == 5
+        assert page.save_button.isHidden()
+
+        win._display_home_screen_page()
+        # Left pages let go of their data
+        assert page.matrices == [] and page.run_data is None
+        assert all(d.model.cell_count() == 0 for d in displays)
+
+        A = np.ones((2, 2))
+        win._display_display_stats_page(
+            matrices=[DisplayData("A", A), DisplayData("B", A), DisplayData("C", 2 * A)]
+        )
+        assert win.display_stats_page is page
+        assert page.findChildren(DatumDisplay) == displays
+        assert not page.save_button.isHidden()
+        assert not page.calculate_current_stats_button.isHidden()
+        shown = [d for d in displays if d.model.cell_count() > 0]
+        assert [d.table_label.text() for d in shown] == ["A", "B", "C"]
+        assert shown[2].model.data(shown[2].model.index(0, 0), 0) == "2"
+
+    def test_stats_of_a_left_run_are_dropped(self):
+        scheduler = JobScheduler()
+        A = np.ones((50, 50))
+        page = DisplayStatsPage(
+            matrices=[DisplayData("A", A), DisplayData("B", A), DisplayData("C", A @ A)],
+            scheduler=scheduler,
+        )
+        page.onCalculate()
+        page.reset()
+        scheduler.wait_for_done()
+        QApplication.processEvents()
+        assert page.display_data == []
+        assert page.calculate_current_stats_button.isEnabled()
+        page.close()
+
+    def test_live_product_is_reused(self):
+        win = self.win
+        win._display_matrix_entry()
+        entry_page = win.matrix_entry_page
+        A = np.arange(12).reshape(3, 4)
+        B = np.arange(8).reshape(4, 2) - 3
+        entry_page.matrix_entry_left.set_matrix(A)
+        entry_page.matrix_entry_right.set_matrix(B)
+        entry_page.live_stats_box.setChecked(True)
+        # The first live product is computed in the background
+        win.scheduler.wait_for_done()
+        QApplication.processEvents()
+        dd, err = entry_page.entered_matrices()
+        assert err is None
+        out = product_dtypes(dd[0].data, dd[1].data)[1]
+        with mock.patch.object(win.scheduler, "multiply", wraps=win.scheduler.multiply) as multiply:
+            entry_page.calculate_button.click()
+            assert multiply.call_count == 0
+            C = win.display_stats_page.matrices[2].data
+            assert C.dtype == out
+            np.testing.assert_array_equal(C, A.dot(B))
+
+            # Without live stats the scheduler computes it
+            win._display_matrix_entry()
+            entry_page.matrix_entry_left.set_matrix(A)
+            entry_page.matrix_entry_right.set_matrix(B)
+            entry_page.live_stats_box.setChecked(False)
+            entry_page.calculate_button.click()
+            assert multiply.call_count == 1
+            win.scheduler.wait_for_done()
+            QApplication.processEvents()
+            C = win.display_stats_page.matrices[2].data
+            assert C.dtype == out
+            np.testing.assert_array_equal(C, A.dot(B))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app.quit()
+        cls.app = None
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+"""small_matrix_app.matrix_app.tests.test_prefetcher.py
+Tests for loading many runs at once and for the RunPrefetcher
+"""
+import sys
+
+sys.path.insert(0, "..")
+import unittest
+
+import shutil
+import tempfile
+import numpy as np
+
+from matrix_app.all_exceptions import InternalDbError
+from matrix_app.db_widget import DatabaseModel
+from matrix_app.prefetcher import RunPrefetcher
+from test.helpers import make_run
+
+
+class TestPrefetcher(unittest.TestCase):
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.db = DatabaseModel(self.db_dir + "/SavedRuns")
+        self.names = ["Run" + str(i) for i in range(6)]
+        for i, name in enumerate(self.names):
+            assert self.db.save_run(make_run(name, np.full((3, 4), float(i)), np.ones((4, 2)), with_stats=False)) is None
+        self.db.run_cache.clear()
+
+    def test_load_runs_keeps_order(self):
+        runs = self.db.load_runs(self.names[::-1], workers=3)
+        assert [r.run_name for r in runs] == self.names[::-1]
+        for i, run_data in enumerate(runs[::-1]):
+            np.testing.assert_array_equal(run_data.matrices[2].data, np.full((3, 2), 4.0 * i))
+        with self.assertRaises(InternalDbError) as raised:
+            self.db.load_runs(["Run1", "Missing"])
+        assert "Missing" in str(raised.exception)
+
+    def test_prefetched_runs_are_hits(self):
+        """Stepping through the list, every run after the first was prefetched"""
+        prefetcher = RunPrefetcher(self.db, workers=2)
+        for i, name in enumerate(self.names):
+            run_data = prefetcher.load_run(name, lazy=True)
+            np.testing.assert_array_equal(run_data.matrices[0].data, np.full((3, 4), float(i)))
+            prefetcher.prefetch(self.names[i + 1 : i + 3])
+        prefetcher.close()
+        stats = prefetcher.stats()
+        assert stats["opened"] == 6
+        assert stats["hits"] == 5
+        assert prefetcher.hit_rate() == 5 / 6
+        # Recently viewed runs are kept prefetched as well
+        assert self.db.is_cached(self.names[-2])
+
+    def test_disabled_cache_prefetches_nothing(self):
+        db = DatabaseModel(self.db_dir + "/SavedRuns", cache_bytes=0)
+        prefetcher = RunPrefetcher(db)
+        prefetcher.prefetch(self.names)
+        prefetcher.close()
+        assert prefetcher.prefetched == 0
+        db.close()
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.db_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
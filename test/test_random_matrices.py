@@ -0,0 +1,119 @@
+"""small_matrix_app.matrix_app.tests.test_random_matrices.py
+Tests for the seeded random matrices, and for runs saved as their seed
+"""
+import sys
+
+sys.path.insert(0, "..")
+import unittest
+
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from matrix_app.db_widget import DatabaseModel, DisplayData, RunData
+from matrix_app.random_matrices import (
+    AUTO_DTYPE,
+    DISTRIBUTIONS,
+    DTYPES,
+    NORMAL,
+    RandomMatrixSpec,
+    RunGenerator,
+    regenerate_matrices,
+    spawn_seeds,
+)
+from matrix_app.run_stores import PerFileRunStore, SingleFileRunStore
+
+
+class TestRandomMatrices(unittest.TestCase):
+    def test_dtypes_and_distributions(self):
+        for dtype in DTYPES:
+            for distribution in DISTRIBUTIONS:
+                spec = RandomMatrixSpec(
+                    low=-50, high=50, dtype=dtype, distribution=distribution
+                )
+                matrix = spec.make_matrix(np.random.default_rng(0), (40, 30))
+                assert matrix.dtype == np.dtype(dtype)
+                assert matrix.shape == (40, 30)
+                if distribution != NORMAL:
+                    assert matrix.min() >= -50 and matrix.max() <= 50
+
+    def test_auto_dtype(self):
+        """AUTO_DTYPE draws what float64 draws, in the narrowest dtype that holds it"""
+        rng = np.random.default_rng(0)
+        auto = RandomMatrixSpec(dtype=AUTO_DTYPE).make_matrix(rng, (40, 30))
+        wide = RandomMatrixSpec().make_matrix(np.random.default_rng(0), (40, 30))
+        assert auto.dtype == np.int8
+        np.testing.assert_array_equal(auto, wide)
+        normal = RandomMatrixSpec(dtype=AUTO_DTYPE, distribution=NORMAL)
+        assert normal.make_matrix(rng, (4, 3)).dtype == np.float64
+        spec = RandomMatrixSpec.from_dict(RandomMatrixSpec(dtype=AUTO_DTYPE).to_dict())
+        assert spec.dtype == AUTO_DTYPE
+
+    def test_density(self):
+        spec = RandomMatrixSpec(low=1, high=9, density=0.25)
+        matrix = spec.make_matrix(np.random.default_rng(1), (200, 200))
+        assert abs(np.count_nonzero(matrix) / matrix.size - 0.25) < 0.02
+        with self.assertRaises(ValueError):
+            RandomMatrixSpec(density=2)
+        with self.assertRaises(ValueError):
+            RandomMatrixSpec(dtype="complex128")
+
+    def test_same_seed_same_matrices(self):
+        generator = RunGenerator(RandomMatrixSpec(max_dim=20, dtype="int16"), 42)
+        A, B = generator.make_matrices()
+        again = RunGenerator.from_json(generator.to_json())
+        assert again == generator
+        A2, B2 = again.make_matrices()
+        np.testing.assert_array_equal(A, A2)
+        np.testing.assert_array_equal(B, B2)
+        assert A.shape[1] == B.shape[0]
+        seeds = spawn_seeds(42, 5)
+        assert seeds == spawn_seeds(42, 5)
+        assert len(set(seeds)) == 5
+
+
+class TestSeedOnlyRuns(unittest.TestCase):
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+
+    def _generated_run(self, run_name: str, generator: RunGenerator) -> RunData:
+        matrices, stats = regenerate_matrices(generator, with_stats=True)
+        return RunData(run_name, matrices, stats, generator=generator)
+
+    def _check_backend(self, backend: type):
+        db = DatabaseModel(self.db_dir + "/" + backend.__name__, backend=backend)
+        generator = RunGenerator(RandomMatrixSpec(max_dim=60, dtype="float32"), 3)
+        full = self._generated_run("Full", generator)
+        assert db.save_run(full) is None
+        assert db.save_run(self._generated_run("Seed", generator), seed_only=True) is None
+        entered = RunData("Entered", [DisplayData("C", np.ones((2, 2)))], [])
+        assert db.save_run(entered, seed_only=True) is not None
+
+        for lazy in (False, True):
+            loaded = db.load_run("Seed", lazy=lazy)
+            assert loaded.generator == generator
+            expected = {d.label: d.data for d in full.matrices + full.stats}
+            for d in loaded.matrices + loaded.stats:
+                np.testing.assert_array_equal(np.asarray(d.data), expected[d.label])
+        assert db.load_run("Full").generator == generator
+        with db.open_run_matrix("Seed", "A") as a:
+            np.testing.assert_array_equal(a, full.matrices[0].data)
+        db.close()
+
+    def test_per_file_seed_only_is_smaller(self):
+        self._check_backend(PerFileRunStore)
+        db_name = self.db_dir + "/PerFileRunStore"
+        full_size = os.path.getsize(db_name + "/Full.h5")
+        seed_size = os.path.getsize(db_name + "/Seed.h5")
+        assert seed_size < full_size
+
+    def test_single_file_seed_only(self):
+        self._check_backend(SingleFileRunStore)
+
+    def tearDown(self):
+        shutil.rmtree(self.db_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""small_matrix_app.matrix_app.tests.test_run_aggregation.py
+Tests for the statistics across saved runs
+"""
+import sys
+
+sys.path.insert(0, "..")
+import unittest
+
+import shutil
+import tempfile
+import numpy as np
+
+from matrix_app.db_widget import DatabaseModel
+from test.helpers import make_run
+
+
+class TestRunAggregation(unittest.TestCase):
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.db = DatabaseModel(self.db_dir + "/SavedRuns")
+        rng = np.random.default_rng(3)
+        self.products = []
+        for i in range(5):
+            A = rng.integers(0, 10, size=(6, 4))
+            B = rng.random((4, 5))
+            run_data = make_run("Same" + str(i), A, B, with_stats=i % 2 == 0)
+            assert self.db.save_run(run_data) is None
+            self.products.append(run_data.matrices[2].data)
+        A = rng.integers(0, 10, size=(2, 3))
+        assert self.db.save_run(make_run("Other", A, A.T)) is None
+
+    def test_elementwise_across_same_shapes(self):
+        names = ["Same" + str(i) for i in range(5)] + ["Other", "Missing"]
+        done = []
+        # A small memory limit reads every run in several blocks of rows
+        aggregate = self.db.aggregate_runs(
+            names, workers=3, memory_limit=200, progress=lambda d, t: done.append((d, t))
+        )
+        assert sorted(aggregate.groups) == [(2, 2), (6, 5)]
+        group = aggregate.groups[(6, 5)]
+        assert sorted(group.run_names) == names[:5]
+        stacked = np.stack(self.products)
+        np.testing.assert_allclose(group.mean(), stacked.mean(axis=0))
+        np.testing.assert_array_equal(group.min, stacked.min(axis=0))
+        np.testing.assert_array_equal(group.max, stacked.max(axis=0))
+        assert aggregate.groups[(2, 2)].dtype == np.int64
+        assert list(aggregate.skipped) == ["Missing"]
+        assert done[-1] == (6, 6)
+
+    def test_scalar_distributions_from_index(self):
+        aggregate = self.db.aggregate_runs(["Same" + str(i) for i in range(5)])
+        maxes = aggregate.scalars["Max across Matrix"]
+        np.testing.assert_allclose(maxes.values, [C.max() for C in self.products])
+        summary = dict(zip(maxes.SUMMARY, maxes.summary()))
+        assert summary["runs"] == 5
+        assert summary["median"] == np.median(maxes.values)
+        counts, edges = maxes.histogram(bins=4)
+        assert counts.sum() == 5 and len(edges) == 5
+
+    def test_stopping_from_progress(self):
+        def stop(done, total):
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            self.db.aggregate_runs(["Same0", "Same1", "Same2"], workers=1, progress=stop)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.db_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""small_matrix_app.matrix_app.tests.test_run_cache.py
+Tests for the cache of loaded runs in the DatabaseModel
+"""
+import sys
+
+sys.path.insert(0, "..")
+import unittest
+
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from matrix_app.db_widget import DatabaseModel
+from matrix_app.run_cache import RunCache
+from test.helpers import make_run
+
+
+class TestRunCache(unittest.TestCase):
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.db_name = self.db_dir + "/SavedRuns"
+
+    def test_load_is_served_from_cache(self):
+        db = DatabaseModel(self.db_name)
+        ones = np.ones((4, 4))
+        assert db.save_run(make_run("One", ones, ones, with_stats=False)) is None
+        db.run_cache.clear()
+
+        first = db.load_run("One")
+        second = db.load_run("One")
+        assert db.run_cache.misses == 1
+        assert db.run_cache.hits == 1
+        assert second.matrices is not first.matrices
+        np.testing.assert_array_equal(first.matrices[2].data, second.matrices[2].data)
+        db.close()
+
+    def test_changed_file_is_reloaded(self):
+        db = DatabaseModel(self.db_name)
+        ones = np.ones((4, 4))
+        assert db.save_run(make_run("One", ones, ones, with_stats=False)) is None
+        db.load_run("One")
+        stat = os.stat(self.db_name + "/One-No_Stats_Run.h5")
+        os.utime(
+            self.db_name + "/One-No_Stats_Run.h5",
+            ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9),
+        )
+        db.load_run("One")
+        assert db.run_cache.misses == 1
+        db.close()
+
+    def test_budget_evicts_least_recently_used(self):
+        run_bytes = 3 * 10 * 10 * 8
+        cache = RunCache(max_bytes=2 * run_bytes)
+        ones = np.ones((10, 10))
+        for name in ("a", "b", "c"):
+            cache.put(name, 0, make_run(name, ones, ones, with_stats=False))
+            if name == "b":
+                assert cache.get("a", 0) is not None
+        assert "a" in cache and "c" in cache and "b" not in cache
+        assert cache.current_bytes == 2 * run_bytes
+
+        ones = np.ones((100, 100))
+        cache.put("huge", 0, make_run("huge", ones, ones, with_stats=False))
+        assert "huge" not in cache
+
+    def test_disabled_cache(self):
+        db = DatabaseModel(self.db_name, cache_bytes=0)
+        ones = np.ones((4, 4))
+        assert db.save_run(make_run("One", ones, ones, with_stats=False)) is None
+        db.load_run("One")
+        db.load_run("One")
+        assert db.run_cache.hits == 0
+        db.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.db_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
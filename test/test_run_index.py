@@ -0,0 +1,136 @@
+"""small_matrix_app.matrix_app.tests.test_run_index.py
+Tests for the persistent run index behind the DatabaseModel
+"""
+import sys
+import time
+
+sys.path.insert(0, "..")
+import unittest
+from unittest import mock
+
+import shutil
+import tempfile
+import numpy as np
+
+from matrix_app.db_widget import DatabaseModel, DisplayData, RunData
+from matrix_app.run_index import RunIndex, RunIndexEntry
+
+
+class TestRunIndex(unittest.TestCase):
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.db_name = self.db_dir + "/SavedRuns"
+        self.db = DatabaseModel(self.db_name)
+        A = DisplayData("A", np.ones((2, 3)))
+        B = DisplayData("B", np.ones((3, 4), dtype=np.int32))
+        C = DisplayData("C", A.data.dot(B.data))
+        self.with_stats = RunData("Full", [A, B, C], [DisplayData("min", C.data.min())])
+        self.no_stats = RunData("Bare", [A, B, C], [])
+
+    def test_reopen_reads_index_without_scanning(self):
+        """Saved runs are found on startup and on load from the index alone"""
+        assert self.db.save_run(self.with_stats) is None
+        assert self.db.save_run(self.no_stats) is None
+        self.db.close()
+
+        with mock.patch("matrix_app.run_stores.listdir") as listdir:
+            self.db = DatabaseModel(self.db_name)
+            assert listdir.call_count == 0
+        assert sorted(self.db.get_previous_runs()) == ["Bare", "Full"]
+        with mock.patch("matrix_app.run_stores.path.exists") as exists:
+            run_data = self.db.load_run("Bare")
+            assert exists.call_count == 0
+        assert run_data.stats == []
+
+    def test_index_records_layout(self):
+        assert self.db.save_run(self.with_stats) is None
+        entry = RunIndex(self.db_name).get("Full")
+        assert entry.file_name == "Full.h5"
+        assert entry.has_stats
+        assert entry.shapes["C"] == (2, 4)
+        assert entry.shapes["min"] == ()
+        assert entry.dtypes["B"] == "int32"
+        assert entry.created <= entry.modified
+
+    def test_summary_without_reading_datasets(self):
+        """Stored bytes and min, mean and max of C are kept with the run and survive a rebuild"""
+        assert self.db.save_run(self.with_stats) is None
+        assert self.db.save_run(self.no_stats) is None
+        full = self.db.run_summary("Full")
+        assert full.nbytes > 0
+        assert full.scalars == {"min": 3.0}
+        # Runs without stats still get the min, mean and max of C
+        bare = self.db.run_summary("Bare")
+        assert bare.scalars == {
+            "Minimum Value in Matrix": 3.0,
+            "Mean across Matrix": 3.0,
+            "Max across Matrix": 3.0,
+        }
+        assert self.db.rebuild_index() == 2
+        assert self.db.run_summary("Bare").scalars == bare.scalars
+        assert self.db.run_summary("Full").nbytes == full.nbytes
+
+        with mock.patch("h5py.Dataset.__getitem__") as read:
+            start = time.perf_counter()
+            for _ in range(100):
+                self.db.run_summary("Bare")
+            assert (time.perf_counter() - start) / 100 < 0.001
+            assert read.call_count == 0
+
+    def test_rebuild_finds_unindexed_runs(self):
+        """Runs copied in behind the DatabaseModel's back show up after a rebuild"""
+        other = DatabaseModel(self.db_dir + "/Other")
+        assert other.save_run(self.with_stats) is None
+        other.close()
+        shutil.copy(self.db_dir + "/Other/Full.h5", self.db_name + "/Copied.h5")
+
+        assert self.db.get_previous_runs() == []
+        assert self.db.rebuild_index() == 1
+        assert self.db.get_previous_runs() == ["Copied"]
+        assert len(self.db.load_run("Copied").matrices) == 3
+
+    def test_pages_filter_sort_and_find(self):
+        """Pages follow on from the last entry in every sort order, filters and typeahead included"""
+        index = RunIndex(self.db_name)
+        names = ["run" + str(i) for i in range(25)] + ["Other_1", "other%2"]
+        index.replace_all(
+            [
+                RunIndexEntry(n, n + ".h5", False, {"C": (i % 4, i)}, created=100 - i)
+                for i, n in enumerate(names)
+            ]
+        )
+        for sort, key in (
+            ("name", lambda n: (n.lower(), n)),
+            ("created", lambda n: (100 - names.index(n), n)),
+            ("shape", lambda n: (names.index(n) % 4, names.index(n), n)),
+        ):
+            for descending in (False, True):
+                expected = sorted(names, key=key, reverse=descending)
+                listed = []
+                page = index.page(sort, descending, limit=4)
+                while page:
+                    listed.extend(e.run_name for e in page)
+                    page = index.page(sort, descending, after=page[-1], limit=4)
+                assert listed == expected, sort
+                assert index.position("run1", sort, descending) == min(
+                    expected.index(n) for n in names if n.startswith("run1")
+                )
+
+        assert [e.run_name for e in index.page(contains="OTHER")] == ["other%2", "Other_1"]
+        assert [e.run_name for e in index.page(contains="%")] == ["other%2"]
+        assert [e.run_name for e in index.page(contains="r_")] == ["Other_1"]
+        assert index.position("run2", contains="2") == 2
+        assert index.position("nothing") == -1
+        index.close()
+
+    def test_saving_twice_fails(self):
+        assert self.db.save_run(self.no_stats) is None
+        assert self.db.save_run(self.no_stats) is not None
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.db_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+"""small_matrix_app.matrix_app.tests.test_run_stores.py
+Tests for the per-file and single file backends of the DatabaseModel, and the migration between them
+"""
+import sys
+
+sys.path.insert(0, "..")
+import unittest
+
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from matrix_app.db_widget import DatabaseModel, DisplayData, RunData
+from matrix_app.migrate_runs import migrate_to_single_file
+from matrix_app.run_stores import PerFileRunStore, RunStore, SingleFileRunStore
+from test.helpers import make_run
+
+
+def assert_same_run(loaded: RunData, expected: RunData):
+    expected_data = {d.label: d.data for d in expected.matrices + expected.stats}
+    loaded_data = {d.label: d.data for d in loaded.matrices + loaded.stats}
+    assert sorted(loaded_data) == sorted(expected_data)
+    for label, data in loaded_data.items():
+        np.testing.assert_array_equal(data, expected_data[label])
+
+
+class TestSingleFileRunStore(unittest.TestCase):
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.db_name = self.db_dir + "/SavedRuns"
+        self.db = DatabaseModel(self.db_name, backend=SingleFileRunStore)
+
+    def test_runs_are_groups_of_one_file(self):
+        assert self.db.save_run(make_run("One")) is None
+        assert self.db.save_run(make_run("Two", with_stats=False)) is None
+        h5_files = [f for f in os.listdir(self.db_name) if f.endswith(".h5")]
+        assert h5_files == [SingleFileRunStore.FILE_NAME]
+
+        self.db.close()
+        self.db = DatabaseModel(self.db_name, backend=SingleFileRunStore)
+        assert sorted(self.db.get_previous_runs()) == ["One", "Two"]
+        assert_same_run(self.db.load_run("One"), make_run("One"))
+        assert self.db.load_run("Two").stats == []
+
+    def test_backends_implement_the_interface(self):
+        with self.assertRaises(TypeError):
+            RunStore(self.db_dir)
+
+        class PartialStore(RunStore):
+            def new_location(self, run_name: str, has_stats: bool) -> str:
+                return run_name
+
+        with self.assertRaises(TypeError):
+            PartialStore(self.db_dir)
+        assert not PerFileRunStore.__abstractmethods__
+        assert not SingleFileRunStore.__abstractmethods__
+
+    def test_stats_run_replaces_no_stats_run(self):
+        assert self.db.save_run(make_run("Run", with_stats=False)) is None
+        assert self.db.save_run(make_run("Run", with_stats=False)) is not None
+        assert self.db.save_run(make_run("Run")) is None
+        assert self.db.rebuild_index() == 1
+        assert len(self.db.load_run("Run").stats) == 12
+
+    def test_failed_save_leaves_no_group(self):
+        bad = make_run("Bad")
+        bad.matrices.append(DisplayData("A", np.ones(3)))
+        assert self.db.save_run(bad) is not None
+        assert not self.db.store.exists(self.db.store.new_location("Bad", True))
+        assert self.db.save_run(make_run("Bad")) is None
+
+    def test_lazy_and_out_of_core_runs(self):
+        assert self.db.save_run(make_run("Eager")) is None
+        lazy = self.db.load_run("Eager", lazy=True)
+        C = [m for m in lazy.matrices if m.label == "C"][0].data
+        assert isinstance(C, np.memmap)
+        assert_same_run(lazy, make_run("Eager"))
+
+        with self.db.open_run_matrix("Eager", "A") as a:
+            with self.db.open_run_matrix("Eager", "B") as b:
+                assert self.db.save_run_out_of_core("Streamed", a, b) is None
+        streamed = self.db.load_run("Streamed")
+        np.testing.assert_allclose(
+            [m for m in streamed.matrices if m.label == "C"][0].data, C
+        )
+        assert len(streamed.stats) == 12
+
+    def test_migration_copies_every_run(self):
+        per_file = DatabaseModel(self.db_dir + "/PerFile")
+        runs = [make_run("Full", seed=1), make_run("Bare", with_stats=False, seed=2)]
+        for run_data in runs:
+            assert per_file.save_run(run_data) is None
+        per_file.close()
+
+        assert migrate_to_single_file(self.db_dir + "/PerFile", self.db_dir + "/Single") == 2
+        # Already migrated runs are skipped
+        assert migrate_to_single_file(self.db_dir + "/PerFile", self.db_dir + "/Single") == 0
+        single = DatabaseModel(self.db_dir + "/Single", backend=SingleFileRunStore)
+        for run_data in runs:
+            assert_same_run(single.load_run(run_data.run_name), run_data)
+        single.close()
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.db_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
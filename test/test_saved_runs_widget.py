@@ -0,0 +1,120 @@
+"""small_matrix_app.matrix_app.tests.test_saved_runs_widget.py
+Tests for the Saved Runs Page
+"""
+import sys
+import time
+
+sys.path.insert(0, "..")
+import unittest
+
+import shutil
+import tempfile
+from PyQt5 import QtCore
+from PyQt5.QtTest import QTest
+from PyQt5.QtWidgets import QApplication
+
+from matrix_app.db_widget import DatabaseModel
+from matrix_app.run_index import RunIndexEntry
+from matrix_app.saved_runs_widget import SavedRunsPage
+
+
+class TestSavedRunsPage(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = QApplication(sys.argv)
+        cls.db_dir = tempfile.mkdtemp()
+        cls.db = DatabaseModel(cls.db_dir + "/SavedRuns")
+        # Index entries are all the page reads, so the runs themselves are not needed
+        cls.count = 20000
+        cls.db._index.replace_all(
+            [
+                RunIndexEntry(
+                    "Run" + str(i).zfill(6),
+                    "Run" + str(i) + ".h5",
+                    True,
+                    {"C": (i % 50, 3)},
+                    {"C": "float64"},
+                    created=float(i),
+                    nbytes=1536,
+                    scalars={"Max across Matrix": float(i * 3)},
+                )
+                for i in range(cls.count)
+            ]
+        )
+
+    def setUp(self):
+        self.opened = []
+        start = time.perf_counter()
+        self.page = SavedRunsPage(self.db, self.opened.append)
+        self.open_time = time.perf_counter() - start
+        self.model = self.page.runs_model
+
+    def test_opens_without_reading_every_run(self):
+        """Only the first batch is read, the rest is fetched as the view scrolls"""
+        assert self.open_time < 0.5
+        assert self.model.rowCount() == self.model.batch
+        assert self.model.canFetchMore()
+        self.model.fetchMore()
+        assert self.model.rowCount() == 2 * self.model.batch
+        assert self.model.data(self.model.index(0, 0)) == "Run000000"
+        assert self.model.data(self.model.index(1, 2)) == "1 x 3"
+
+    def test_filter_and_sort(self):
+        self.page.filter_box.setText("run00012")
+        self.page._apply_filter()
+        names = [self.model.run_name(r) for r in range(self.model.rowCount())]
+        assert names == ["Run0001" + str(20 + i) for i in range(10)]
+        assert not self.model.canFetchMore()
+
+        self.page.filter_box.setText("")
+        self.page._apply_filter()
+        self.page.runs_view.sortByColumn(1, QtCore.Qt.DescendingOrder)
+        assert self.model.run_name(0) == "Run" + str(self.count - 1).zfill(6)
+        self.page.runs_view.sortByColumn(2, QtCore.Qt.AscendingOrder)
+        shapes = [self.model.data(self.model.index(r, 2)) for r in range(5)]
+        assert shapes == ["0 x 3"] * 5
+
+    def test_typeahead_and_open(self):
+        """Typing jumps to runs that were not fetched yet, enter opens the current run"""
+        self.page.runs_view.setFocus()
+        row = self.page.runs_view.find("Run0195")
+        assert row == 19500
+        assert self.model.rowCount() > row
+        assert self.page.runs_view.currentIndex().row() == row
+        assert self.page.runs_view.find("Nothing") == -1
+
+        QTest.keyClick(self.page.runs_view, QtCore.Qt.Key_Return)
+        self.page.open_button.click()
+        assert self.opened == ["Run019500", "Run019500"]
+
+    def test_neighbors(self):
+        """The runs listed after, then before, an opened run are the ones to prefetch"""
+        assert self.page.neighbors("Run000010") == ["Run000011", "Run000012", "Run000009"]
+        assert self.page.neighbors("Run000000") == ["Run000001", "Run000002"]
+        last = "Run" + str(self.model.rowCount() - 1).zfill(6)
+        assert len(self.page.neighbors(last)) == 3
+        assert self.page.neighbors("Nothing") == []
+
+    def test_preview_from_index(self):
+        """The preview pane follows the current run with what the index knows about it"""
+        assert "Select a run" in self.page.preview_label.text()
+        self.page.runs_view.setCurrentIndex(self.model.index(3, 0))
+        text = self.page.preview_label.text()
+        assert "Run000003" in text
+        assert "C: 3 x 3 float64" in text
+        assert "Max across Matrix: 9" in text
+        assert "Size on disk: 1.5 KB" in text
+
+    def tearDown(self):
+        self.page.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db.close()
+        shutil.rmtree(cls.db_dir)
+        cls.app.quit()
+        cls.app = None
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+"""small_matrix_app.matrix_app.tests.test_sparse_matrices.py
+Tests for sparse matrices through the multiply, the stats and the saved runs
+"""
+import sys
+
+sys.path.insert(0, "..")
+import unittest
+
+import shutil
+import tempfile
+
+import numpy as np
+
+from matrix_app.db_widget import DatabaseModel, DisplayData, RunData
+from matrix_app.run_stores import PerFileRunStore, SingleFileRunStore
+from matrix_app.sparse_matrices import (
+    SPARSE_FORMAT_ATTR,
+    auto_sparse,
+    is_sparse,
+    sparse,
+    to_dense,
+)
+from matrix_app.stats_engine import calculate_stats, multiply, sparse_stats
+
+
+def sparse_product(seed: int = 0, dtype=np.int64) -> np.ndarray:
+    """A mostly zero C whose cumulative products are not all zero: its first rows and columns are full"""
+    rng = np.random.default_rng(seed)
+    C = (rng.random((80, 100)) < 0.05) * rng.integers(1, 4, size=(80, 100))
+    # Ones, so the cumulative products stay in range
+    C[:, :3] = rng.choice([-1, 1], size=(80, 3))
+    C[:2] = rng.choice([-1, 1], size=(2, 100))
+    return C.astype(dtype)
+
+
+def assert_same_stats(got, expected):
+    """Same labels in the same order, same values and dtypes. Loaded runs list their stats by name"""
+    if sorted(s.label for s in got) == [s.label for s in got]:
+        expected = sorted(expected, key=lambda s: s.label)
+    assert [s.label for s in got] == [s.label for s in expected]
+    for s, e in zip(got, expected):
+        want = to_dense(e.data)
+        data = to_dense(s.data).reshape(want.shape)
+        assert data.dtype == want.dtype, s.label
+        np.testing.assert_array_equal(data, want, err_msg=s.label)
+
+
+@unittest.skipIf(sparse is None, "scipy is not installed")
+class TestSparseMatrices(unittest.TestCase):
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.db_dir)
+
+    def test_auto_sparse(self):
+        rng = np.random.default_rng(1)
+        mostly_zero = (rng.random((100, 100)) < 0.02) * 1.0
+        assert is_sparse(auto_sparse(mostly_zero))
+        assert not is_sparse(auto_sparse(np.ones((100, 100))))
+        # Too small to gain anything
+        assert not is_sparse(auto_sparse(np.zeros((10, 10))))
+        # Sparse but too dense
+        dense = auto_sparse(sparse.csr_matrix(np.ones((100, 100))))
+        assert isinstance(dense, np.ndarray)
+
+    def test_multiply(self):
+        rng = np.random.default_rng(2)
+        A = (rng.random((120, 90)) < 0.01) * rng.integers(1, 9, size=(120, 90))
+        B = (rng.random((90, 150)) < 0.01) * rng.integers(1, 9, size=(90, 150))
+        C = multiply(A, B)
+        assert is_sparse(C)
+        np.testing.assert_array_equal(to_dense(C), A.dot(B))
+        # Only one of them sparse
+        dense_B = rng.integers(1, 9, size=(90, 150))
+        np.testing.assert_array_equal(to_dense(multiply(A, dense_B)), A.dot(dense_B))
+        np.testing.assert_array_equal(
+            to_dense(multiply(dense_B.T, A.T)), dense_B.T.dot(A.T)
+        )
+
+    def test_stats_match_dense_stats(self):
+        for dtype in (np.int64, np.float64):
+            C = sparse_product(3, dtype)
+            stats = sparse_stats(sparse.csr_matrix(C))
+            assert_same_stats(stats, calculate_stats(C))
+            # The cumulative products stay sparse
+            assert is_sparse(stats[0].data)
+            assert stats[0].data.nnz < C.size
+            assert is_sparse(stats[4].data)
+            assert is_sparse(stats[8].data)
+        # calculate_stats takes sparse matrices too
+        assert_same_stats(calculate_stats(sparse.csc_matrix(C)), calculate_stats(C))
+
+    def test_stats_fall_back_to_dense_when_out_of_range(self):
+        C = sparse_product(4, np.float64)
+        C[:, 0] = 1e200
+        stats = sparse_stats(sparse.csr_matrix(C))
+        assert stats[4].label.endswith("Sign and Log10 Magnitude")
+        assert_same_stats(stats, calculate_stats(C))
+
+    def check_saved_sparse(self, backend):
+        db = DatabaseModel(self.db_dir + "/" + backend.__name__, backend=backend)
+        rng = np.random.default_rng(5)
+        A = (rng.random((100, 60)) < 0.02) * rng.random((100, 60))
+        B = (rng.random((60, 100)) < 0.02) * rng.random((60, 100))
+        C = multiply(A, B)
+        stats = calculate_stats(C)
+        run = RunData(
+            "Sparse",
+            [
+                DisplayData("A", sparse.csr_matrix(A)),
+                DisplayData("B", B),
+                DisplayData("C", C),
+            ],
+            stats,
+        )
+        assert db.save_run(run) is None
+        with db.store.read(db.run_summary("Sparse").file_name) as hdf:
+            assert SPARSE_FORMAT_ATTR in hdf["matrices/A"].attrs
+            # Mostly zero, but given dense
+            assert SPARSE_FORMAT_ATTR not in hdf["matrices/B"].attrs
+        entry = db.run_summary("Sparse")
+        assert entry.shapes["A"] == (100, 60)
+        assert entry.dtypes["A"] == "float64"
+        # A is saved as its nonzero entries
+        assert entry.nbytes < A.nbytes + B.nbytes
+        assert entry.scalars["Minimum Value in Matrix"] == 0
+
+        db.run_cache.clear()
+        for lazy in (False, True):
+            loaded = db.load_run("Sparse", lazy=lazy)
+            assert is_sparse(loaded.matrices[0].data)
+            assert not is_sparse(loaded.matrices[1].data)
+            assert is_sparse(loaded.matrices[2].data) == is_sparse(C)
+            np.testing.assert_array_equal(to_dense(loaded.matrices[0].data), A)
+            np.testing.assert_array_equal(to_dense(loaded.matrices[2].data), to_dense(C))
+            assert_same_stats(loaded.stats, stats)
+        with db.open_run_matrix("Sparse", "A") as matrix:
+            np.testing.assert_array_equal(to_dense(matrix[10:20]), A[10:20])
+        aggregate = db.aggregate_runs(["Sparse"], label="A")
+        np.testing.assert_array_equal(aggregate.groups[(100, 60)].max, A)
+        db.close()
+
+    def test_saved_sparse_per_file(self):
+        self.check_saved_sparse(PerFileRunStore)
+
+    def test_saved_sparse_single_file(self):
+        self.check_saved_sparse(SingleFileRunStore)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""small_matrix_app.matrix_app.tests.test_startup_profile.py
+Tests for the start up profiler and the lazy start up of the main window
+"""
+
+import sys
+
+sys.path.insert(0, "..")
+import unittest
+
+import os
+import shutil
+import subprocess
+import tempfile
+
+from matrix_app.startup_profile import FIRST_PAINT_TARGET, StartupProfile
+
+# Repository root, so the subprocesses can import matrix_app
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(*argv) -> str:
+    """Output of a fresh interpreter without a display"""
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    result = subprocess.run(
+        [sys.executable] + list(argv),
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=True,
+        universal_newlines=True,
+    )
+    return result.stdout
+
+
+class TestStartupProfile(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        package = os.path.join(self.tmp_dir, "profiled_pkg")
+        os.mkdir(package)
+        with open(os.path.join(package, "__init__.py"), "w") as f:
+            f.write("from profiled_pkg import inner\n")
+        with open(os.path.join(package, "inner.py"), "w") as f:
+            f.write("VALUE = 3\n")
+        sys.path.insert(0, self.tmp_dir)
+
+    def tearDown(self):
+        sys.path.remove(self.tmp_dir)
+        for name in ("profiled_pkg", "profiled_pkg.inner"):
+            sys.modules.pop(name, None)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_times_nested_imports(self):
+        profile = StartupProfile()
+        profile.install()
+        try:
+            import profiled_pkg
+        finally:
+            profile.uninstall()
+        assert profiled_pkg.inner.VALUE == 3
+        times = {module.name: module for module in profile.imports}
+        inner, outer = times["profiled_pkg.inner"], times["profiled_pkg"]
+        assert (inner.depth, outer.depth) == (1, 0)
+        assert outer.total >= inner.total
+        assert abs(outer.total - outer.self_time - inner.total) < 1e-6
+        assert dict(profile.package_times())["profiled_pkg"] > 0
+        # The module keeps its own loader, not the profiler's
+        assert type(profiled_pkg.__loader__).__name__ == "SourceFileLoader"
+        assert profiled_pkg.__spec__.loader is profiled_pkg.__loader__
+
+    def test_missing_module_still_raises(self):
+        profile = StartupProfile()
+        profile.install()
+        try:
+            with self.assertRaises(ImportError):
+                import profiled_pkg.missing
+        finally:
+            profile.uninstall()
+        assert profile._stack == []
+
+    def test_report(self):
+        profile = StartupProfile()
+        profile.steps = [("imports", 0.1), ("first paint", FIRST_PAINT_TARGET + 0.1)]
+        report = profile.report()
+        assert profile.step_time("imports") == 0.1
+        assert profile.step_time("missing") is None
+        assert "+100.0  imports" in report
+        assert report.endswith(": too slow")
+        profile.steps[-1] = ("first paint", FIRST_PAINT_TARGET / 2)
+        assert profile.report().endswith(": ok")
+
+    def test_window_defers_heavy_imports_and_db(self):
+        """The home screen is shown without numpy, h5py or the DatabaseModel"""
+        db_dir = os.path.join(self.tmp_dir, "SavedRuns")
+        code = (
+            "import sys\n"
+            "from PyQt5.QtWidgets import QApplication\n"
+            "from matrix_app.main_window import Window\n"
+            "app = QApplication(sys.argv)\n"
+            "win = Window(db_name=sys.argv[1])\n"
+            "app.processEvents()\n"
+            "heavy = [m for m in ('numpy', 'h5py', 'scipy') if m in sys.modules]\n"
+            "print('imported: ' + ' '.join(heavy))\n"
+            "assert win.data_run_model is not None\n"
+            "print('opened: ' + str('h5py' in sys.modules))\n"
+            "win.close()\n"
+        )
+        lines = run_python("-c", code, db_dir).splitlines()
+        assert lines[-2] == "imported: "
+        assert lines[-1] == "opened: True"
+        assert os.path.isdir(db_dir)
+
+    def test_profile_startup_mode(self):
+        db_dir = os.path.join(self.tmp_dir, "SavedRuns")
+        out = run_python("-m", "matrix_app.main", "--profile-startup", "--db", db_dir)
+        assert "PyQt5.QtWidgets" in out
+        assert "first paint" in out and "open saved runs (deferred)" in out
+        assert out.rstrip().splitlines()[-1].startswith("First paint after")
+        # Deferred imports are past the first paint, so they are not in the report
+        assert "h5py" not in out
+        assert os.path.isdir(db_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
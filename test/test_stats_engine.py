@@ -0,0 +1,128 @@
+"""small_matrix_app.matrix_app.tests.test_stats_engine.py
+Tests for the blocked stats kernel
+"""
+import sys
+
+sys.path.insert(0, "..")
+import unittest
+
+import numpy as np
+
+from matrix_app.stats_engine import StatsAccumulator, calculate_stats
+
+
+def reference_stats(C):
+    """The stats as numpy computes them one full pass at a time"""
+    return [
+        C.cumprod(),
+        C.min(),
+        C.mean(),
+        C.max(),
+        C.cumprod(axis=0),
+        C.min(axis=0),
+        C.mean(axis=0),
+        C.max(axis=0),
+        C.cumprod(axis=1),
+        C.min(axis=1).reshape(-1, 1),
+        C.mean(axis=1).reshape(-1, 1),
+        C.max(axis=1).reshape(-1, 1),
+    ]
+
+
+class TestStatsEngine(unittest.TestCase):
+    def setUp(self):
+        self.block_bytes = StatsAccumulator.BLOCK_BYTES
+
+    def test_matches_numpy_across_blocks(self):
+        """Stats collected block by block equal the full-matrix numpy results"""
+        StatsAccumulator.BLOCK_BYTES = 64  # a few rows per block
+        rng = np.random.default_rng(3)
+        for C in (rng.random((37, 5)) + 0.5, rng.integers(-3, 4, size=(11, 4))):
+            stats = calculate_stats(C)
+            for got, expected in zip(stats, reference_stats(C)):
+                assert np.shape(got.data) == np.shape(expected)
+                assert np.asarray(got.data).dtype == np.asarray(expected).dtype
+                np.testing.assert_allclose(got.data, expected, rtol=1e-12)
+            # cumulative products carried between blocks are exact
+            np.testing.assert_array_equal(stats[0].data, C.cumprod())
+            np.testing.assert_array_equal(stats[4].data, C.cumprod(axis=0))
+
+    def test_overflow_labels(self):
+        """Cumulative products past sys.maxsize that are still in range keep the 'Too Large' labels,
+        the ones that overflow are kept as sign and log10 magnitude"""
+        stats = calculate_stats(np.full((4, 4), 1e3))
+        labels = [s.label for s in stats]
+        assert "Cumulative Product Too Large For Full Display" in labels
+        assert stats[0].data.dtype == np.float64
+
+        stats = calculate_stats(np.full((40, 40), -1e10))
+        labels = [s.label for s in stats]
+        assert labels[0] == "Cumulative Product Sign and Log10 Magnitude"
+        assert (
+            "Cumulative Product Across Each Row Sign and Log10 Magnitude" in labels
+        )
+        assert len(stats) == 12
+        flat = stats[0].data
+        np.testing.assert_allclose(flat["log10"], 10 * np.arange(1, 1601), rtol=1e-12)
+        np.testing.assert_array_equal(flat["sign"], np.where(np.arange(1600) % 2, 1, -1))
+        stats = calculate_stats(np.ones((3, 3)))
+        assert stats[0].label == "Cumulative Product Matrix "
+
+    def test_log_space_across_blocks(self):
+        """Int wraparound and float underflow are found, across blocks and in every direction"""
+        StatsAccumulator.BLOCK_BYTES = 64
+        rng = np.random.default_rng(6)
+        for C in (
+            rng.integers(2, 10, size=(30, 7)) * rng.choice([-1, 1], size=(30, 7)),
+            rng.random((30, 7)) * 1e-30,
+            np.vstack([np.ones((10, 7)), np.full((20, 7), -1e200)]),
+        ):
+            stats = calculate_stats(C)
+            assert "Sign and Log10 Magnitude" in stats[0].label
+            for index, axis in ((0, None), (4, 0), (8, 1)):
+                if "Sign and Log10 Magnitude" not in stats[index].label:
+                    continue
+                with np.errstate(divide="ignore"):
+                    logs = np.log10(np.abs(C.astype(float)))
+                along = 1 if axis == 1 else 0
+                flat = axis is None
+                expected_log = np.cumsum(logs.ravel() if flat else logs, axis=along)
+                negatives = np.cumsum((C < 0).ravel() if flat else C < 0, axis=along)
+                zeros = np.cumsum((C == 0).ravel() if flat else C == 0, axis=along)
+                expected_sign = np.where(zeros > 0, 0, 1 - 2 * (negatives % 2))
+                np.testing.assert_array_equal(stats[index].data["sign"], expected_sign)
+                np.testing.assert_allclose(
+                    stats[index].data["log10"], expected_log, rtol=1e-12
+                )
+
+    def test_cumulative_products_stream_to_targets(self):
+        """Raw and log space cumulative products can go to targets other than in-memory arrays"""
+        C = np.full((50, 6), 1e30)
+        raw = (np.zeros(300), np.zeros((50, 6)), np.zeros((50, 6)))
+        created = []
+
+        def make_target(shape, dtype):
+            created.append(np.zeros(shape, dtype=dtype))
+            return created[-1]
+
+        stats = calculate_stats(
+            C, cumprod_out=raw, log_out=(make_target, make_target, make_target)
+        )
+        assert stats[0].data is created[0]
+        assert stats[4].data is created[1]
+        assert stats[8].data is raw[2]  # 1e180 is still in range
+        assert len(created) == 2
+        np.testing.assert_allclose(created[0]["log10"], 30 * np.arange(1, 301))
+
+    def test_missing_rows_raise(self):
+        accumulator = StatsAccumulator((4, 2), float)
+        accumulator.update(np.ones((2, 2)))
+        with self.assertRaises(ValueError):
+            accumulator.finish()
+
+    def tearDown(self):
+        StatsAccumulator.BLOCK_BYTES = self.block_bytes
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""small_matrix_app.matrix_app.tests.test_storage_profiles.py
+Tests for the HDF5 storage profiles of the DatabaseModel
+"""
+import sys
+
+sys.path.insert(0, "..")
+import unittest
+
+import shutil
+import tempfile
+import h5py
+import numpy as np
+
+from matrix_app.db_widget import DatabaseModel, DisplayData, RunData
+from matrix_app.stats_engine import calculate_stats
+from matrix_app.storage_profiles import (
+    LOSSLESS_FLOAT32,
+    PROFILES,
+    StorageProfile,
+)
+from test.helpers import assert_stat_close
+
+
+class TestStorageProfiles(unittest.TestCase):
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        A = np.random.default_rng(2).integers(0, 101, size=(40, 30)).astype(float)
+        B = A.T.copy()
+        C = A.dot(B)
+        self.run_data = RunData(
+            "Profiled",
+            [DisplayData("A", A), DisplayData("B", B), DisplayData("C", C)],
+            calculate_stats(C),
+        )
+
+    def test_chunk_shapes_follow_layout(self):
+        rows = PROFILES["rows"].dataset_options((1000, 100), np.float64)
+        columns = PROFILES["columns"].dataset_options((1000, 100), np.float64)
+        assert rows["chunks"][1] == 100
+        assert columns["chunks"][0] == 1000
+        assert PROFILES["rows_gzip"].dataset_options((), np.float64) == {}
+        assert PROFILES["default"].dataset_options((10, 10), np.float64) == {}
+        with self.assertRaises(ValueError):
+            StorageProfile("bad", compression="gzip")
+
+    def test_lossless_downcast_keeps_inexact_values(self):
+        profile = StorageProfile("exact", float_policy=LOSSLESS_FLOAT32)
+        assert profile.convert(np.array([1.0, 2.5, np.nan])).dtype == np.float32
+        assert profile.convert(np.array([0.1])).dtype == np.float64
+        assert profile.convert(np.array([1, 2])).dtype == np.array([1, 2]).dtype
+
+    def test_every_profile_round_trips(self):
+        for name, profile in PROFILES.items():
+            db = DatabaseModel(self.db_dir + "/" + name, storage_profile=profile)
+            assert db.save_run(self.run_data) is None
+            db.run_cache.clear()
+            loaded = db.load_run("Profiled")
+            saved = {d.label: d.data for d in self.run_data.matrices + self.run_data.stats}
+            for d in loaded.matrices + loaded.stats:
+                rtol = 1e-6 if profile.float_policy != "keep" else 0
+                assert_stat_close(d.data, saved[d.label], rtol=rtol)
+            db.close()
+
+        with h5py.File(self.db_dir + "/rows_gzip/Profiled.h5", "r") as hdf:
+            C = hdf["matrices/C"]
+            assert C.compression == "gzip" and C.shuffle and C.chunks is not None
+        with h5py.File(self.db_dir + "/rows_gzip_lossless_float32/Profiled.h5", "r") as hdf:
+            # integral entries are exact in float32, the row means are not
+            assert hdf["matrices/A"].dtype == np.float32
+            assert hdf["stats/Mean of each Row"].dtype == np.float64
+        with h5py.File(self.db_dir + "/rows_gzip_narrowest/Profiled.h5", "r") as hdf:
+            # 0 to 100 fits in int8, and C's entries, at most 30 * 100 * 100, in int32
+            assert hdf["matrices/A"].dtype == np.int8
+            assert hdf["matrices/C"].dtype == np.int32
+
+    def tearDown(self):
+        shutil.rmtree(self.db_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()